@@ -0,0 +1,242 @@
+from argparse import ArgumentParser
+import csv
+import os
+import sys
+import tomllib
+
+from sympy import Float
+from sympy.parsing.sympy_parser import parse_expr
+
+from Variable import Variable
+from Circuit import Circuit
+from ResultCache import ResultCache
+from Precision import PRECISIONS
+from Export import CsvWriter, JsonLinesWriter, NpyWriter
+
+
+# Includes a command line tool which evaluates every equation of a design file in one process
+#
+# Run with:  python Batch.py design.toml --output results.jsonl
+#
+# A design file lists the variables (components) and the named equations of a design, e.g. in TOML:
+#
+#   [variables.R_hys]
+#   nom_value = 255000.0
+#   tol_decimal = 0.01
+#
+#   [equations.I_ext]
+#   expression = "0.063 / R_hys"
+#   unit = "Amps"
+#
+# YAML files have the same layout. CSV files have one row per variable or equation, with the columns kind ("variable"
+#   or "equation"), name, and any of the fields below, where unique tolerances are two numbers separated by a space.
+#
+# The expressions are read with SymPy's parse_expr, which evaluates them as Python, so only use trusted design files.
+
+VARIABLE_FIELDS = ("nom_value", "tol_decimal", "tol_value", "tol_type", "tol_pref", "tol_decimals_unique",
+                   "tol_values_unique")
+
+EQUATION_FIELDS = ("expression", "unit", "method", "precision")
+
+FORMATS = {"csv": CsvWriter, "jsonl": JsonLinesWriter, "npy": NpyWriter}
+
+
+####################
+def read_toml(path):
+    with open(path, "rb") as file:
+        return tomllib.load(file)
+
+
+def read_yaml(path):
+    try:
+        import yaml
+
+    except ImportError:
+        raise ValueError("Reading YAML design files needs the PyYAML package (pip install pyyaml)")
+
+    with open(path) as file:
+        return yaml.safe_load(file) or {}
+
+
+def read_csv(path):
+    """Function reading a CSV design file (see the top of this module) into the same layout as a TOML file."""
+    design = {"variables": {}, "equations": {}}
+
+    with open(path, newline="") as file:
+        for line, row in enumerate(csv.DictReader(file), start=2):
+            kind = (row.pop("kind", None) or "").strip().lower()
+            name = (row.pop("name", None) or "").strip()
+            fields = {field: value.strip() for field, value in row.items() if field and value and value.strip()}
+
+            if kind not in ("variable", "equation") or not name:
+                raise ValueError("Line %d of %s needs a kind (variable or equation) and a name" % (line, path))
+
+            if kind == "variable":
+                for field in ("tol_decimals_unique", "tol_values_unique"):
+                    if field in fields:
+                        fields[field] = fields[field].split()
+
+                design["variables"][name] = fields
+
+            else:
+                design["equations"][name] = fields
+
+    return design
+
+
+READERS = {".toml": read_toml, ".yaml": read_yaml, ".yml": read_yaml, ".csv": read_csv}
+
+
+def load_design(path):
+    """Function reading a design file, by its extension, into a dictionary of {"variables": {name: fields},
+    "equations": {name: fields}}, both in the order they are given in the file."""
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension not in READERS:
+        raise ValueError("Design files must be %s files" % ", ".join(READERS))
+
+    design = READERS[extension](path)
+
+    for section in design:
+        if section not in ("variables", "equations"):
+            raise ValueError("Unknown section %r in the design file %s" % (section, path))
+
+    return {"variables": design.get("variables") or {}, "equations": design.get("equations") or {}}
+
+
+####################
+def build_variable(name, fields):
+    """Function making a Variable from the fields given for it in a design file, the numbers may be given as strings
+    (as they are read from CSV files) or as ints, and are converted to floats."""
+    unknown = set(fields) - set(VARIABLE_FIELDS)
+    if unknown:
+        raise ValueError("Unknown field(s) %s for the variable %s" % (", ".join(sorted(unknown)), name))
+
+    arguments = {}
+
+    for field, value in fields.items():
+        try:
+            if field in ("tol_type", "tol_pref"):
+                arguments[field] = int(value)
+
+            elif field in ("tol_decimals_unique", "tol_values_unique"):
+                plus, minus = value
+                arguments[field] = [float(plus), float(minus)]
+                arguments["unique_tolerances"] = True
+
+            else:
+                arguments[field] = Float(float(value))
+
+        except (TypeError, ValueError):
+            raise ValueError("The field %s of the variable %s is not valid: %r" % (field, name, value))
+
+    return Variable(name, **arguments)
+
+
+def iterate_equations(design, circuit, **equation_arguments):
+    """Generator function adding each equation of a design to circuit, in the order they are given, and yielding
+    (name, Equation) pairs as they are evaluated.
+
+    The expressions may use the variables of the design and the names of the equations before them (whose outputs are
+    chained through the circuit). Expressions with the same form share their compiled function through the expression
+    cache, so e.g. a hundred dividers are only compiled once."""
+    variables = {name: build_variable(name, fields) for name, fields in design["variables"].items()}
+
+    for name, fields in design["equations"].items():
+        unknown = set(fields) - set(EQUATION_FIELDS)
+        if unknown:
+            raise ValueError("Unknown field(s) %s for the equation %s" % (", ".join(sorted(unknown)), name))
+
+        if "expression" not in fields:
+            raise ValueError("The equation %s has no expression" % name)
+
+        symbols = dict(variables)
+        symbols.update(circuit.outputs)
+
+        try:
+            expression = parse_expr(str(fields["expression"]), local_dict=symbols)
+
+        except (SyntaxError, TypeError, ValueError) as error:
+            raise ValueError("The expression of the equation %s could not be read: %s" % (name, error))
+
+        used = [symbol for symbol in symbols.values() if symbol in expression.free_symbols]
+
+        arguments = dict(equation_arguments)
+        if "unit" in fields:
+            arguments["UoM"] = str(fields["unit"])
+
+        if "method" in fields:
+            arguments["method"] = str(fields["method"])
+
+        if "precision" in fields:
+            arguments["precision"] = str(fields["precision"])
+
+        circuit.add(name, expression, *used, quiet=True, **arguments)
+
+        yield name, circuit[name]
+
+
+####################
+def main(arguments=None):
+    parser = ArgumentParser(description="Evaluate every equation of a design file (TOML, YAML, or CSV).")
+    parser.add_argument("design", help="Design file of variables and equations")
+    parser.add_argument("--output", help="File to write the results to (by default JSON Lines to stdout)")
+    parser.add_argument("--format", choices=FORMATS, help="Format of the results (by default from --output)")
+    parser.add_argument("--corners", help="File to also write every corner of each equation to")
+    parser.add_argument("--method", choices=("vectorised", "worst_case", "rss", "substitution"), default="vectorised")
+    parser.add_argument("--precision", choices=PRECISIONS, help="Arithmetic the corners are evaluated with (by default "
+                                                                "float64, auto checks it and re-runs in high precision "
+                                                                "if needed)")
+    parser.add_argument("--digits", type=int, help="Significant digits of the high precision arithmetic")
+    parser.add_argument("--chunk-size", type=int, default=65536)
+    parser.add_argument("--workers", type=int, help="Number of processes to evaluate the corners with")
+    parser.add_argument("--cache", help="Directory to keep the results in, so unchanged equations are not evaluated "
+                                        "again in later runs")
+    parser.add_argument("--cache-size", type=int, default=64 * 2 ** 20, help="Size limit of the cache in bytes")
+    options = parser.parse_args(arguments)
+
+    output_format = options.format
+    if output_format is None:
+        output_format = os.path.splitext(options.output)[1].lstrip(".").lower() if options.output else "jsonl"
+
+    if output_format not in FORMATS:
+        parser.error("The format of the results must be one of %s" % ", ".join(FORMATS))
+
+    if output_format == "npy" and not options.output:
+        parser.error("npy results must be written to a file (--output)")
+
+    try:
+        design = load_design(options.design)
+
+    except (OSError, ValueError, tomllib.TOMLDecodeError) as error:
+        print("Could not read the design file: %s" % error, file=sys.stderr)
+        return 1
+
+    mode = "wb" if output_format == "npy" else "w"
+    newline = {"newline": ""} if output_format == "csv" else {}
+    handle = open(options.output, mode, **newline) if options.output else sys.stdout
+    corner_handle = open(options.corners, mode, **newline) if options.corners else None
+
+    cache = ResultCache(options.cache, max_bytes=options.cache_size) if options.cache else None
+    equations = iterate_equations(design, Circuit(), method=options.method, chunk_size=options.chunk_size,
+                                  workers=options.workers, cache=cache, precision=options.precision,
+                                  digits=options.digits)
+
+    try:
+        with FORMATS[output_format](handle, corner_handle, options.chunk_size) as writer:
+            writer.write_all(equations)
+
+    except (TypeError, ValueError) as error:
+        print("Could not evaluate the design: %s" % error, file=sys.stderr)
+        return 1
+
+    finally:
+        for file in (handle, corner_handle):
+            if file is not None and file is not sys.stdout:
+                file.close()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,239 @@
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from time import perf_counter
+import json
+import os
+import platform
+import subprocess
+import sys
+import tracemalloc
+
+import numpy
+import sympy
+from sympy import Add, Float
+
+from Variable import Variable
+from Equation import Equation
+
+
+# Includes a reproducible benchmark suite for the hot paths of the Variable and Equation classes
+#
+# Run with:  python Benchmark.py --output bench.json
+# Compare:   python Benchmark.py --output bench.json --baseline baseline.json --threshold 1.25
+# Start up:  python Benchmark.py --startup-only --startup-budget 0.1
+
+PHASES = ("variables", "construction", "corners", "nominal", "formatting", "monte_carlo", "substitution")
+
+
+####################
+def make_variables(count):
+    """Function building a synthetic design of count toleranced variables, cycling through every kind of tolerance
+    (plus/minus decimal, plus/minus value, only positive, only negative, and unique tolerances)."""
+    variables = []
+
+    for i in range(count):
+        name = 'R%d' % i
+        nominal = Float(1000.0 * (i + 1))
+        kind = i % 5
+
+        if kind == 0:
+            variables.append(Variable(name, nom_value=nominal, tol_decimal=Float(0.01)))
+
+        elif kind == 1:
+            variables.append(Variable(name, nom_value=nominal, tol_value=Float(5.0 * (i + 1))))
+
+        elif kind == 2:
+            variables.append(Variable(name, nom_value=nominal, tol_decimal=Float(0.05), tol_type=1))
+
+        elif kind == 3:
+            variables.append(Variable(name, nom_value=nominal, tol_decimal=Float(0.02), tol_type=2))
+
+        else:
+            variables.append(Variable(name, nom_value=nominal, unique_tolerances=True,
+                                      tol_values_unique=[20.0 * (i + 1), 10.0 * (i + 1)]))
+
+    return variables
+
+
+def make_expression(variables):
+    """Function building a divider network style expression of the given variables, the output of a 5 V supply
+    across the first variable, with the rest in series."""
+    return Float(5.0) * variables[0] / Add(*variables)
+
+
+####################
+def quietly(function, *arguments, **keyword_arguments):
+    """Function calling function with anything it prints thrown away."""
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        return function(*arguments, **keyword_arguments)
+
+
+def time_phase(function, repeats):
+    """Function returning the best wall time of repeats calls of function, and the peak memory allocated (as traced by
+    tracemalloc) during one more, separate, call."""
+    best = None
+    for _ in range(repeats):
+        start = perf_counter()
+        function()
+        elapsed = perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return best, peak
+
+
+####################
+def benchmark_design(count, repeats=5, phases=PHASES, max_table_variables=12, max_substitution_variables=6,
+                     samples=100000):
+    """Function running every benchmark phase for a synthetic design of count variables, returning a list of result
+    dictionaries. The corner table (nominal lookup) and reference substitution phases are skipped above the given
+    numbers of variables, as they grow as 3^n in memory and time respectively."""
+    variables = make_variables(count)
+    expression = make_expression(variables)
+    equation = quietly(Equation, expression, *variables)
+
+    benchmarks = {
+        "variables": lambda: make_variables(count),
+        "construction": lambda: quietly(Equation, expression, *variables),
+        "corners": equation.evaluate,
+        "formatting": lambda: quietly(equation.pretty_print),
+        "monte_carlo": lambda: equation.monte_carlo(samples, seed=0),
+    }
+
+    if count <= max_table_variables:
+        table_equation = quietly(Equation, expression, *variables, keep_corners=True)
+        benchmarks["nominal"] = table_equation.find_nominal
+
+    if count <= max_substitution_variables:
+        benchmarks["substitution"] = lambda: quietly(Equation, expression, *variables, method="substitution")
+
+    results = []
+    for phase in phases:
+        if phase not in benchmarks:
+            continue
+
+        seconds, peak = time_phase(benchmarks[phase], repeats)
+        results.append({"variables": count, "phase": phase, "seconds": seconds, "peak_bytes": peak})
+
+    return results
+
+
+def run(max_variables=16, repeats=5, phases=PHASES, **design_arguments):
+    """Function running the benchmarks for designs of 1 to max_variables variables, returning a dictionary of the
+    environment and the results, ready to be written out as JSON."""
+    results = []
+
+    for count in range(1, max_variables + 1):
+        results.extend(benchmark_design(count, repeats, phases, **design_arguments))
+
+    return {"timestamp": datetime.now(timezone.utc).isoformat(), "python": platform.python_version(),
+            "platform": platform.platform(), "numpy": numpy.__version__, "sympy": sympy.__version__,
+            "repeats": repeats, "results": results}
+
+
+####################
+def import_time(modules, repeats=5):
+    """Function returning the best time, over repeats fresh interpreters, taken to import the given modules (the
+    interpreter's own start up is not included)."""
+    statement = ("import time; start = time.perf_counter(); import %s; print(time.perf_counter() - start)"
+                 % ", ".join(modules))
+    best = None
+
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", statement], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        elapsed = float(output.stdout.split()[-1])
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def startup(repeats=5):
+    """Function measuring the cold start of the Variable and Equation modules, returning a dictionary of the time to
+    import them, the time to import SymPy on its own, and the difference (the overhead of this package's modules).
+
+    SymPy is needed to define the Variable class (a SymPy Symbol) so its import time is a floor which cannot be
+    deferred, whereas NumPy and UliEngineering are only loaded when they are first used (see LazyImport)."""
+    seconds = import_time(["Variable", "Equation"], repeats)
+    sympy_seconds = import_time(["sympy"], repeats)
+
+    return {"seconds": seconds, "sympy_seconds": sympy_seconds, "overhead_seconds": seconds - sympy_seconds}
+
+
+####################
+def compare(report, baseline, threshold=1.25):
+    """Function comparing the results of a report against a baseline report, returning a list of
+    (variables, phase, seconds, baseline seconds) for every result slower than threshold times the baseline."""
+    baseline_seconds = {(result["variables"], result["phase"]): result["seconds"] for result in baseline["results"]}
+    regressions = []
+
+    for result in report["results"]:
+        key = (result["variables"], result["phase"])
+
+        if key in baseline_seconds and result["seconds"] > threshold * baseline_seconds[key]:
+            regressions.append((result["variables"], result["phase"], result["seconds"], baseline_seconds[key]))
+
+    return regressions
+
+
+def main(arguments=None):
+    parser = ArgumentParser(description="Benchmark the corner enumeration, Monte Carlo and formatting hot paths.")
+    parser.add_argument("--max-variables", type=int, default=16)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--phases", nargs="+", default=list(PHASES), choices=PHASES)
+    parser.add_argument("--samples", type=int, default=100000, help="Monte Carlo samples per run")
+    parser.add_argument("--max-table-variables", type=int, default=12)
+    parser.add_argument("--max-substitution-variables", type=int, default=6)
+    parser.add_argument("--output", default="bench.json", help="JSON file to write the results to")
+    parser.add_argument("--baseline", help="JSON file of earlier results to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="Slow down factor over the baseline reported as a regression")
+    parser.add_argument("--startup-budget", type=float, default=0.1,
+                        help="Seconds the Variable and Equation imports may add on top of importing SymPy")
+    parser.add_argument("--startup-only", action="store_true", help="Only run the start up time check")
+    options = parser.parse_args(arguments)
+
+    startup_result = startup(options.repeats)
+    print("Start up: %.6f s to import Variable and Equation, %.6f s of which is SymPy (%.6f s overhead)"
+          % (startup_result["seconds"], startup_result["sympy_seconds"], startup_result["overhead_seconds"]))
+
+    slow_startup = startup_result["overhead_seconds"] > options.startup_budget
+    if slow_startup:
+        print("REGRESSION: the start up overhead of %.6f s is over the budget of %.6f s"
+              % (startup_result["overhead_seconds"], options.startup_budget))
+
+    if options.startup_only:
+        return 1 if slow_startup else 0
+
+    report = run(options.max_variables, options.repeats, options.phases, samples=options.samples,
+                 max_table_variables=options.max_table_variables,
+                 max_substitution_variables=options.max_substitution_variables)
+    report["startup"] = startup_result
+
+    with open(options.output, "w") as output:
+        json.dump(report, output, indent=1)
+
+    for result in report["results"]:
+        print("%2d variables  %-12s %10.6f s  %12d bytes peak" % (result["variables"], result["phase"],
+                                                                   result["seconds"], result["peak_bytes"]))
+
+    if options.baseline:
+        with open(options.baseline) as baseline_file:
+            regressions = compare(report, json.load(baseline_file), options.threshold)
+
+        for count, phase, seconds, baseline_seconds in regressions:
+            print("REGRESSION: %d variables %s took %.6f s against a baseline of %.6f s"
+                  % (count, phase, seconds, baseline_seconds))
+
+        return 1 if regressions or slow_startup else 0
+
+    return 1 if slow_startup else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
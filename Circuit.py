@@ -0,0 +1,134 @@
+from Variable import Variable
+from Equation import Equation
+
+
+# Includes a class for chaining equations together, where the result of one equation is a variable of the next
+
+
+class Circuit:
+    """Class for a circuit made of a chain (directed acyclic graph) of equations, e.g. a divider ratio which feeds a
+    threshold voltage, which in turn feeds a hysteresis current.
+
+    Each equation added to the circuit has an output Variable, named after the equation, which holds the equation's
+    nominal value and its plus/minus tolerances and can be used in the expressions of equations added later. The
+    results of every equation (and so every output Variable) are kept between evaluations, and when a variable
+    changes only the equations downstream of it are re-evaluated, in topological order.
+
+    Note that an output Variable only carries the range of its equation's result, so any correlation between it and
+    the other variables of a downstream equation (e.g. the same resistor used in both) is not tracked."""
+
+    def __init__(self):
+        self.equations = {}  # Equations by name, in the order they were added
+        self.outputs = {}  # Output variables by name
+        self.order = []  # Names of the equations in topological order
+
+    ####################
+    def __getitem__(self, name):
+        return self.equations[name]
+
+    def __contains__(self, name):
+        return name in self.equations
+
+    def __len__(self):
+        return len(self.equations)
+
+    ####################
+    def add(self, name, expression, *variables, **equation_arguments):
+        """Method to add an equation to the circuit, any keyword arguments are passed on to the Equation. The output
+        Variable of the equation is returned, for use in the expressions of later equations.
+
+        The variables may include the outputs of equations already in the circuit."""
+        if name in self.equations:
+            raise ValueError("The circuit already has an equation named %s" % name)
+
+        equation = Equation(expression, *variables, **equation_arguments)
+
+        if equation.minimum is None or equation.maximum is None:
+            raise ValueError("The equation %s must have a numeric result to be part of a circuit" % name)
+
+        output = Variable(name, nom_value=float(equation.nominal[1]))
+
+        self.equations[name] = equation
+        self.outputs[name] = output
+        self.order = self.topological_order()
+        self.update_output(name)
+
+        return output
+
+    ####################
+    def output(self, name):
+        """Method returning the output Variable of the named equation."""
+        return self.outputs[name]
+
+    def dependencies(self, name):
+        """Method returning the names of the equations whose outputs are variables of the named equation."""
+        return [upstream for upstream, output in self.outputs.items()
+                if upstream != name and output in self.equations[name].variables]
+
+    def downstream(self, name):
+        """Method returning the names of every equation which depends, directly or not, on the named equation, in
+        topological order."""
+        affected = {name}
+
+        for other in self.order:
+            if other not in affected and any(upstream in affected for upstream in self.dependencies(other)):
+                affected.add(other)
+
+        return [other for other in self.order if other in affected and other != name]
+
+    def topological_order(self):
+        """Method returning the names of the equations ordered so that every equation comes after the equations it
+        depends on (Kahn's algorithm), raising a ValueError if the equations depend on each other in a loop."""
+        remaining = {name: set(self.dependencies(name)) for name in self.equations}
+        order = []
+
+        while remaining:
+            ready = [name for name, upstream in remaining.items() if not upstream]
+
+            if not ready:
+                raise ValueError("The equations of the circuit depend on each other in a loop: %s"
+                                 % ", ".join(remaining))
+
+            for name in ready:
+                order.append(name)
+                del remaining[name]
+
+            for upstream in remaining.values():
+                upstream.difference_update(ready)
+
+        return order
+
+    ####################
+    def update_output(self, name):
+        """Method to copy the results of the named equation into its output Variable, which marks the equations using
+        it as needing re-evaluation if the results changed. Returns True if they did."""
+        equation = self.equations[name]
+        nominal = float(equation.nominal[1])
+
+        return self.outputs[name].set_values(nominal, float(equation.maximum[1]) - nominal,
+                                             nominal - float(equation.minimum[1]))
+
+    def evaluate(self):
+        """Method to bring every equation of the circuit up to date, in topological order.
+
+        Only equations with a changed variable are re-evaluated (see Equation.update_values), and an equation's
+        downstream equations are only marked for re-evaluation if its output actually changed, so a change to one
+        component only recalculates the part of the circuit it feeds into. The names of the equations which were
+        re-evaluated are returned."""
+        evaluated = []
+
+        for name in self.order:
+            if self.equations[name].update_values():
+                evaluated.append(name)
+                self.update_output(name)
+
+        return evaluated
+
+    ####################
+    def results(self):
+        """Method returning a dictionary of {name: (nominal, minimum, maximum)} for every equation of the circuit, in
+        topological order, evaluating anything out of date first."""
+        self.evaluate()
+
+        return {name: (self.equations[name].nominal[1], self.equations[name].minimum[1],
+                       self.equations[name].maximum[1]) for name in self.order}
@@ -0,0 +1,453 @@
+from functools import lru_cache
+from heapq import heappush, heappushpop
+from math import floor, log10
+
+from LazyImport import lazy_import
+from Variable import Variable
+
+numpy = lazy_import("numpy")
+
+
+# Includes tables of the standard (IEC 60063) E-series component values, and a class for choosing standard values for
+#   the variables of an equation so that its worst case output stays within a window
+
+E24 = (1.0, 1.1, 1.2, 1.3, 1.5, 1.6, 1.8, 2.0, 2.2, 2.4, 2.7, 3.0,
+       3.3, 3.6, 3.9, 4.3, 4.7, 5.1, 5.6, 6.2, 6.8, 7.5, 8.2, 9.1)
+
+# E48 and above follow the rounded geometric series, apart from 9.20 (rather than 9.19) in E192
+E192 = tuple(9.2 if i == 185 else round(10 ** (i / 192), 2) for i in range(192))
+
+E_SERIES = {"E3": E24[::8], "E6": E24[::4], "E12": E24[::2], "E24": E24, "E48": E192[::4], "E96": E192[::2],
+            "E192": E192}
+
+# The tolerance usually made in each series, used when no tolerance is given
+SERIES_TOLERANCES = {"E3": 0.4, "E6": 0.2, "E12": 0.1, "E24": 0.05, "E48": 0.02, "E96": 0.01, "E192": 0.005}
+
+# Roughly how many combinations of values are evaluated in one call (see ComponentSelection.finish)
+BLOCK_SIZE = 65536
+
+
+####################
+@lru_cache(maxsize=None)
+def series_values(series, minimum, maximum):
+    """Function returning the sorted float array of every value of an E-series between minimum and maximum (inclusive),
+    across as many decades as needed. The tables are built once for each (series, minimum, maximum) and kept."""
+    if series not in E_SERIES:
+        raise ValueError("The series must be one of %s" % ", ".join(E_SERIES))
+
+    if not 0 < minimum <= maximum:
+        raise ValueError("The range of values must be positive, with the minimum no more than the maximum")
+
+    values = []
+    for decade in range(floor(log10(minimum)), floor(log10(maximum)) + 1):
+        for base in E_SERIES[series]:
+            value = float("%.2fe%d" % (base, decade))  # Built from its decimal form so that e.g. 1.1e3 is exactly 1100
+
+            if minimum <= value <= maximum:
+                values.append(value)
+
+    values = numpy.array(values, dtype=numpy.float64)
+    values.flags.writeable = False
+
+    return values
+
+
+class Selection:
+    """Class holding one combination of standard values found by ComponentSelection, with the output of the equation
+    it gives: the nominal value, the worst case minimum and maximum, and the margin from the nearest edge of the
+    window (larger is better)."""
+
+    def __init__(self, values, tolerances, nominal, minimum, maximum, margin):
+        self.values = values  # Dictionary of {variable: value}
+        self.tolerances = tolerances  # Dictionary of {variable: decimal tolerance}
+        self.nominal = nominal
+        self.minimum = minimum
+        self.maximum = maximum
+        self.margin = margin
+
+    def __repr__(self):
+        return "Selection(%s -> nominal %g, range %g to %g, margin %g)" % (
+            ", ".join("%s=%g" % (variable, value) for variable, value in self.values.items()), self.nominal,
+            self.minimum, self.maximum, self.margin)
+
+
+class ComponentSelection:
+    """Class for searching the standard values of the variables of an equation (e.g. resistors) for the combinations
+    whose worst case output range lies within a window of low to high (either may be None).
+
+    Each variable allowed to change is given the E-series and tolerance grade it may be chosen from (see allow), the
+    other variables keep their current values and tolerances. The search relies on the expression being monotonic in
+    each variable over the whole search box (see Equation.variable_monotonicity), so that the worst case range of any
+    combination is found from only two evaluations, rather than every corner. The variables are chosen one at a time,
+    and at each step every standard value of the next variable is evaluated at once against the best case of the
+    variables not yet chosen; values which cannot possibly meet the window, or once max_results selections are kept,
+    beat the worst of them, are pruned along with every combination beneath them. The last few variables are chosen
+    together, with the last found by bisection rather than trying each of its values (see finish). This keeps 4 or 5
+    free variables practical where brute force would try 96^5 combinations.
+
+    A variable in which the expression could not be shown to be monotonic has all its corners enumerated instead, and
+    the pruning of any step it has not yet been chosen for is skipped, so the search is still exact, only slower."""
+
+    def __init__(self, equation, low=None, high=None):
+        if low is None and high is None:
+            raise ValueError("At least one of the low and high limits of the window must be given")
+
+        if low is not None and high is not None and low > high:
+            raise ValueError("The low limit of the window must not be above the high limit")
+
+        if not equation.can_vectorise():
+            raise ValueError("Choosing components needs every symbol in the expression to be given as a variable")
+
+        self.equation = equation
+        self.low = low
+        self.high = high
+        self.choices = {}  # {variable: (sorted standard values, decimal tolerance)}, in the order they were allowed
+
+        self.evaluations = 0  # Expression evaluations made by the last search
+        self.pruned = 0  # Partial combinations pruned by the last search
+
+    ####################
+    def allow(self, variable, series="E96", tolerance=None, minimum=1.0, maximum=1e7):
+        """Method to let a variable of the equation be chosen from the values of an E-series (e.g. "E96") between
+        minimum and maximum, with a plus/minus decimal tolerance (by default the usual grade of the series)."""
+        if not isinstance(variable, Variable) or variable not in self.equation.variables:
+            raise ValueError("Only variables of the equation can be chosen")
+
+        if series not in E_SERIES:
+            raise ValueError("The series must be one of %s" % ", ".join(E_SERIES))
+
+        if tolerance is None:
+            tolerance = SERIES_TOLERANCES[series]
+
+        if not 0 <= tolerance < 1:
+            raise ValueError("The tolerance must be a decimal between 0 and 1")
+
+        values = series_values(series, float(minimum), float(maximum))
+        if len(values) == 0:
+            raise ValueError("The %s series has no values between %g and %g" % (series, minimum, maximum))
+
+        self.choices[variable] = (values, float(tolerance))
+
+    ####################
+    def search(self, max_results=10):
+        """Method returning a list of up to max_results (or every, if None) Selections meeting the window, best margin
+        first."""
+        if not self.choices:
+            raise ValueError("No variables have been allowed to be chosen (see allow)")
+
+        variables = self.equation.variables
+        ranges = {variable: (values[0] * (1 - tolerance), values[-1] * (1 + tolerance))
+                  for variable, (values, tolerance) in self.choices.items()}
+        signs = self.equation.variable_monotonicity(ranges)
+
+        # The variables whose direction is unknown are chosen first, as no best case can be found for them until then,
+        #   and those with the most values last, where they are chosen together for every step above (see finish)
+        order = sorted((variables.index(variable) for variable in self.choices),
+                       key=lambda index: (signs[index] is not None, len(self.choices[variables[index]][0])))
+
+        # Each variable whose direction is unknown gets an axis of its own to enumerate its corners along
+        unknown = [index for index, sign in enumerate(signs) if sign is None]
+        axes = {index: axis for axis, index in enumerate(unknown, start=1)}
+
+        self.kernel = self.equation.compile_kernel()
+        self.signs = signs
+        self.axes = axes
+        self.dimensions = 1 + len(unknown)
+        self.points = self.equation.corner_points()
+
+        self.evaluations = 0
+        self.pruned = 0
+        self.results = []
+        self.max_results = max_results
+
+        self.descend(order, 0, {})
+
+        selections = [selection for _, _, selection in sorted(self.results, key=lambda item: item[:2], reverse=True)]
+        for selection in selections:
+            arguments = [selection.values.get(variable, float(variable.nom_value)) for variable in variables]
+            selection.nominal = float(self.kernel(*arguments))
+
+        return selections
+
+    ####################
+    def arguments(self, index, values, end):
+        """Method returning the argument array of a variable for one end (-1 for the worst case minimum of the output,
+        +1 for the maximum) of the output range, from a (candidates, corner values) array of the values it can take.
+
+        Where the direction of the expression in the variable is known only the corner value giving that end is kept,
+        otherwise every corner value is kept along the variable's own axis."""
+        sign = self.signs[index]
+
+        if sign is not None:
+            values = values.max(axis=1) if sign * end > 0 else values.min(axis=1)
+            return values.reshape((len(values),) + (1,) * (self.dimensions - 1))
+
+        shape = [1] * self.dimensions
+        shape[0] = values.shape[0]
+        shape[self.axes[index]] = values.shape[1]
+
+        return values.reshape(shape)
+
+    def output_range(self, low_arguments, high_arguments, candidates):
+        """Method evaluating the lowest and highest output, one per candidate, from the argument arrays of each end."""
+        lows = numpy.asarray(self.kernel(*low_arguments), dtype=numpy.float64)
+        highs = numpy.asarray(self.kernel(*high_arguments), dtype=numpy.float64)
+
+        shape = numpy.broadcast_shapes(*(argument.shape for argument in low_arguments + high_arguments))
+        shape = (candidates,) + shape[1:]
+        self.evaluations += 2 * int(numpy.prod(shape))
+
+        axes = tuple(range(1, self.dimensions))
+        lows = numpy.broadcast_to(lows, shape).min(axis=axes) if axes else numpy.broadcast_to(lows, shape)
+        highs = numpy.broadcast_to(highs, shape).max(axis=axes) if axes else numpy.broadcast_to(highs, shape)
+
+        return lows, highs
+
+    def sides(self, lows, highs):
+        """Method returning the arrays of the margins of each candidate's output range from the low and from the high
+        edge of the window (infinite for a missing edge, negative if outside it)."""
+        above = lows - self.low if self.low is not None else numpy.full(len(lows), numpy.inf)
+        below = self.high - highs if self.high is not None else numpy.full(len(highs), numpy.inf)
+
+        return above, below
+
+    def margins(self, lows, highs):
+        """Method returning the margin of each candidate's output range from the nearest edge of the window (negative
+        if it lies outside)."""
+        return numpy.minimum(*self.sides(lows, highs))
+
+    def bound(self):
+        """Method returning the margin a combination must reach to be kept: that of the worst of the max_results
+        selections kept so far once there are that many, and otherwise 0 (only meeting the window)."""
+        if self.max_results is not None and len(self.results) >= self.max_results:
+            return self.results[0][0]
+
+        return 0.0
+
+    ####################
+    def ends(self, chosen, candidates):
+        """Method returning the low and high argument arrays for evaluating every candidate at once, from the values
+        already chosen (chosen, {index: value}) and the candidates ({index: array of values}, all the same length).
+
+        The variables not yet chosen are at whichever end of their values gives the best case (the highest possible
+        minimum, and the lowest possible maximum). If there is no best case for one of them (its direction is
+        unknown), None is returned."""
+        variables = self.equation.variables
+        low_arguments = []
+        high_arguments = []
+
+        for other, variable in enumerate(variables):
+            if other in candidates:
+                tolerance = self.choices[variable][1]
+
+                if self.signs[other] is not None:  # Only the end giving each end of the output is needed
+                    shape = (len(candidates[other]),) + (1,) * (self.dimensions - 1)
+                    low_arguments.append((candidates[other] * (1 - self.signs[other] * tolerance)).reshape(shape))
+                    high_arguments.append((candidates[other] * (1 + self.signs[other] * tolerance)).reshape(shape))
+                    continue
+
+                values = numpy.outer(candidates[other], [1 + tolerance, 1.0, 1 - tolerance])
+
+            elif other in chosen:
+                other_tolerance = self.choices[variable][1]
+                values = chosen[other] * numpy.array([[1 + other_tolerance, 1.0, 1 - other_tolerance]])
+
+            elif variable in self.choices:
+                if self.signs[other] is None:
+                    return None
+
+                other_values, other_tolerance = self.choices[variable]
+                lowest = other_values[0] * (1 + other_tolerance)
+                highest = other_values[-1] * (1 - other_tolerance)
+
+                shape = (1,) * self.dimensions
+                low_arguments.append(numpy.full(shape, highest if self.signs[other] > 0 else lowest))
+                high_arguments.append(numpy.full(shape, lowest if self.signs[other] > 0 else highest))
+                continue
+
+            else:
+                values = self.points[other].reshape(1, -1)
+
+            low_arguments.append(self.arguments(other, values, -1))
+            high_arguments.append(self.arguments(other, values, +1))
+
+        return low_arguments, high_arguments
+
+    def evaluate(self, chosen, candidates):
+        """Method returning the lowest and highest output of every complete combination of the chosen values and each
+        of the candidates ({index: array of values}, all the same length)."""
+        count = len(next(iter(candidates.values())))
+        return self.output_range(*self.ends(chosen, candidates), count)
+
+    def descend(self, order, level, chosen):
+        """Method choosing the variable order[level] given the values already chosen for those before it (chosen,
+        {index: value}), recursing into every value which could still lead to a combination good enough to be kept.
+
+        Every value of the variable is evaluated at once against the best case of the variables not yet chosen (see
+        ends), which bounds the margin of every combination beneath it, so a value is pruned if it could not meet the
+        window, or once max_results selections are kept, could not beat the worst of them (see bound). The values are
+        tried best first, so that the bound rises quickly. Once few enough combinations of the remaining variables are
+        left, they are chosen together (see finish)."""
+        variables = self.equation.variables
+        remaining = [len(self.choices[variables[other]][0]) for other in order[level:-1]]
+
+        if numpy.prod(remaining, dtype=numpy.float64) <= BLOCK_SIZE:
+            self.finish(order[level:], chosen)
+            return
+
+        index = order[level]
+        candidates = self.choices[variables[index]][0]
+        arguments = self.ends(chosen, {index: candidates})
+
+        if arguments is None:  # No best case can be found, so nothing is pruned at this step
+            for candidate in candidates:
+                self.descend(order, level + 1, {**chosen, index: candidate})
+
+            return
+
+        margins = self.margins(*self.output_range(*arguments, len(candidates)))
+
+        keep = numpy.flatnonzero(margins >= self.bound())
+        keep = keep[numpy.argsort(-margins[keep], kind="stable")]
+        self.pruned += len(candidates) - len(keep)
+
+        for position, candidate in enumerate(keep):
+            if margins[candidate] < self.bound():  # The bound has risen past this and every later (worse) value
+                self.pruned += len(keep) - position
+                break
+
+            self.descend(order, level + 1, {**chosen, index: candidates[candidate]})
+
+    def finish(self, remaining, chosen):
+        """Method choosing the remaining variables together: every combination (prefix) of the values of all but the
+        last is evaluated at once, and the last is chosen for all of them at once.
+
+        The output range of a prefix moves monotonically with the last variable, so the margin from the low edge of the
+        window only grows along its (sorted) values and the margin from the high edge only shrinks. The best value for
+        each prefix, where they cross, is found by a bisection of the values, and only prefixes whose best margin is
+        good enough to be kept are evaluated further, at the max_results values either side of it, rather than at
+        every value. If the direction of the last variable is unknown, every value is evaluated instead."""
+        variables = self.equation.variables
+        last = remaining[-1]
+        values = self.choices[variables[last]][0]
+
+        grids = numpy.meshgrid(*(self.choices[variables[index]][0] for index in remaining[:-1]), indexing="ij")
+        prefixes = {index: grid.ravel() for index, grid in zip(remaining[:-1], grids)}
+        count = len(grids[0].ravel()) if grids else 1
+
+        sign = self.signs[last]
+
+        if sign is None:
+            window = numpy.broadcast_to(numpy.arange(len(values)), (count, len(values)))
+            self.keep_window(chosen, prefixes, numpy.arange(count), last, values, window)
+            return
+
+        if prefixes:  # Drop the prefixes which cannot be kept whatever the last value
+            best = self.margins(*self.output_range(*self.ends(chosen, prefixes), count))
+            rows = numpy.flatnonzero(best >= self.bound())
+            self.pruned += count - len(rows)
+
+        else:
+            rows = numpy.zeros(1, dtype=numpy.intp)
+
+        if sign < 0:  # Sorted so that the output rises with the values
+            values = values[::-1]
+
+        crossing = self.crossing(chosen, prefixes, rows, last, values)
+
+        # The best value of each prefix is on one side or the other of where the margins cross
+        sides = numpy.clip(crossing[:, None] + numpy.array([-1, 0]), 0, len(values) - 1)
+        peaks = self.margins(*self.evaluate(chosen, self.pairs(prefixes, rows, last, values, sides)))
+        good = peaks.reshape(len(rows), 2).max(axis=1) >= self.bound()
+        self.pruned += len(rows) - int(good.sum())
+
+        rows = rows[good]
+        crossing = crossing[good]
+
+        if self.max_results is None or 2 * self.max_results >= len(values):
+            window = numpy.broadcast_to(numpy.arange(len(values)), (len(rows), len(values)))
+
+        else:
+            starts = numpy.clip(crossing - self.max_results, 0, len(values) - 2 * self.max_results)
+            window = starts[:, None] + numpy.arange(2 * self.max_results)
+
+        self.keep_window(chosen, prefixes, rows, last, values, window)
+
+    def pairs(self, prefixes, rows, last, values, window):
+        """Method returning the candidates ({index: array of values}) pairing each prefix at rows with the values of
+        the last variable at the positions of its row of window."""
+        width = window.shape[1]
+        candidates = {index: numpy.repeat(prefix[rows], width) for index, prefix in prefixes.items()}
+        candidates[last] = values[window.ravel()]
+
+        return candidates
+
+    def crossing(self, chosen, prefixes, rows, last, values):
+        """Method returning, for each prefix at rows, the first position in values (along which the output rises) at
+        which the margin from the low edge of the window is no less than that from the high edge, found by bisection
+        for every prefix at once."""
+        low = numpy.zeros(len(rows), dtype=numpy.intp)
+        high = numpy.full(len(rows), len(values), dtype=numpy.intp)
+
+        while numpy.any(low < high):
+            middle = numpy.minimum((low + high) // 2, len(values) - 1)
+            above, below = self.sides(*self.evaluate(chosen, self.pairs(prefixes, rows, last, values,
+                                                                        middle[:, None])))
+            crossed = above >= below
+
+            searching = low < high
+            high = numpy.where(searching & crossed, middle, high)
+            low = numpy.where(searching & ~crossed, middle + 1, low)
+
+        return low
+
+    def keep_window(self, chosen, prefixes, rows, last, values, window):
+        """Method evaluating each prefix at rows with the values of the last variable at the positions of its row of
+        window, in blocks of about BLOCK_SIZE combinations, keeping the best (see keep_best)."""
+        block = max(1, BLOCK_SIZE // max(window.shape[1], 1))
+
+        for start in range(0, len(rows), block):
+            candidates = self.pairs(prefixes, rows[start:start + block], last, values, window[start:start + block])
+            self.keep_best(chosen, candidates, *self.evaluate(chosen, candidates))
+
+    def keep_best(self, chosen, candidates, lows, highs):
+        """Method recording the complete combinations of the chosen values and each of the candidates ({index: array
+        of values}) which are good enough to be kept. At most max_results of them can be, so only the best of them
+        are recorded."""
+        margins = self.margins(lows, highs)
+        keep = numpy.flatnonzero(margins >= self.bound())
+
+        if self.max_results is not None and len(keep) > self.max_results:
+            # Best margin first, ties going to the smallest values (as in record)
+            keys = [candidates[index][keep] for index in sorted(candidates, reverse=True)]
+            keep = keep[numpy.lexsort(keys + [-margins[keep]])[:self.max_results]]
+
+        for candidate in keep:
+            values = {**chosen, **{index: values[candidate] for index, values in candidates.items()}}
+            self.record(values, float(margins[candidate]), lows[candidate], highs[candidate])
+
+    def record(self, chosen, margin, low, high):
+        """Method keeping a combination meeting the window, if it is one of the max_results best so far. Of
+        combinations with the same margin, the one with the smallest values (in the order of the variables) is kept,
+        so the results do not depend on the order the combinations were found in."""
+        variables = self.equation.variables
+        values = {variables[index]: float(value) for index, value in sorted(chosen.items())}
+        tolerances = {variable: self.choices[variable][1] for variable in values}
+        item = (margin, tuple(-value for value in values.values()),
+                Selection(values, tolerances, None, float(low), float(high), margin))
+
+        if self.max_results is None or len(self.results) < self.max_results:
+            heappush(self.results, item)
+
+        elif item[:2] > self.results[0][:2]:
+            heappushpop(self.results, item)
+
+    ####################
+    def apply(self, selection):
+        """Method setting the chosen variables to the values and tolerances of a Selection, after which the equation is
+        re-evaluated (see Equation.update_values)."""
+        for variable, value in selection.values.items():
+            tolerance = value * selection.tolerances[variable]
+            variable.set_values(value, tolerance, tolerance)
+
+        return self.equation.update_values()
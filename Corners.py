@@ -0,0 +1,537 @@
+import json
+import os
+
+from LazyImport import lazy_import
+
+numpy = lazy_import("numpy")
+
+
+# Includes functions and classes for streaming through, and storing, the corners of an equation
+
+# State codes given to the values a variable takes across the corners, in the same order as its value_range, for each
+#   tolerance type (0 = plus/minus, 1 = only positive, 2 = only negative). A variable without tolerances is always 0.
+CORNER_STATES = {0: [1, 0, -1],
+                 1: [1, 0],
+                 2: [0, -1]}
+
+STATE_LABELS = {1: 'Maximal', 0: 'Nominal', -1: 'Minimal'}
+
+
+####################
+def state_parameters(variables, states):
+    """Function building the parameter string (eg. "x Maximal, y Nominal, ...") of a corner from its state codes."""
+    return ", ".join("%s %s" % (variable, STATE_LABELS[int(state)]) for variable, state in zip(variables, states))
+
+
+####################
+def grid_states(states):
+    """Function returning the int8 state matrix, one row per corner in corner order and one column per variable, of
+    every corner made from the given per variable state codes (see Equation.corner_states)."""
+    count = 1
+    for variable_states in states:
+        count *= len(variable_states)
+
+    return chunk_states(states, 0, count)
+
+
+def chunk_states(states, start, count):
+    """Function returning the rows of the state matrix (see grid_states) for the count corners from index start in
+    corner order, so that the states of a chunk of corners can be made without the whole matrix."""
+    matrix = numpy.empty((count, len(states)), dtype=numpy.int8)
+    indices = numpy.arange(start, start + count)
+    stride = 1
+
+    for column, variable_states in enumerate(states):
+        column_states = numpy.asarray(variable_states, dtype=numpy.int8)
+        matrix[:, column] = column_states[(indices // stride) % len(variable_states)]
+        stride *= len(variable_states)
+
+    return matrix
+
+
+class CornerTable:
+    """Class holding every corner of an equation compactly, as an int8 matrix of state codes (one row per corner and
+    one column per variable, with +1 Maximal, 0 Nominal, and -1 Minimal) next to a vector of the corner values.
+
+    The values are float64 when they are numeric (an object array otherwise), and parameter strings are only made for
+    the rows which are asked for."""
+
+    def __init__(self, variables, states, values):
+        if len(states) != len(values):
+            raise ValueError("There must be one row of states for each corner value")
+
+        self.variables = list(variables)
+        self.states = numpy.asarray(states, dtype=numpy.int8).reshape(len(values), len(self.variables))
+
+        try:
+            self.values = numpy.asarray(values, dtype=numpy.float64)
+
+        except (TypeError, ValueError):  # Symbolic values
+            self.values = numpy.asarray(values, dtype=object)
+
+    def __len__(self):
+        return len(self.values)
+
+    ####################
+    def parameters(self, row):
+        """Method returning the parameter string of a row of the table."""
+        return state_parameters(self.variables, self.states[row])
+
+    def row(self, row):
+        """Method returning a row of the table as a [parameters, value] pair."""
+        return [self.parameters(row), self.values[row]]
+
+    def rows(self, indices=None):
+        """Generator method yielding [parameters, value] pairs for the given rows, by default every row."""
+        if indices is None:
+            indices = range(len(self))
+
+        for row in indices:
+            yield self.row(row)
+
+    ####################
+    def chunks(self, chunk_size=65536):
+        """Generator method yielding the table as (start, states, values) chunks of at most chunk_size rows, so that a
+        table kept on disk (see MappedCornerTable) is only read a chunk at a time."""
+        for start in range(0, len(self), chunk_size):
+            stop = min(start + chunk_size, len(self))
+            yield start, self.states[start:stop], self.values[start:stop]
+
+    def nominal_index(self):
+        """Method returning the index of the row where every variable is nominal (all its states are 0)."""
+        rows = [start + numpy.flatnonzero(~states.any(axis=1)) for start, states, _ in self.chunks()]
+        rows = numpy.concatenate(rows) if rows else []
+
+        if len(rows) != 1:
+            raise ValueError("Something went wrong when setting the nominal value of equation")
+
+        return int(rows[0])
+
+    def top(self, count=10, largest=True, chunk_size=65536):
+        """Method returning the indices of the count rows with the largest (or, if largest is False, smallest) values,
+        most extreme first, e.g. the worst corners for an audit. Rows with equal values are taken in corner order, also
+        at the cut off, so the result does not depend on chunk_size. Only count candidates are kept between chunks."""
+        if self.values.dtype == object:
+            raise ValueError("Only a table of numeric values can be ranked")
+
+        sign = -1.0 if largest else 1.0
+        candidates = numpy.empty(0, dtype=numpy.int64)
+        keys = numpy.empty(0, dtype=numpy.float64)
+
+        for start, _, values in self.chunks(chunk_size):
+            candidates = numpy.concatenate([candidates, numpy.arange(start, start + len(values))])
+            keys = numpy.concatenate([keys, sign * numpy.asarray(values, dtype=numpy.float64)])
+
+            if len(keys) > count:
+                if count:  # Every row tied with the last one kept is sorted with the others, not cut arbitrarily
+                    cut = numpy.partition(keys, count - 1)[count - 1]
+                    tied = numpy.flatnonzero(keys <= cut) if not numpy.isnan(cut) else numpy.arange(len(keys))
+                    kept = tied[numpy.lexsort((candidates[tied], keys[tied]))[:count]]
+
+                else:
+                    kept = []
+
+                candidates = candidates[kept]
+                keys = keys[kept]
+
+        order = numpy.lexsort((candidates, keys))  # Ties in corner order
+        return candidates[order]
+
+    def where(self, conditions, chunk_size=65536):
+        """Method returning the indices of the rows matching every one of the conditions, a dictionary of
+        {variable (or its name): state code}, e.g. {r_hys: 1, "V_in": -1} for R_hys Maximal with V_in Minimal."""
+        names = [str(variable) for variable in self.variables]
+        columns = []
+
+        for variable, state in conditions.items():
+            if str(variable) not in names:
+                raise ValueError("The table has no variable %s" % variable)
+
+            if state not in STATE_LABELS:
+                raise ValueError("The state of %s must be 1 (Maximal), 0 (Nominal), or -1 (Minimal)" % variable)
+
+            columns.append((names.index(str(variable)), state))
+
+        rows = []
+        for start, states, _ in self.chunks(chunk_size):
+            matches = numpy.ones(len(states), dtype=bool)
+
+            for column, state in columns:
+                matches &= states[:, column] == state
+
+            rows.append(start + numpy.flatnonzero(matches))
+
+        return numpy.concatenate(rows) if rows else numpy.empty(0, dtype=numpy.int64)
+
+
+class MappedCornerTable(CornerTable):
+    """Class for a CornerTable kept on disk rather than in memory, for tables far too large to hold (3^15 corners
+    are about 14 million rows), e.g. as an audit trail of every corner.
+
+    The table is a directory of two NumPy .npy files, the int8 state codes (states.npy) and float64 values
+    (values.npy), which are memory mapped so only the parts read are loaded, and a JSON file of the variable (or
+    dimension) labels. A table is made with create, written chunk by chunk in corner order (see store), and read back
+    later, e.g. from another process, with MappedCornerTable(directory)."""
+
+    def __init__(self, directory, mode="r"):
+        self.directory = os.fspath(directory)
+
+        try:
+            with open(os.path.join(self.directory, "corners.json")) as file:
+                self.variables = json.load(file)["labels"]
+
+        except (OSError, ValueError, KeyError):
+            raise ValueError("%s is not a corner table directory" % self.directory)
+
+        self.states = numpy.load(os.path.join(self.directory, "states.npy"), mmap_mode=mode)
+        self.values = numpy.load(os.path.join(self.directory, "values.npy"), mmap_mode=mode)
+
+    @classmethod
+    def create(cls, directory, variables, count):
+        """Method making (or replacing) a table in directory for count corners of the given variables (or dimension
+        labels), returning it open for writing. The rows are zero until written."""
+        directory = os.fspath(directory)
+        os.makedirs(directory, exist_ok=True)
+
+        for name, dtype, shape in (("states.npy", numpy.int8, (count, len(variables))),
+                                   ("values.npy", numpy.float64, (count,))):
+            numpy.lib.format.open_memmap(os.path.join(directory, name), mode="w+", dtype=dtype, shape=shape).flush()
+
+        with open(os.path.join(directory, "corners.json"), "w") as file:
+            json.dump({"labels": [str(variable) for variable in variables]}, file)
+
+        return cls(directory, mode="r+")
+
+    def write(self, start, states, values):
+        """Method writing the rows from index start of the table."""
+        try:
+            values = numpy.asarray(values, dtype=numpy.float64)
+
+        except (TypeError, ValueError):
+            raise ValueError("Only numeric corner values can be kept in a corner table on disk")
+
+        self.states[start:start + len(values)] = states
+        self.values[start:start + len(values)] = values
+
+    def store(self, chunks, dimension_states):
+        """Generator method writing each (start, values) chunk of corners in corner order (see iterate_chunks) to the
+        table, with the state codes made from the per dimension states, and yielding it on, e.g. to a
+        CornerReduction."""
+        for start, values in chunks:
+            self.write(start, chunk_states(dimension_states, start, len(values)), values)
+            yield start, values
+
+    def close(self):
+        """Method flushing what has been written to disk, returning the table opened again for reading only."""
+        for array in (self.states, self.values):
+            array.flush()
+
+        return MappedCornerTable(self.directory)
+
+
+class CornerReduction:
+    """Class which reduces a stream of corner values to the nominal, minimum, and maximum corners without keeping the
+    stream, so the memory used does not grow with the number of corners.
+
+    Each corner is identified by a key (its parameter string, or its index in corner order). Ties are resolved the
+    same way as a stable sort of every corner would, the first minimum and the last maximum in corner order are kept.
+    If the values cannot be compared (e.g. they are still symbolic) the minimum and maximum are left as None."""
+
+    def __init__(self):
+        self.count = 0
+        self.nominal = None
+        self.minimum = None
+        self.maximum = None
+        self.comparable = True
+
+    ####################
+    def update(self, key, value, nominal=False):
+        """Method to add a single corner to the reduction."""
+        self.count += 1
+
+        if nominal:
+            self.nominal = [key, value]
+
+        if not self.comparable:
+            return
+
+        try:
+            if self.minimum is None:
+                self.minimum = [key, value]
+                self.maximum = [key, value]
+
+            else:
+                if value < self.minimum[1]:
+                    self.minimum = [key, value]
+
+                if value >= self.maximum[1]:
+                    self.maximum = [key, value]
+
+        except TypeError:  # Symbolic values can't be ordered
+            self.comparable = False
+            self.minimum = None
+            self.maximum = None
+
+    ####################
+    def update_chunk(self, start, values, nominal_index=None):
+        """Method to add a chunk of numeric corner values to the reduction, the keys of which are their indices in
+        corner order (start being the index of the first value of the chunk)."""
+        count = len(values)
+        if count == 0:
+            return
+
+        if nominal_index is not None and start <= nominal_index < start + count:
+            self.nominal = [nominal_index, values[nominal_index - start]]
+
+        minimum_index = int(numpy.argmin(values))
+        maximum_index = count - 1 - int(numpy.argmax(values[::-1]))
+
+        if self.minimum is None or values[minimum_index] < self.minimum[1]:
+            self.minimum = [start + minimum_index, values[minimum_index]]
+
+        if self.maximum is None or values[maximum_index] >= self.maximum[1]:
+            self.maximum = [start + maximum_index, values[maximum_index]]
+
+        self.count += count
+
+    ####################
+    def merge(self, other):
+        """Method to merge the reduction of another (disjoint) part of the corners into this one, for corners keyed by
+        their index in corner order, ties are resolved by index so the result does not depend on the merge order."""
+        self.count += other.count
+
+        if other.nominal is not None:
+            self.nominal = other.nominal
+
+        if other.minimum is not None:
+            if self.minimum is None or (other.minimum[1], other.minimum[0]) < (self.minimum[1], self.minimum[0]):
+                self.minimum = other.minimum
+
+        if other.maximum is not None:
+            if self.maximum is None or (other.maximum[1], other.maximum[0]) > (self.maximum[1], self.maximum[0]):
+                self.maximum = other.maximum
+
+
+class CornerLayout:
+    """Class describing the dimensions the corners of an equation are enumerated over.
+
+    Each variable is a dimension of its own, apart from the members of a tolerance group (see ToleranceGroup), which
+    share one dimension, at whose positions every member is at the same end of its tolerance, and, if the group has a
+    ratio tolerance, a dimension for the ratio variation of each member after the first. Without groups the dimensions
+    are the variables, so the corners are the same as before groups existed.
+
+    For each dimension there is a label (the variable, "[R1, R2]" for a group, or "R2 ratio"), its state codes, and the
+    points passed for it to the compiled expression: the values of the variable, or the positions 0, 1, ... along the
+    dimension for the dimensions of groups, which the kernel returned by wrap turns into the values of the members."""
+
+    def __init__(self, variables, states, values, groups=()):
+        """states and values are the state codes and the values (in the same order) of each variable, and groups the
+        tolerance groups among the variables (see ToleranceGroup.tolerance_groups)."""
+        self.variables = list(variables)
+        self.grouped = bool(groups)
+
+        self.labels = []  # Per dimension
+        self.states = []
+        self.points = []
+        self.members = []  # The indices of the variables each dimension moves
+
+        self.values = [None] * len(self.variables)  # Per variable, its values at the positions along its dimension
+        self.arguments = [None] * len(self.variables)  # Per variable, (dimension, values, ratio dimension, factors)
+
+        leaders = {indices[0]: (indices, ratio) for indices, ratio in groups}
+        followers = {index for indices, _ in groups for index in indices[1:]}
+
+        for index, variable in enumerate(self.variables):
+            if index in followers:  # Added with the first member of its group
+                continue
+
+            if index not in leaders:
+                self.values[index] = list(values[index])
+                self.arguments[index] = (self.add_dimension(variable, states[index], (index,), values[index]), None,
+                                         None, None)
+                continue
+
+            indices, ratio = leaders[index]
+            group_states = [state for state in (1, 0, -1) if any(state in states[member] for member in indices)]
+            dimension = self.add_dimension("[%s]" % ", ".join(str(self.variables[member]) for member in indices),
+                                           group_states, indices)
+
+            for member in indices:
+                member_values = dict(zip(states[member], values[member]))
+                self.values[member] = [member_values.get(state, member_values[0]) for state in group_states]
+                # A member without one of the group's states (e.g. only positive tolerance) stays nominal there
+
+                ratio_dimension = factors = None
+                if ratio and member != index:
+                    ratio_dimension = self.add_dimension("%s ratio" % self.variables[member], (1, 0, -1), (member,))
+                    factors = numpy.array([1 + ratio, 1.0, 1 - ratio])
+
+                self.arguments[member] = (dimension, numpy.asarray(self.values[member], dtype=numpy.float64),
+                                          ratio_dimension, factors)
+
+    def add_dimension(self, label, states, members, points=None):
+        """Method adding a dimension, whose points are its positions unless given, returning its index."""
+        self.labels.append(label)
+        self.states.append(list(states))
+        self.members.append(tuple(members))
+
+        if points is None:
+            self.points.append(numpy.arange(len(states), dtype=numpy.float64))
+
+        else:
+            self.points.append(numpy.asarray(points, dtype=numpy.float64))
+
+        return len(self.states) - 1
+
+    ####################
+    def wrap(self, kernel):
+        """Method returning a function which takes the points of each dimension and calls the compiled expression
+        kernel with the values of each variable, which is kernel itself when there are no groups."""
+        if not self.grouped:
+            return kernel
+
+        return GroupedKernel(kernel, self.arguments)
+
+    def variable_values(self, positions):
+        """Method returning the value of each variable at a corner, from the positions along each dimension, keeping
+        the type of the values the layout was made with (e.g. SymPy Floats for the substitution method)."""
+        values = []
+
+        for index, (dimension, _, ratio_dimension, factors) in enumerate(self.arguments):
+            value = self.values[index][positions[dimension]]
+
+            if ratio_dimension is not None:
+                value = value * float(factors[positions[ratio_dimension]])
+
+            values.append(value)
+
+        return values
+
+    def variable_ranges(self):
+        """Method returning a dictionary of {variable index: (lowest, highest)} of the variables whose values reach
+        beyond their own tolerances, i.e. the members of groups with a ratio tolerance."""
+        ranges = {}
+
+        for index, (_, values, ratio_dimension, factors) in enumerate(self.arguments):
+            if ratio_dimension is not None:
+                ranges[index] = (float(values.min()) * factors.min(), float(values.max()) * factors.max())
+
+        return ranges
+
+    def dimension_signs(self, signs):
+        """Method returning the direction of the expression along each dimension (see Equation.variable_monotonicity)
+        from those of the variables: a group's dimension is only monotonic if every member that moves along it has the
+        same direction. The values along every dimension go from highest to lowest, as for a single variable."""
+        dimension_signs = []
+
+        for dimension, members in enumerate(self.members):
+            moving = [signs[index] for index in members if len(set(self.values[index])) > 1
+                      or self.arguments[index][2] == dimension]
+
+            if not moving:
+                dimension_signs.append(-1)  # No effect, treated like a variable without effect
+
+            elif None not in moving and len(set(moving)) == 1:
+                dimension_signs.append(moving[0])
+
+            else:
+                dimension_signs.append(None)
+
+        return dimension_signs
+
+
+class GroupedKernel:
+    """Class calling a compiled expression of the variables with the points of the dimensions of a CornerLayout,
+    where the positions along a group's dimension are looked up in the values of each member (and multiplied by its
+    ratio factor). It can be pickled, so it can be sent to other processes, if the compiled expression can."""
+
+    def __init__(self, kernel, arguments):
+        self.kernel = kernel
+        self.arguments = arguments
+
+    def __call__(self, *points):
+        values = []
+
+        for dimension, table, ratio_dimension, factors in self.arguments:
+            value = points[dimension]
+
+            if table is not None:
+                value = table[numpy.asarray(value, dtype=numpy.intp)]
+
+            if ratio_dimension is not None:
+                value = value * factors[numpy.asarray(points[ratio_dimension], dtype=numpy.intp)]
+
+            values.append(value)
+
+        return self.kernel(*values)
+
+
+####################
+def chunk_layout(points, chunk_size=65536):
+    """Function returning how the corners made from the given per variable values are split into chunks, as
+    (number of inner variables, corners per chunk, number of chunks).
+
+    The first variables (which vary fastest), as many as fit in chunk_size corners, make up the inner block of each
+    chunk, and each combination of the remaining variables is one chunk."""
+    inner = 0
+    block = 1
+    while inner < len(points) and block * len(points[inner]) <= chunk_size:
+        block *= len(points[inner])
+        inner += 1
+
+    count = 1
+    for variable_points in points[inner:]:
+        count *= len(variable_points)
+
+    return inner, block, count
+
+
+####################
+def iterate_chunks(kernel, points, chunk_size=65536, chunks=None):
+    """Generator function evaluating a compiled expression over every corner made from the given per variable values
+    (see Equation.corner_points), yielding (start index, float64 values array) chunks in corner order, i.e. with the
+    first variable varying fastest.
+
+    The inner variables of each chunk (see chunk_layout) are broadcast against each other in one call of the compiled
+    expression, and the combinations of the remaining variables are stepped through one call at a time. So at most
+    chunk_size corners are held at once, and nothing the size of the whole corner space is ever built. chunks may be a
+    range of chunk numbers to only evaluate part of the corner space, by default every chunk is evaluated."""
+    inner, block, count = chunk_layout(points, chunk_size)
+
+    if chunks is None:
+        chunks = range(count)
+
+    shape = tuple(len(variable_points) for variable_points in reversed(points[:inner]))
+    inner_arguments = []
+
+    for i, variable_points in enumerate(points[:inner]):
+        axis_shape = [1] * inner
+        axis_shape[inner - 1 - i] = len(variable_points)
+        inner_arguments.append(variable_points.reshape(axis_shape))
+
+    for chunk in chunks:
+        outer_arguments = []
+        remainder = chunk
+
+        for variable_points in points[inner:]:
+            outer_arguments.append(variable_points[remainder % len(variable_points)])
+            remainder //= len(variable_points)
+
+        values = kernel(*(inner_arguments + outer_arguments))
+
+        if numpy.iscomplexobj(values):
+            raise ValueError("The expression has complex values over the variables tolerance ranges")
+
+        yield chunk * block, numpy.broadcast_to(numpy.asarray(values, dtype=numpy.float64), shape).ravel()
+
+
+####################
+def reduce_chunks(kernel, points, chunk_size, chunks, nominal_index=None):
+    """Function evaluating the given range of chunks (see iterate_chunks) and returning their CornerReduction, this is
+    the task each process runs when the corners are evaluated in parallel."""
+    reduction = CornerReduction()
+
+    for start, values in iterate_chunks(kernel, points, chunk_size, chunks):
+        reduction.update_chunk(start, values, nominal_index)
+
+    return reduction
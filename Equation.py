@@ -1,15 +1,96 @@
-from numpy import *
-from sympy import *
-from Variable import *
-from UliEngineering.EngineerIO import *
-import re
+from contextlib import nullcontext
+from itertools import product
+from sympy import AccumBounds, Expr, Float, diff, factor
+from Variable import Variable
+from LazyImport import lazy_import
+from MonteCarlo import monte_carlo
+from Sketches import Histogram
+from Sensitivity import compile_gradient, sensitivity
+from Interior import interior_extremes
+from Sweep import sweep, sweep_axes
+from ExpressionCache import compile_cse, expression_cache
+from Corners import CORNER_STATES, CornerLayout, CornerReduction, CornerTable, MappedCornerTable, chunk_layout, \
+    chunk_states, grid_states, iterate_chunks, reduce_chunks, state_parameters
+from ToleranceGroup import tolerance_groups
+from Parallel import KernelTransport, map_tasks, split_range, worker_count
+from Instrumentation import Stats, instrumentation
+from Precision import HighPrecisionKernel, PrecisionCheck, compile_mpmath, precision_settings, validate_digits, \
+    validate_precision
+
+# NumPy and UliEngineering are only loaded when they are first used, to keep the start up time down
+numpy = lazy_import("numpy")
+EngineerIO = lazy_import("UliEngineering.EngineerIO")
+
+
+def interval_sign(derivative, bounds):
+    """Function returning the sign (1 or -1) of a derivative over the interval bounds of its variables ({variable:
+    AccumBounds or Float}), or None if it could be either."""
+    try:
+        derivative = derivative.xreplace(bounds)
+
+        if isinstance(derivative, AccumBounds):
+            lower, upper = float(derivative.min), float(derivative.max)
+
+        else:
+            lower = upper = float(derivative)
+
+    except (TypeError, ValueError):  # The derivative could not be reduced to real bounds
+        return None
+
+    if upper <= 0:
+        return -1
+
+    elif lower >= 0:
+        return 1
+
+    return None
 
 
 class Equation:
     """Common base class for equations, which have variables featuring tolerance(s)"""
 
-    def __init__(self, expression, *variables, UoM="Unit(s)"):
-        """equation must be handed in using the class referencer"""
+    def __init__(self, expression, *variables, UoM="Unit(s)", method="vectorised", keep_corners=False,
+                 chunk_size=65536, workers=None, instrument=None, quiet=False, cache=None, precision=None,
+                 digits=None, corners_path=None):
+        """equation must be handed in using the class referencer.
+
+        The method argument selects how the corner values are found; "vectorised" (default) compiles the expression
+        once and evaluates every corner in a single NumPy array operation, "worst_case" only evaluates the corners
+        which can be the minimum or maximum (see find_extremes_worst_case), "rss" gives the root-sum-square range from
+        the partial derivatives at nominal (see sensitivity) without evaluating any corners, while "substitution"
+        substitutes the values into the expression with SymPy one corner at a time (see iterate_values), giving the
+        same corners as the original recursive substitution (calculate_values), which is kept as the reference
+        implementation. Expressions which cannot be compiled to a numeric function (e.g. they contain symbols that are
+        not given as variables) always use the substitution method.
+
+        The corners are streamed through (chunk_size at a time for the vectorised method) and only the nominal,
+        minimum, and maximum are kept, unless keep_corners is True, in which case every corner is also kept in a
+        CornerTable of state codes and values (corners), from which values_list is made when it is first used. Giving
+        corners_path (a directory) keeps them on disk instead, in a MappedCornerTable which is written chunk by chunk
+        as the corners are evaluated and read back lazily, for tables too large to hold in memory.
+
+        workers (a number of processes, or a concurrent.futures Executor to reuse) spreads the vectorised corner
+        evaluation, and by default any Monte Carlo analysis, across a pool of processes.
+
+        The equation registers itself with each of its variables, so that changing a variable's nominal value or
+        tolerance marks the equation as dirty, to be re-evaluated by update_values.
+
+        instrument (by default the enabled setting of Instrumentation.instrumentation) keeps the wall time, call count,
+        and allocations of each phase of the equation's work, and counters such as the corners evaluated, in a Stats
+        object (stats, None when not instrumented), which also adds them to the process-wide totals.
+
+        The results are printed (see pretty_print) once the equation is evaluated, unless quiet is True, e.g. when
+        running through many equations whose results are written out with summary or the Export module instead.
+
+        cache is an optional ResultCache, in which the nominal, minimum, and maximum of the equation are looked up
+        before evaluating it, and kept after, so an unchanged equation is not evaluated again in later runs. Equations
+        using the substitution method or keeping their corners are always evaluated.
+
+        precision (by default precision_settings.default, see Precision) is the arithmetic the vectorised and worst case
+        methods evaluate the corners with: "float64" is the compiled NumPy kernel, "high" evaluates the expression with
+        mpmath at digits (by default precision_settings.digits) significant digits, which is far slower, and "auto"
+        uses float64, then evaluates every corner again in high precision if a check of the nominal corner finds that
+        cancellation lost too much of the result (see check_precision)."""
 
         if not isinstance(expression, Expr):
             raise TypeError("Expression given must be a sympy expression object")
@@ -28,12 +109,59 @@ class Equation:
                 except AttributeError:
                     self.variables = [variable]
 
-        self.values_list = self.calculate_values(self.expression, *self.variables)
-        # Run the recursive calculate values function to get all possible equation values.
+        if method not in ("vectorised", "worst_case", "rss", "substitution"):
+            raise ValueError('The method must be either "vectorised", "worst_case", "rss", or "substitution"')
+
+        self.requested_method = method
+        self.method = None
+        self.requested_precision = None if precision is None else validate_precision(precision)
+        self.requested_digits = None if digits is None else validate_digits(digits)
+        self.precision = "float64"
+        self.precision_check = None
+        self.corners_path = corners_path
+        self.keep_corners = keep_corners or corners_path is not None
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.cache = cache
+        self.kernel = None
+        self.corner_kernel = None
+        self.corner_kernel_fixed = None
+        self.high_kernel = None
+        self.high_kernel_fixed = None
+        self.high_kernel_digits = None
+        self.derivatives = None
+        self.vectorisable = None  # Whether every symbol is a variable, see can_vectorise
+        self.monotonicity = None
+        self.monte_carlo_result = None
+        self.sensitivity_result = None
+        self.interior_result = None
+        self.dirty = set()
+
+        if instrument is None:
+            instrument = instrumentation.enabled
+
+        self.stats = Stats(instrumentation, label=str(expression)) if instrument else None
 
         self.UoM = UoM
 
+        for variable in self.variables:
+            variable.add_dependent(self)
+
+        self.evaluate()
+
+        if not quiet:
+            self.pretty_print()
+
+    ####################
+    def reset_results(self):
+        """Method which clears the results of any previous evaluation of the equation."""
+        self.corners = None
+        self._values_list = None
+
         self.nominal = None
+        self.minimum = None
+        self.maximum = None
+        self.min_max_results = None
         self.tol_value = None
         self.tol_decimal = None
         self.tol_values_unique = None
@@ -41,85 +169,594 @@ class Equation:
 
         self.tol_value_set = False
         self.tol_values_unique_set = False
-        self.find_nominal()
 
-        try:
-            self.values_list.sort(key=lambda x: x[1])
+        # Only describe the values they were found for, so are found again (when asked for) rather than kept stale
+        self.monotonicity = None
+        self.monte_carlo_result = None
+        self.sensitivity_result = None
+        self.interior_result = None
 
-            self.min_max_results = [self.values_list[0], self.values_list[-1]]
-            self.minimum = self.values_list[0]
-            self.maximum = self.values_list[-1]
-            self.equation_tolerances()
+    ####################
+    def evaluate(self):
+        """Method which (re-)calculates the nominal, minimum, and maximum values and the tolerances of the equation from
+        the current values of its variables.
 
-        except TypeError:
-            self.min_max_results = None
-            self.minimum = None
-            self.maximum = None
+        The requested method is used if possible, otherwise (e.g. not every symbol in the expression is a variable) the
+        substitution method is used. The compiled expression and its derivatives are kept between evaluations."""
+        if self.requested_method != "substitution" and not self.can_vectorise():
+            self.method = "substitution"
+
+        else:
+            self.method = self.requested_method
 
-        self.pretty_print()
+        requested_precision = self.precision_setting()
+        self.precision = "high" if requested_precision == "high" else "float64"
+        self.precision_check = None
+
+        self.reset_results()
+
+        with self.phase("evaluate"):
+            key = self.cache_key()
+
+            if key is None or not self.load_cached(key):
+                self.find_results()
+
+                if requested_precision == "auto" and self.method in ("vectorised", "worst_case") and \
+                        self.check_precision().cancelled:
+                    self.count("precision_reruns")
+                    self.precision = "high"
+
+                    self.reset_results()
+                    self.find_results()
+
+                if key is not None and self.minimum is not None and self.maximum is not None:
+                    self.cache.put(key, self.cache_record())
+
+        self.dirty.clear()
+
+    def find_results(self):
+        """Method finding the nominal, minimum, and maximum values (and so the tolerances) with the equation's method."""
+        if self.method == "worst_case":
+            self.find_extremes_worst_case()
+
+        elif self.method == "rss":
+            self.find_extremes_rss()
+
+        else:
+            self.find_extremes()
+
+    ####################
+    def precision_setting(self):
+        """Method returning the precision requested for the equation ("float64", "high", or "auto"), which is the
+        process-wide default (see Precision.precision_settings) unless the equation was given its own."""
+        if self.requested_precision is None:
+            return precision_settings.default
+
+        return self.requested_precision
+
+    @property
+    def digits(self):
+        """Getter method for the number of significant digits of the equation's high precision evaluation."""
+        if self.requested_digits is None:
+            return precision_settings.digits
+
+        return self.requested_digits
+
+    def check_precision(self):
+        """Method evaluating the nominal corner with the compiled float64 expression, and again at the equation's high
+        precision digits, with the same inputs, returning (and keeping in precision_check) a PrecisionCheck of whether
+        float64 lost more than precision_settings.rtol of the results to rounding, e.g. through the cancellation of
+        nearly equal terms. Only one corner is evaluated in high precision, and both kernels are kept between
+        evaluations (see compile_corner_kernel), so the check is cheap."""
+        layout = self.corner_layout()
+        point = [dimension_points[states.index(0)] for dimension_points, states in zip(layout.points, layout.states)]
+
+        with self.phase("precision_check"):
+            float_value = float(numpy.asarray(layout.wrap(self.compile_corner_kernel("float64"))(*point)).real)
+            high_value = float(numpy.asarray(layout.wrap(self.compile_corner_kernel("high"))(*point)).real)
+
+        scale = abs(high_value)
+        if self.minimum is not None and self.maximum is not None:
+            scale = max(scale, abs(float(self.maximum[1]) - float(self.minimum[1])))
+
+        self.precision_check = PrecisionCheck(float_value, high_value, scale, precision_settings.rtol, self.digits)
+
+        return self.precision_check
+
+    ####################
+    def cache_key(self):
+        """Method returning the key of the equation's results in its result cache (see ResultCache.key), or None if
+        they are not to be cached."""
+        if self.cache is None or self.method == "substitution" or self.keep_corners:
+            return None
+
+        precision = self.precision_setting()
+        if precision != "float64" and self.method in ("vectorised", "worst_case"):
+            precision = "%s %d" % (precision, self.digits)
+
+        return self.cache.key(self.expression, self.variables, self.corner_states(), self.corner_points(), self.method,
+                              tolerance_groups(self.variables), precision)
+
+    def cache_record(self):
+        """Method returning the results of the equation's evaluation to keep in its result cache: the nominal,
+        minimum, and maximum, the precision they were found with and the outcome of its check (see check_precision),
+        and the variables' monotonicity when the worst case method found it."""
+        record = {name: [result[0], float(result[1])] for name, result
+                  in (("nominal", self.nominal), ("minimum", self.minimum), ("maximum", self.maximum))}
+
+        record["precision"] = self.precision
+        record["precision_check"] = None
+        if self.precision_check is not None:
+            check = self.precision_check
+            record["precision_check"] = [check.float_value, check.high_value, check.scale, check.rtol, check.digits]
+
+        record["monotonicity"] = self.monotonicity
+
+        return record
+
+    def load_cached(self, key):
+        """Method setting the results of the equation (see cache_record), and so its tolerances, from its result cache,
+        returning False if the key was not found."""
+        with self.phase("result_cache"):
+            results = self.cache.get(key)
+
+        if results is None:
+            self.count("result_cache_misses")
+            return False
+
+        self.count("result_cache_hits")
+
+        self.nominal = results["nominal"]
+        self.minimum = results["minimum"]
+        self.maximum = results["maximum"]
+        self.min_max_results = [self.minimum, self.maximum]
+        self.equation_tolerances()
+
+        self.precision = results["precision"]
+        if results["precision_check"] is not None:
+            self.precision_check = PrecisionCheck(*results["precision_check"])
+
+        self.monotonicity = results["monotonicity"]
+
+        return True
+
+    ####################
+    def phase(self, name):
+        """Method returning a context manager which times the work done inside it as the named phase, when the equation
+        is instrumented (see Instrumentation.Stats)."""
+        if self.stats is None:
+            return nullcontext()
+
+        return self.stats.phase(name)
+
+    def count(self, name, amount=1):
+        """Method adding amount to the named counter, when the equation is instrumented."""
+        if self.stats is not None:
+            self.stats.count(name, amount)
+
+    ####################
+    @property
+    def values_list(self):
+        """Getter method for the list of [parameters, value] pairs of every corner, which is None unless the equation
+        was made with keep_corners set.
+
+        The list is only built from the corner table the first time it is accessed, as building 3^n parameter strings
+        is far slower than the evaluation itself."""
+        if self._values_list is None and self.corners is not None:
+            self._values_list = list(self.corners.rows())
+
+        return self._values_list
+
+    @values_list.setter
+    def values_list(self, values):
+        """Setter method for the list of [parameters, value] pairs of every corner."""
+        self._values_list = values
 
     ####################
     def pretty_print(self):
         """Method"""
+        with self.phase("formatting"):
+            self.print_results()
+
+    def print_results(self):
+        """Method printing the results of the equation (see pretty_print)."""
         try:
             print("For the Equation ->", self.expression, "with the substitution variables ->", self.variables,
                   "- the following minima/maxima are found:")
 
             print("The nominal value of approximately ->",
-                  format_value(float(self.nominal[1]), unit=self.UoM, significant_digits=6),
+                  EngineerIO.format_value(float(self.nominal[1]), unit=self.UoM, significant_digits=6),
                   "is achieved when the variable parameters are ->", self.nominal[0])
 
             print("The minimum value of approximately ->",
-                  format_value(float(self.minimum[1]), unit=self.UoM, significant_digits=6),
+                  EngineerIO.format_value(float(self.minimum[1]), unit=self.UoM, significant_digits=6),
                   "is achieved when the variable parameters are ->", self.minimum[0])
 
             print("The maximum value of approximately ->",
-                  format_value(float(self.maximum[1]), unit=self.UoM, significant_digits=6),
+                  EngineerIO.format_value(float(self.maximum[1]), unit=self.UoM, significant_digits=6),
                   "is achieved when the variable parameters are ->", self.maximum[0])
 
             if self.tol_values_unique_set:
-                print("The equations output tolerance values are then approximately plus/minus", self.tol_values_unique,
-                      "which are decimal tolerances of approximately", self.tol_decimals_unique, "%\n")
+                print("The equations output tolerance values are then approximately plus",
+                      EngineerIO.format_value(float(self.tol_values_unique[0]), unit=self.UoM, significant_digits=6),
+                      "/ minus",
+                      EngineerIO.format_value(float(self.tol_values_unique[1]), unit=self.UoM, significant_digits=6),
+                      "which are decimal tolerances of approximately plus",
+                      round(float(self.tol_decimals_unique[0]) * 100, 3), "/ minus",
+                      round(float(self.tol_decimals_unique[1]) * 100, 3), "%\n")
 
             elif self.tol_value_set:
                 print("The equations output tolerance value is then approximately plus/minus",
-                      format_value(float(self.tol_value), unit=self.UoM, significant_digits=6),
+                      EngineerIO.format_value(float(self.tol_value), unit=self.UoM, significant_digits=6),
                       "which is a decimal tolerance of approximately", round(self.tol_decimal*100), "%\n")
 
-        except ValueError:
+        except (TypeError, ValueError):  # Newer SymPy versions raise a TypeError for symbolic floats
             print("The necessary number of variables have likely not yet been given to obtain numerical results for the"
-                  " expression", self.expression, "\nAn example expression from the currently given substitute "
-                                                  "variables is", self.values_list[0])
+                  " expression", self.expression, "\nThe nominal expression from the currently given substitute "
+                                                  "variables is", self.nominal)
 
     ####################
     def find_nominal(self):
-        """Method which uses regular expressions to search through the values list and find the nominal value,
-        this is assumed to be when all values of the equation are nominal."""
-        minimal_pattern = re.compile(r"^((?!minimal).)*$", re.IGNORECASE | re.MULTILINE)
-        maximal_pattern = re.compile(r"^((?!maximal).)*$", re.IGNORECASE | re.MULTILINE)
-        check = 0
-
-        for value in self.values_list:
-            if re.findall(minimal_pattern, value[0]) and re.findall(maximal_pattern, value[0]):
-                self.nominal = value
-                check += 1
-
-        if check != 1:
+        """Method which finds the nominal value from the kept corner table, this is assumed to be when all values of
+        the equation are nominal, i.e. the row whose state codes are all 0."""
+        if self.corners is None:
+            raise ValueError("The corners of the equation were not kept (see keep_corners)")
+
+        with self.phase("nominal"):
+            self.nominal = self.corners.row(self.corners.nominal_index())
+
+    ####################
+    def find_extremes(self):
+        """Method which streams through every corner of the equation, keeping only the nominal, minimum, and maximum
+        (and every corner if keep_corners is set), then works out the equation's tolerances from them.
+
+        The vectorised method evaluates the compiled expression chunk_size corners at a time, whose nominal corner is
+        known by index, while the substitution method steps through the values from substituted_corners one by one.
+        The corners are made over the dimensions of the equation's corner_layout, where a tolerance group is one
+        dimension."""
+        reduction = CornerReduction()
+        layout = self.corner_layout()
+
+        if self.method == "vectorised":
+            with self.phase("corners"):
+                if self.corners_path is not None:
+                    table = self.create_corner_table(layout)
+                    chunks = table.store(iterate_chunks(layout.wrap(self.compile_corner_kernel()), layout.points,
+                                                        self.chunk_size), layout.states)
+
+                elif self.keep_corners:
+                    values = self.calculate_values_vectorised().ravel()
+                    with self.phase("table"):
+                        self.corners = CornerTable(layout.labels, grid_states(layout.states), values)
+                    chunks = [(0, values)]
+
+                elif self.workers:
+                    chunks = []
+                    reduction = self.reduce_corners_parallel()
+
+                else:
+                    chunks = iterate_chunks(layout.wrap(self.compile_corner_kernel()), layout.points, self.chunk_size)
+
+                nominal_index = self.nominal_index()
+                for start, values in chunks:
+                    reduction.update_chunk(start, values, nominal_index)
+
+                if self.corners_path is not None:
+                    self.corners = table.close()
+
+            for result in (reduction.nominal, reduction.minimum, reduction.maximum):
+                result[0] = self.corner_parameters(result[0])
+                # Only the labels of the corners which are kept are ever made
+
+        else:
+            states_list = []
+            values = []
+            table = self.create_corner_table(layout) if self.corners_path is not None else None
+            start = 0
+
+            with self.phase("substitution"):
+                for states, value in self.substituted_corners(layout):
+                    reduction.update(states, value, not any(states))
+
+                    if self.keep_corners:
+                        states_list.append(states)
+                        values.append(value)
+
+                    if table is not None and len(values) == self.chunk_size:  # Written a chunk at a time
+                        table.write(start, states_list, values)
+                        start += len(values)
+                        states_list = []
+                        values = []
+
+            for result in (reduction.nominal, reduction.minimum, reduction.maximum):
+                if result is not None:
+                    result[0] = state_parameters(layout.labels, result[0])
+
+            if table is not None:
+                with self.phase("table"):
+                    table.write(start, states_list, values)
+                    self.corners = table.close()
+
+            elif self.keep_corners:
+                with self.phase("table"):
+                    self.corners = CornerTable(layout.labels, states_list, values)
+
+        self.count("corners", reduction.count)
+
+        if reduction.nominal is None:
             raise ValueError("Something went wrong when setting the nominal value of equation")
 
+        self.nominal = reduction.nominal
+
+        if reduction.comparable:
+            self.minimum = reduction.minimum
+            self.maximum = reduction.maximum
+            self.min_max_results = [self.minimum, self.maximum]
+            self.equation_tolerances()
+
+    def create_corner_table(self, layout):
+        """Method making the MappedCornerTable in corners_path for every corner of a corner_layout."""
+        count = 1
+        for states in layout.states:
+            count *= len(states)
+
+        with self.phase("table"):
+            return MappedCornerTable.create(self.corners_path, layout.labels, count)
+
+    ####################
+    def reduce_corners_parallel(self):
+        """Method which splits the chunks of corners (see Corners.iterate_chunks) into contiguous ranges, reduces each
+        range in a separate process, and merges the partial reductions.
+
+        The chunk size is made smaller if needed, so that there are a few ranges for each worker to balance the load."""
+        layout = self.corner_layout()
+        points = layout.points
+        workers = worker_count(self.workers)
+
+        total = 1
+        for variable_points in points:
+            total *= len(variable_points)
+
+        chunk_size = max(1, min(self.chunk_size, total // (workers * 4)))
+        chunks = range(chunk_layout(points, chunk_size)[2])
+        if self.precision == "high":
+            kernel = layout.wrap(HighPrecisionKernel(KernelTransport(self.reduced_expression(), self.variables,
+                                                                     "mpmath_corner_kernel", compile_mpmath),
+                                                     self.digits))
+
+        else:
+            kernel = layout.wrap(KernelTransport(self.reduced_expression(), self.variables, "corner_kernel",
+                                                 compile_cse))
+        nominal_index = self.nominal_index()
+
+        tasks = [(kernel, points, chunk_size, part, nominal_index) for part in split_range(chunks, workers * 4)]
+
+        reduction = CornerReduction()
+        for partial in map_tasks(reduce_chunks, tasks, self.workers):
+            reduction.merge(partial)
+
+        return reduction
+
+    ####################
+    def nominal_index(self):
+        """Method returning the index, in corner order, of the corner where every variable is nominal."""
+        index = 0
+
+        # The first dimension varies fastest, so the index is built from the last dimension backwards
+        for states in reversed(self.corner_layout().states):
+            index = index * len(states) + states.index(0)
+
+        return index
+
+    ####################
+    def iterate_corners(self, chunk_size=None):
+        """Generator method which streams through every corner of the equation, in corner order, yielding
+        (start index, int8 state matrix, values array) chunks of at most chunk_size (by default the equation's own)
+        corners, with one row of state codes (+1 Maximal, 0 Nominal, -1 Minimal) per corner and one column per
+        dimension of the corner_layout (per variable, unless there are tolerance groups).
+
+        The corners are taken from the corner table if it was kept, and are otherwise evaluated again chunk by chunk
+        (with the substitution method if the equation uses it), so the whole corner space is never held at once."""
+        if chunk_size is None:
+            chunk_size = self.chunk_size
+
+        layout = self.corner_layout()
+        states = layout.states
+
+        if self.corners is not None:
+            for start in range(0, len(self.corners), chunk_size):
+                stop = min(start + chunk_size, len(self.corners))
+                yield start, self.corners.states[start:stop], self.corners.values[start:stop]
+
+        elif self.method != "substitution":
+            for start, values in iterate_chunks(layout.wrap(self.compile_corner_kernel()), layout.points, chunk_size):
+                yield start, chunk_states(states, start, len(values)), values
+
+        else:
+            start = 0
+            states_list = []
+            values = []
+
+            for corner_states, value in self.substituted_corners(layout):
+                states_list.append(corner_states)
+                values.append(value)
+
+                if len(values) == chunk_size:
+                    yield start, numpy.array(states_list, dtype=numpy.int8), numpy.array(values, dtype=object)
+                    start += len(values)
+                    states_list = []
+                    values = []
+
+            if values:
+                yield start, numpy.array(states_list, dtype=numpy.int8), numpy.array(values, dtype=object)
+
+    ####################
+    def summary(self):
+        """Method returning the results of the equation as a dictionary of plain Python values: the expression,
+        variables, and unit, the nominal, minimum, and maximum values and the parameters they are found at, and the
+        plus/minus tolerances (as values, and as decimals of the nominal value).
+
+        Values which are not numeric (e.g. not every symbol of the expression has been given a value) are given as
+        strings, and results which could not be found are None."""
+        def plain(value):
+            if value is None:
+                return None
+
+            try:
+                return float(value)
+
+            except (TypeError, ValueError):
+                return str(value)
+
+        if self.tol_values_unique_set:
+            tolerances = self.tol_values_unique + self.tol_decimals_unique
+
+        elif self.tol_value_set:
+            tolerances = [self.tol_value, self.tol_value, self.tol_decimal, self.tol_decimal]
+
+        else:
+            tolerances = [None, None, None, None]
+
+        results = {"expression": str(self.expression),
+                   "variables": [str(variable) for variable in self.variables],
+                   "unit": self.UoM}
+
+        for name, result in (("nominal", self.nominal), ("minimum", self.minimum), ("maximum", self.maximum)):
+            results[name] = plain(result[1]) if result is not None else None
+            results[name + "_parameters"] = result[0] if result is not None else None
+
+        for name, tolerance in zip(("tol_plus", "tol_minus", "tol_decimal_plus", "tol_decimal_minus"), tolerances):
+            results[name] = plain(tolerance)
+
+        return results
+
+    ####################
+    def find_extremes_worst_case(self):
+        """Method which finds the nominal, minimum, and maximum values without evaluating every corner.
+
+        Where the expression only ever increases (or decreases) with a variable over the tolerance box, that variable's
+        minimum and maximum are reached at known ends of its value range, so only two corners are evaluated for all of
+        these variables (O(n) rather than O(3^n)). Variables where the direction could not be fixed (see
+        variable_monotonicity) have all their corners enumerated, with the other variables held at their known ends.
+
+        The same is done along each dimension of the corner_layout, where a tolerance group's dimension has a known
+        direction if every member moving along it has the same one."""
+        layout = self.corner_layout()
+
+        with self.phase("monotonicity"):
+            ranges = {self.variables[index]: bounds for index, bounds in layout.variable_ranges().items()}
+            self.monotonicity = self.variable_monotonicity(ranges)
+
+        minimum_choices = []
+        maximum_choices = []
+        nominal_choices = []
+
+        for variable_states, sign in zip(layout.states, layout.dimension_signs(self.monotonicity)):
+            first = 0
+            last = len(variable_states) - 1
+
+            if sign is None:  # Unknown direction, every value of the variable has to be tried
+                minimum_choices.append(list(range(len(variable_states))))
+                maximum_choices.append(list(range(len(variable_states))))
+
+            elif sign > 0:  # Increasing, the value range goes from Maximal to Minimal
+                minimum_choices.append([last])
+                maximum_choices.append([first])
+
+            else:  # Decreasing (or no effect)
+                minimum_choices.append([first])
+                maximum_choices.append([last])
+
+            nominal_choices.append([variable_states.index(0)])
+
+        with self.phase("corners"):
+            minimum_values = self.evaluate_grid(minimum_choices).ravel()
+            maximum_values = self.evaluate_grid(maximum_choices).ravel()
+            nominal_values = self.evaluate_grid(nominal_choices).ravel()
+
+        self.count("corners", len(minimum_values) + len(maximum_values) + len(nominal_values))
+
+        minimum_index = int(numpy.argmin(minimum_values))
+        maximum_index = len(maximum_values) - 1 - int(numpy.argmax(maximum_values[::-1]))
+
+        self.nominal = [self.corner_parameters(0, nominal_choices), nominal_values[0]]
+        self.minimum = [self.corner_parameters(minimum_index, minimum_choices), minimum_values[minimum_index]]
+        self.maximum = [self.corner_parameters(maximum_index, maximum_choices), maximum_values[maximum_index]]
+        self.min_max_results = [self.minimum, self.maximum]
+        self.equation_tolerances()
+
+    ####################
+    def find_extremes_rss(self):
+        """Method which sets the minimum and maximum to the nominal value less and plus the root-sum-square (RSS)
+        tolerances from a sensitivity analysis, which is linear in the number of variables, so suits designs with far
+        too many variables for their corners to be enumerated. The range is a statistical estimate of the spread, not
+        a worst case."""
+        result = self.sensitivity()
+        self.count("corners", 1)
+
+        layout = self.corner_layout()
+        self.nominal = [state_parameters(layout.labels, (0,) * len(layout.states)), result.nominal]
+        self.minimum = ["RSS of every tolerance", result.nominal - result.rss_minus]
+        self.maximum = ["RSS of every tolerance", result.nominal + result.rss_plus]
+        self.min_max_results = [self.minimum, self.maximum]
+        self.equation_tolerances()
+
+    ####################
+    def variable_monotonicity(self, ranges=None):
+        """Method to find the sign of the partial derivative of the expression with respect to each variable over the
+        whole tolerance box, using interval arithmetic (every variable is replaced by SymPy's AccumBounds of its value
+        range). ranges is an optional dictionary of {variable: (lowest, highest)} to use instead of the value ranges of
+        some of the variables, e.g. to cover every value a component could be chosen from.
+
+        Returns a list with, for each variable, 1 if the expression never decreases with it, -1 if it never increases,
+        or None if the sign could not be fixed. Variables which have no effect are given -1, so that ties are reported
+        on the same corners as the other methods. The interval bounds are conservative, so a variable can be reported
+        as None even when the expression is monotonic in it, but never the other way around."""
+        if ranges is None:
+            ranges = {}
+
+        bounds = {}
+        for variable, values in zip(self.variables, self.corner_points()):
+            if variable in ranges:
+                bounds[variable] = AccumBounds(Float(min(ranges[variable])), Float(max(ranges[variable])))
+
+            elif len(values) > 1:
+                bounds[variable] = AccumBounds(Float(values.min()), Float(values.max()))
+
+            else:
+                bounds[variable] = Float(values[0])
+
+        if self.derivatives is None:
+            self.derivatives = [diff(self.expression, variable) for variable in self.variables]
+
+        signs = []
+        for position, derivative in enumerate(self.derivatives):
+            sign = interval_sign(derivative, bounds)
+
+            if sign is None:  # The bounds of a sum of terms overlap zero more often than those of one factored term
+                self.derivatives[position] = derivative = factor(derivative)
+                sign = interval_sign(derivative, bounds)
+
+            signs.append(sign)
+
+        return signs
+
     ####################
     def equation_tolerances(self):
+        """Method which works out the plus (maximum - nominal) and minus (nominal - minimum) tolerances of the
+        equation's output, these are treated as equal if they only differ by floating point rounding."""
         try:
             tol_minus = abs(self.minimum[1] - self.nominal[1])
-            tol_plus = abs(self.nominal[1] - self.minimum[1])
+            tol_plus = abs(self.maximum[1] - self.nominal[1])
 
-            tol_dec_minus = tol_minus / self.nominal[1]
-            tol_dec_plus = tol_plus / self.nominal[1]
+            # Decimal tolerances of a zero nominal value (e.g. an offset) are 0, as for a Variable
+            tol_dec_minus = tol_minus / self.nominal[1] if self.nominal[1] else 0.0
+            tol_dec_plus = tol_plus / self.nominal[1] if self.nominal[1] else 0.0
 
         except TypeError:
             return
 
-        if tol_minus == tol_plus:
+        if abs(tol_plus - tol_minus) <= 1e-12 * max(tol_plus, tol_minus):
             self.tol_value = tol_minus
             self.tol_decimal = tol_dec_minus
             self.tol_value_set = True
@@ -130,14 +767,375 @@ class Equation:
             self.tol_values_unique_set = True
 
     ####################
-    def add_variable(self):
-        """Method"""
-        return 1
+    def monte_carlo(self, samples=100000, distribution="uniform", sigma=3.0, seed=None, chunk_size=100000, spec=None,
+                    percentiles=(1, 5, 50, 95, 99), keep_values=False, workers=None, streaming=False,
+                    relative_accuracy=0.001, bins=None, histogram_range=None):
+        """Method to run a Monte Carlo (statistical) tolerance analysis of the equation, the result is returned and
+        kept as the monte_carlo_result attribute.
+
+        Every variable is sampled from its nominal value and tolerance(s) using the given distribution ("uniform", or
+        "normal" with each tolerance taken as sigma standard deviations), which may also be a dictionary of
+        {variable: distribution}. Unequal plus/minus tolerances are sampled asymmetrically, and the members of a
+        tolerance group (see ToleranceGroup) are drawn together. The compiled expression is evaluated chunk_size samples
+        at a time, and the same seed always gives the same result, whatever the chunk_size. spec is an optional (low,
+        high) window to find the yield against, either limit may be None. workers (by default the equation's own)
+        spreads the chunks across a pool of processes, which gives the same result as running them in this one.
+
+        streaming keeps none of the samples, for runs too large to hold (e.g. 10^8 samples), with the percentiles
+        estimated to within relative_accuracy instead (see Sketches.QuantileSketch). bins accumulates a histogram of
+        that many equal bins (see Sketches.Histogram) over histogram_range, by default the equation's minimum to
+        maximum, with any samples outside it counted as underflow or overflow."""
+        if not self.can_vectorise():
+            raise ValueError("A Monte Carlo analysis needs every symbol in the expression to be given as a variable")
+
+        histogram = None
+        if bins is not None:
+            if histogram_range is None:
+                if self.minimum is None or self.maximum is None:
+                    raise ValueError("A histogram range must be given for an equation without a numeric minimum and "
+                                     "maximum")
+
+                histogram_range = (float(self.minimum[1]), float(self.maximum[1]))
+
+            histogram = Histogram.linear(histogram_range[0], histogram_range[1], bins)
+
+        if workers is None:
+            workers = self.workers
+
+        if workers:
+            kernel = KernelTransport(self.expression, self.variables)
+
+        else:
+            kernel = self.compile_kernel()
+
+        with self.phase("monte_carlo"):
+            self.monte_carlo_result = monte_carlo(kernel, self.variables, samples=samples, distribution=distribution,
+                                                  sigma=sigma, seed=seed, chunk_size=chunk_size, spec=spec,
+                                                  percentiles=percentiles, keep_values=keep_values, workers=workers,
+                                                  groups=tolerance_groups(self.variables), streaming=streaming,
+                                                  relative_accuracy=relative_accuracy, histogram=histogram)
+
+        self.count("samples", samples)
+
+        return self.monte_carlo_result
+
+    ####################
+    def sensitivity(self):
+        """Method to run a linearised tolerance analysis of the equation, the result is returned and kept as the
+        sensitivity_result attribute.
+
+        The partial derivatives of the expression with respect to every variable are compiled into one function (kept
+        in the expression cache), which is evaluated once at the nominal values, so the cost grows linearly with the
+        number of variables rather than as 3^n. The result gives each variable's contribution to the output, their
+        ranking, and the root-sum-square (RSS) output tolerances (see Sensitivity.SensitivityResult). Being a first
+        order estimate, it can differ from the corner results where the expression is strongly non-linear."""
+        if not self.can_vectorise():
+            raise ValueError("A sensitivity analysis needs every symbol in the expression to be given as a variable")
+
+        with self.phase("sensitivity"):
+            gradient = expression_cache.get(self.expression, self.variables, kind="gradient", compiler=compile_gradient)
+            self.sensitivity_result = sensitivity(self.compile_kernel(), gradient, self.variables)
+
+        return self.sensitivity_result
+
+    ####################
+    def interior_extremes(self, starts=8, seed=None, iterations=200):
+        """Method to search the whole tolerance box of the variables, not only its corners, for the lowest and highest
+        values of the equation, e.g. for a resonance or impedance peak inside the box. The result is returned and kept
+        as the interior_result attribute, and reports whether the equation's corner minimum and maximum were exact.
+
+        A projected gradient descent (with the gradient compiled once, see sensitivity) is run towards each extreme
+        from the middle of the box, the best corner of the linearised expression, and starts random points (from
+        seed), all at once. The results of the equation itself are not changed."""
+        if not self.can_vectorise():
+            raise ValueError("Searching the tolerance box needs every symbol in the expression to be given as a variable")
+
+        if tolerance_groups(self.variables):
+            raise ValueError("Searching the tolerance box is not supported for equations with tolerance groups")
+
+        if self.method == "rss" or self.minimum is None or self.maximum is None:
+            raise ValueError("Searching the tolerance box needs the numeric corner results of the equation")
+
+        points = self.corner_points()
+        lower = [variable_points.min() for variable_points in points]
+        upper = [variable_points.max() for variable_points in points]
+
+        with self.phase("interior"):
+            gradient = expression_cache.get(self.expression, self.variables, kind="gradient", compiler=compile_gradient)
+            self.interior_result = interior_extremes(self.compile_kernel(), gradient, self.variables, lower, upper,
+                                                     float(self.minimum[1]), float(self.maximum[1]), starts=starts,
+                                                     seed=seed, iterations=iterations)
+
+        self.count("interior_evaluations", self.interior_result.evaluations)
+
+        return self.interior_result
+
+    ####################
+    def sweep(self, nominal=None, tolerances=None, chunk_size=None):
+        """Method to evaluate the equation over a grid of nominal values and / or decimal tolerances of some of its
+        variables, given as dictionaries of {variable: values} (any sequence, e.g. numpy.geomspace(1e3, 1e6, 50)),
+        without changing the variables or the results of the equation. Returns a SweepResult with the nominal,
+        minimum, and maximum values at each point of the grid as NumPy arrays, with one axis per swept value.
+
+        Every corner of every point is evaluated with the compiled (float64) expression, broadcast across the whole
+        grid and chunk_size (by default the equation's own) corners' worth of values per call, rather than making an
+        Equation for each point. Decimal tolerances (tol_pref 0) of swept nominal values scale with them."""
+        if not self.can_vectorise():
+            raise ValueError("Sweeping needs every symbol in the expression to be given as a variable")
+
+        if tolerance_groups(self.variables):
+            raise ValueError("Sweeping is not supported for equations with tolerance groups")
+
+        axes = sweep_axes(nominal, tolerances)
+
+        for variable, kind, _ in axes:
+            if variable not in self.variables:
+                raise ValueError("%s is not a variable of the equation, so its %s cannot be swept" % (variable, kind))
+
+        with self.phase("sweep"):
+            result = sweep(self.compile_kernel(), self.variables, axes,
+                           self.chunk_size if chunk_size is None else chunk_size)
+
+        self.count("sweep_corners", result.evaluations)
+
+        return result
+
+    ####################
+    def mark_dirty(self, variable):
+        """Method called by a variable of the equation when its nominal value or tolerance(s) change, the equation is
+        only re-evaluated when update_values is next called."""
+        self.dirty.add(variable)
+
+    ####################
+    def add_variable(self, *variables):
+        """Method to give the equation more variables (e.g. for symbols of the expression which had no values yet),
+        after which the equation is re-evaluated with them."""
+        for variable in variables:
+            if not isinstance(variable, Variable):
+                raise TypeError("The variables to be used must be of an instance of the Variable class")
+
+            elif variable in self.variables:
+                raise ValueError("The variable %s is already a variable of the equation" % variable)
+
+            self.variables.append(variable)
+            variable.add_dependent(self)
+
+        # The compiled expression and derivatives take the variables in order, so must be made again
+        self.kernel = None
+        self.corner_kernel = None
+        self.corner_kernel_fixed = None
+        self.high_kernel = None
+        self.high_kernel_fixed = None
+        self.high_kernel_digits = None
+        self.derivatives = None
+        self.vectorisable = None
+
+        self.evaluate()
 
     ####################
     def update_values(self):
-        """Method"""
-        return 1
+        """Method to re-evaluate the equation if any of its variables have changed since it was last evaluated (see
+        mark_dirty), returning True if it was re-evaluated and False if nothing had changed.
+
+        The compiled expression, and the derivatives used by the worst case method, are reused."""
+        if not self.dirty:
+            return False
+
+        self.evaluate()
+        return True
+
+    ####################
+    def can_vectorise(self):
+        """Method which checks if the expression can be compiled to a numeric function of the given variables, which is
+        only possible if every symbol in the expression is one of the variables. The answer is kept until variables
+        are added (see add_variable), rather than walking the expression on every evaluation."""
+        if self.vectorisable is None:
+            self.vectorisable = self.expression.free_symbols <= set(self.variables)
+
+        return self.vectorisable
+
+    ####################
+    @staticmethod
+    def variable_states(variable):
+        """Method returning the list of state codes (+1 Maximal, 0 Nominal, -1 Minimal) for the values a variable takes
+        in the corners."""
+        if variable.tol_value_set or variable.tol_values_unique_set:
+            return CORNER_STATES[variable.tol_type]
+
+        return [0]
+
+    def corner_states(self):
+        """Method returning, for each variable, the list of state codes for the values it takes in the corners."""
+        return [self.variable_states(variable) for variable in self.variables]
+
+    ####################
+    def corner_points(self):
+        """Method returning, for each variable, a float array of the values it takes in the corners (in the same order
+        as its state codes from corner_states)."""
+        values = []
+
+        for variable in self.variables:
+            if variable.tol_value_set or variable.tol_values_unique_set:
+                values.append(numpy.asarray(variable.value_range, dtype=numpy.float64))
+
+            else:
+                values.append(numpy.asarray([variable.nom_value], dtype=numpy.float64))
+
+        return values
+
+    def corner_layout(self):
+        """Method returning the CornerLayout of the dimensions the corners are made over, which are the variables,
+        apart from the members of tolerance groups (see ToleranceGroup), which share a dimension."""
+        values = []
+
+        for variable in self.variables:
+            if variable.tol_value_set or variable.tol_values_unique_set:
+                values.append(list(variable.value_range))
+
+            else:
+                values.append([variable.nom_value])
+
+        return CornerLayout(self.variables, self.corner_states(), values, tolerance_groups(self.variables))
+
+    ####################
+    def corner_parameters(self, index, choices=None):
+        """Method to build the parameter string (eg. "x Maximal, y Nominal, ...") of the corner at the given flat index
+        of an array returned by evaluate_grid, which is the same string the substitution method would have built.
+
+        choices are the indices of the corner values used for each dimension (see corner_layout) in that array, by
+        default every value."""
+        return state_parameters(self.corner_layout().labels, self.corner_state(index, choices))
+
+    def corner_state(self, index, choices=None):
+        """Method returning the state codes, one per dimension (see corner_layout), of the corner at the given flat
+        index of an array returned by evaluate_grid (see corner_parameters)."""
+        states = self.corner_layout().states
+
+        if choices is None:
+            choices = [range(len(variable_states)) for variable_states in states]
+
+        positions = numpy.unravel_index(index, [len(variable_choices) for variable_choices in reversed(choices)])
+
+        return tuple(variable_states[variable_choices[position]] for variable_states, variable_choices, position
+                     in zip(states, choices, reversed(positions)))
+
+    ####################
+    def compile_kernel(self):
+        """Method which compiles the expression into a NumPy function taking the variables values as arguments in the
+        order the variables were given.
+
+        Compiled functions are kept in the process-wide expression cache (see ExpressionCache), so an expression which
+        has already been compiled for another equation is not compiled again."""
+        if self.kernel is None:
+            hits = expression_cache.hits
+
+            with self.phase("compile"):
+                self.kernel = expression_cache.get(self.expression, self.variables)
+                # The variables are swapped for plain placeholder symbols before compiling, which also stops SymPy's
+                #   code printers treating instances of the Variable class as their own (unrelated) codegen Variable
+                #   class
+
+            self.count("cache_hits" if expression_cache.hits > hits else "cache_misses")
+
+        return self.kernel
+
+    ####################
+    def fixed_values(self):
+        """Method returning a dictionary of {variable: nominal value} for every variable without tolerances, which
+        take the same value in every corner."""
+        return {variable: variable.nom_value for variable, states in zip(self.variables, self.corner_states())
+                if len(states) == 1}
+
+    def reduced_expression(self, fixed=None):
+        """Method returning the expression with the values of the variables without tolerances (see fixed_values)
+        substituted in once, leaving only the toleranced variables.
+
+        SymPy evaluates the substituted expression as it is rebuilt, so the constants which are left are folded
+        together (e.g. 0.063 / R_hys with R_hys fixed becomes a single number)."""
+        if fixed is None:
+            fixed = self.fixed_values()
+
+        return self.expression.xreplace(fixed)
+
+    def compile_corner_kernel(self, precision=None):
+        """Method which compiles the reduced expression (see reduced_expression) into a NumPy function, with common
+        subexpressions evaluated once, for evaluating the corners. It takes the same arguments as compile_kernel, the
+        values given for the variables without tolerances being ignored.
+
+        precision (by default the one the equation is being evaluated in) "high" gives a HighPrecisionKernel instead,
+        which is called in the same way. Each function is kept (the float64 one in corner_kernel, the high precision
+        one in high_kernel) until the nominal value of a variable without tolerances changes, or a variable gains or
+        loses its tolerances, or for the high precision one, its number of digits changes. They are kept in the
+        process-wide expression cache like compile_kernel."""
+        if precision is None:
+            precision = self.precision
+
+        fixed = self.fixed_values()
+
+        if precision == "high":
+            if self.high_kernel is None or fixed != self.high_kernel_fixed or self.digits != self.high_kernel_digits:
+                hits = expression_cache.hits
+
+                with self.phase("compile"):
+                    self.high_kernel = HighPrecisionKernel(
+                        expression_cache.get(self.reduced_expression(fixed), self.variables,
+                                             kind="mpmath_corner_kernel", compiler=compile_mpmath), self.digits)
+                    self.high_kernel_fixed = fixed
+                    self.high_kernel_digits = self.digits
+
+                self.count("cache_hits" if expression_cache.hits > hits else "cache_misses")
+
+            return self.high_kernel
+
+        if self.corner_kernel is None or fixed != self.corner_kernel_fixed:
+            hits = expression_cache.hits
+
+            with self.phase("compile"):
+                self.corner_kernel = expression_cache.get(self.reduced_expression(fixed), self.variables,
+                                                          kind="corner_kernel", compiler=compile_cse)
+                self.corner_kernel_fixed = fixed
+
+            self.count("cache_hits" if expression_cache.hits > hits else "cache_misses")
+
+        return self.corner_kernel
+
+    ####################
+    def evaluate_grid(self, choices=None):
+        """Method to evaluate the compiled expression over the grid of corners made from the chosen values of each
+        dimension of the corner_layout (by default every value) in a single NumPy array operation.
+
+        Each dimension's values are reshaped along their own axis so that calling the compiled function broadcasts
+        across every corner. The returned array has one axis per dimension, in reverse order (the last dimension is the
+        first axis), so that when flattened the corners are in the same order as the list returned by
+        calculate_values (when there are no tolerance groups)."""
+        layout = self.corner_layout()
+        values = layout.points
+
+        if choices is not None:
+            values = [variable_values[list(variable_choices)]
+                      for variable_values, variable_choices in zip(values, choices)]
+
+        shape = tuple(len(variable_values) for variable_values in reversed(values))
+        arguments = []
+
+        for i, variable_values in enumerate(values):
+            axis_shape = [1] * len(values)
+            axis_shape[len(values) - 1 - i] = len(variable_values)
+            arguments.append(variable_values.reshape(axis_shape))
+
+        result = layout.wrap(self.compile_corner_kernel())(*arguments)
+
+        if numpy.iscomplexobj(result):
+            raise ValueError("The expression %s has complex values over the variables tolerance ranges"
+                             % self.expression)
+
+        return numpy.broadcast_to(numpy.asarray(result, dtype=numpy.float64), shape)
+
+    ####################
+    def calculate_values_vectorised(self):
+        """Method to calculate all possible values of the expression from the equation's instances of the Variable
+        class in a single NumPy array operation (see evaluate_grid), the expression is compiled once with lambdify."""
+        return self.evaluate_grid()
 
     ####################
     def __make_params(self, variable_name, current_parameter, existing_parameters=None):
@@ -185,7 +1183,7 @@ class Equation:
                 raise TypeError("Existing parameters being passed in must be a string")
 
         ##### FUNCTION CONTENT #####
-        if variable.nom_value and not (variable.tol_value_set or variable.tol_values_unique_set):
+        if not (variable.tol_value_set or variable.tol_values_unique_set):
             # In this case, there is only a nominal value and no tolerances to consider.
 
             parameters = self.__make_params(variable, parameter[1], existing_parameters=existing_parameters)
@@ -204,7 +1202,7 @@ class Equation:
 
             return arr
 
-        elif (variable.tol_value_set or variable.tol_values_unique_set) and variable.nom_value:
+        else:
             # There are tolerances so we will have to create a list/array in the form [parameters, expression/value]
             #   then add that to the existing values calculated or make a new list/array
 
@@ -229,13 +1227,72 @@ class Equation:
 
             return arr  # The loop has finished and all substitutions are made so return the new list/array
 
+    ####################
+    def substituted_corners(self, layout):
+        """Generator method which yields every corner over the dimensions of a corner_layout, in corner order, as
+        (states, value) tuples, using SymPy substitution.
+
+        Without tolerance groups this is iterate_values, starting from the reduced expression. Otherwise the values of
+        every variable at each corner are substituted at once."""
+        if not layout.grouped:
+            yield from self.iterate_values(self.reduced_expression(), *self.variables)
+            return
+
+        # The first dimension varies fastest
+        for positions in product(*(range(len(states)) for states in reversed(layout.states))):
+            positions = positions[::-1]
+            self.count("subs_calls")
+
+            yield (tuple(states[position] for states, position in zip(layout.states, positions)),
+                   self.expression.subs(list(zip(self.variables, layout.variable_values(positions)))))
+
+    ####################
+    def iterate_values(self, expr, *subs):
+        """Generator method which yields the same corners as calculate_values, in the same order, as
+        (states, value) tuples, where states are the state codes of each variable (+1 Maximal, 0 Nominal,
+        -1 Minimal) rather than a parameter string.
+
+        Only one chain of partially substituted expressions (one per variable) is alive at a time, rather than the
+        lists of every partial substitution built up by calculate_values."""
+        if len(subs) == 1:
+            inner = [((), expr)]
+            # Nothing has been substituted yet
+
+        else:
+            inner = self.iterate_values(expr, *subs[1:])
+
+        variable = subs[0]
+        states = self.variable_states(variable)
+
+        if variable not in expr.free_symbols:  # E.g. already substituted (see reduced_expression), nothing to do
+            for existing_states, substituted in inner:
+                for state in states:
+                    yield (state,) + existing_states, substituted
+
+            return
+
+        if variable.tol_value_set or variable.tol_values_unique_set:
+            values = variable.value_range
+
+        else:
+            values = [variable.nom_value]
+
+        for existing_states, substituted in inner:
+            self.count("subs_calls", len(values))
+
+            for state, value in zip(states, values):
+                yield (state,) + existing_states, substituted.subs([(variable, value)])
+
     ####################
     def calculate_values(self, expr, *subs):
         """Method to recursively calculate the all possible values for the expression from the given instances of the
         Variable class. This will return a list of lists with each sub-list containing the parameters used to obtain the
         values, followed by the values themselves (in that order, i.e. [parameters, value resulting from parameters]).
         There may not be any numbers returned in the value field if not enough unknown variable values are given as
-        arguments to the method."""
+        arguments to the method.
+
+        The equation's methods no longer call this (see iterate_values), it is kept as the reference implementation
+        the streamed substitution is checked against."""
 
         ###### PSEUDOCODE #####
         ##### This is my best attempt at pseudocode this recursive functions operation
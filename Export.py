@@ -0,0 +1,227 @@
+from abc import ABC, abstractmethod
+from ast import literal_eval
+from itertools import repeat
+import csv
+import json
+import os
+import struct
+
+from LazyImport import lazy_import
+
+numpy = lazy_import("numpy")
+
+
+# Includes classes for streaming the results (and optionally every corner) of equations to CSV, JSON Lines, or NumPy
+#   .npy files, one equation at a time, so that the report of a large sweep is never built up in memory
+
+SUMMARY_FIELDS = ("name", "expression", "variables", "unit", "nominal", "minimum", "maximum", "tol_plus", "tol_minus",
+                  "tol_decimal_plus", "tol_decimal_minus", "nominal_parameters", "minimum_parameters",
+                  "maximum_parameters")
+
+NUMERIC_FIELDS = ("nominal", "minimum", "maximum", "tol_plus", "tol_minus", "tol_decimal_plus", "tol_decimal_minus")
+
+CORNER_FIELDS = ("name", "index", "states", "value")
+
+
+class ResultWriter(ABC):
+    """Base class for the result writers, which write the summary (see Equation.summary) of each equation given to
+    write to handle, an open file, as soon as it is given.
+
+    If corner_handle is given every corner of each equation (see Equation.iterate_corners) is also written to it,
+    chunk_size corners at a time, as (name, index in corner order, state codes, value) records. The writers can be used
+    as context managers, which call close when done."""
+
+    def __init__(self, handle, corner_handle=None, chunk_size=None):
+        self.handle = handle
+        self.corner_handle = corner_handle
+        self.chunk_size = chunk_size
+        self.count = 0  # The number of equations written
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    ####################
+    def write(self, equation, name=None):
+        """Method to write the results of an equation, named name (by default its expression)."""
+        results = equation.summary()
+        results["name"] = name if name is not None else results["expression"]
+
+        self.write_summary(results)
+
+        if self.corner_handle is not None:
+            for start, states, values in equation.iterate_corners(self.chunk_size):
+                self.write_corners(results["name"], start, states, values)
+
+        self.count += 1
+
+    def write_all(self, equations):
+        """Method to write every equation of an iterable of equations or of (name, equation) pairs."""
+        for equation in equations:
+            if isinstance(equation, tuple):
+                self.write(equation[1], name=equation[0])
+
+            else:
+                self.write(equation)
+
+    ####################
+    @abstractmethod
+    def write_summary(self, results):
+        """Method to write the summary of one equation, a dictionary of SUMMARY_FIELDS."""
+
+    @abstractmethod
+    def write_corners(self, name, start, states, values):
+        """Method to write a chunk of corners of the named equation, starting at index start in corner order, from
+        the arrays of their state codes and values."""
+
+    def close(self):
+        """Method to finish writing, the handles are flushed but left open."""
+        self.handle.flush()
+
+        if self.corner_handle is not None:
+            self.corner_handle.flush()
+
+
+class CsvWriter(ResultWriter):
+    """Class writing one CSV row per equation (with a header of SUMMARY_FIELDS), and one row per corner (with a header
+    of CORNER_FIELDS) to the corner handle, where the variables and state codes are separated by spaces."""
+
+    def __init__(self, handle, corner_handle=None, chunk_size=None):
+        super().__init__(handle, corner_handle, chunk_size)
+        self.writer = csv.writer(handle)
+        self.writer.writerow(SUMMARY_FIELDS)
+
+        if corner_handle is not None:
+            self.corner_writer = csv.writer(corner_handle)
+            self.corner_writer.writerow(CORNER_FIELDS)
+
+    def write_summary(self, results):
+        results = dict(results, variables=" ".join(results["variables"]))
+        self.writer.writerow(["" if results[field] is None else results[field] for field in SUMMARY_FIELDS])
+
+    def write_corners(self, name, start, states, values):
+        self.corner_writer.writerows(zip(repeat(name), range(start, start + len(values)),
+                                         (" ".join(map(str, row)) for row in states.tolist()), values.tolist()))
+
+
+class JsonLinesWriter(ResultWriter):
+    """Class writing one JSON object per line, a "summary" record per equation and a "corner" record per corner (which
+    may be written to the same handle as the summaries). Values which are not numeric are written as strings."""
+
+    def write_summary(self, results):
+        self.handle.write(json.dumps(dict(results, type="summary"), default=str) + "\n")
+
+    def write_corners(self, name, start, states, values):
+        self.corner_handle.writelines(
+            json.dumps({"type": "corner", "name": name, "index": index, "states": row, "value": value},
+                       default=str) + "\n"
+            for index, row, value in zip(range(start, start + len(values)), states.tolist(), values.tolist()))
+
+
+class NpyWriter(ResultWriter):
+    """Class writing a NumPy .npy file of a structured array with one record per equation (its number in the order
+    written, "equation", and the NUMERIC_FIELDS), and optionally a second one of the corners with the fields "equation",
+    "index" (the corner's index in corner order, from which its state codes follow), and "value".
+
+    The records are appended as they are written, and the array lengths in the headers are filled in by close, so the
+    handles must be seekable binary files opened for writing. Values which are not numeric are written as NaN."""
+
+    SUMMARY_DTYPE = [("equation", "<i8")] + [(field, "<f8") for field in NUMERIC_FIELDS]
+    CORNER_DTYPE = [("equation", "<i8"), ("index", "<i8"), ("value", "<f8")]
+
+    def __init__(self, handle, corner_handle=None, chunk_size=None):
+        super().__init__(handle, corner_handle, chunk_size)
+        self.corner_count = 0
+        self.header_starts = {}
+
+        for file, dtype in ((handle, self.SUMMARY_DTYPE), (corner_handle, self.CORNER_DTYPE)):
+            if file is None:
+                continue
+
+            if not file.seekable():
+                raise ValueError("The handles of a NpyWriter must be seekable, to fill in the headers when closed")
+
+            self.header_starts[id(file)] = file.tell()
+            file.write(npy_header(dtype, 0))
+
+    def write_summary(self, results):
+        record = numpy.zeros(1, dtype=self.SUMMARY_DTYPE)
+        record["equation"] = self.count
+
+        for field in NUMERIC_FIELDS:
+            record[field] = results[field] if isinstance(results[field], float) else numpy.nan
+
+        self.handle.write(record.tobytes())
+
+    def write_corners(self, name, start, states, values):
+        records = numpy.empty(len(values), dtype=self.CORNER_DTYPE)
+        records["equation"] = self.count
+        records["index"] = numpy.arange(start, start + len(values))
+
+        try:
+            records["value"] = values
+
+        except (TypeError, ValueError):  # Symbolic values
+            records["value"] = numpy.nan
+
+        self.corner_handle.write(records.tobytes())
+        self.corner_count += len(values)
+
+    def close(self):
+        """Method to fill in the array lengths in the headers of the files, then flush them."""
+        for file, dtype, count in ((self.handle, self.SUMMARY_DTYPE, self.count),
+                                   (self.corner_handle, self.CORNER_DTYPE, self.corner_count)):
+            if file is None:
+                continue
+
+            end = file.tell()
+            file.seek(self.header_starts[id(file)])
+            file.write(npy_header(dtype, count))
+            file.seek(end)
+
+        super().close()
+
+
+####################
+def npy_header(dtype, count):
+    """Function returning the (version 1.0) .npy header of a one dimensional array of count records of dtype, the length
+    is padded to a fixed width so that the header can be rewritten in place once the final count is known."""
+    header = "{'descr': %s, 'fortran_order': False, 'shape': (%20d,), }" % (repr(dtype), count)
+    literal_eval(header)  # The header must be a valid Python literal for NumPy to read it
+
+    length = 10 + len(header) + 1  # Magic string, version, and header length come first, and a newline last
+    header += " " * (-length % 64) + "\n"
+
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1")
+
+
+WRITERS = {".csv": (CsvWriter, "w"), ".jsonl": (JsonLinesWriter, "w"), ".npy": (NpyWriter, "wb")}
+
+
+def export(equations, path, corner_path=None, chunk_size=None):
+    """Function writing the results of an iterable of equations (or of (name, equation) pairs) to path, and every corner
+    to corner_path if given, in the format given by the path's extension (.csv, .jsonl, or .npy). The equations are
+    written one by one as they are taken from the iterable, so a generator can be used for large sweeps. The number of
+    equations written is returned."""
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension not in WRITERS:
+        raise ValueError("The results can only be exported to %s files" % ", ".join(WRITERS))
+
+    writer_class, mode = WRITERS[extension]
+    newline = {"newline": ""} if extension == ".csv" else {}
+
+    with open(path, mode, **newline) as handle:
+        corner_handle = open(corner_path, mode, **newline) if corner_path is not None else None
+
+        try:
+            with writer_class(handle, corner_handle, chunk_size) as writer:
+                writer.write_all(equations)
+
+        finally:
+            if corner_handle is not None:
+                corner_handle.close()
+
+    return writer.count
@@ -0,0 +1,124 @@
+from collections import OrderedDict
+from threading import Lock
+from sympy import Symbol, lambdify
+
+
+# Includes a process-wide, size limited cache of compiled (numeric) forms of expressions
+
+class ExpressionCache:
+    """Class for a least recently used (LRU) cache of compiled expressions.
+
+    Expressions are keyed on their canonical form, which is the expression with each of its variables swapped for a
+    positional placeholder symbol, so the same formula given with the same ordering of variables is only compiled once
+    however many Equations (or Variable instances) it is used with. The number of hits, misses, and evictions are
+    counted to see how well the cache is working."""
+
+    def __init__(self, maxsize=256):
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.maxsize = maxsize
+
+    #########################
+
+    @property
+    def maxsize(self):
+        """Getter method for the maximum number of compiled expressions kept, 0 disables the cache."""
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, value=256):
+        """Setter method for the maximum number of compiled expressions kept.
+
+        Checks a valid value has been passed in, then evicts the least recently used entries until the cache fits."""
+        if not isinstance(value, int):
+            raise TypeError('The cache size (maxsize) must be of type int')
+
+        if value < 0:
+            raise ValueError('The cache size (maxsize) cannot be negative')
+
+        with self._lock:
+            self._maxsize = value
+            self._evict()
+
+    #########################
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self):
+        """Method removing the least recently used entries until the cache is within its maximum size, the lock must be
+        held by the caller."""
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    #########################
+
+    @staticmethod
+    def canonical(expression, variables):
+        """Method returning the canonical form of an expression and the positional placeholder symbols used in it, in
+        the order of the given variables."""
+        placeholders = [Symbol('_x%d' % i) for i in range(len(variables))]
+
+        return expression.xreplace(dict(zip(variables, placeholders))), placeholders
+
+    def get(self, expression, variables, kind="kernel", compiler=None):
+        """Method returning the compiled form of an expression of the given (ordered) variables, compiling and storing it
+        on a miss.
+
+        kind names what is compiled, so different compiled forms of the same expression can be kept, and compiler is
+        the function called with the canonical expression and the placeholder symbols to build it on a miss (by
+        default a NumPy lambdify function taking the variables values in order)."""
+        canonical, placeholders = self.canonical(expression, variables)
+        key = (kind, canonical, len(placeholders))
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+            self.misses += 1
+
+        if compiler is None:
+            compiled = lambdify(placeholders, canonical, modules="numpy")
+
+        else:
+            compiled = compiler(canonical, placeholders)
+
+        with self._lock:
+            if self._maxsize:
+                self._entries[key] = compiled
+                self._entries.move_to_end(key)
+                self._evict()
+
+        return compiled
+
+    def clear(self):
+        """Method removing every compiled expression and resetting the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def info(self):
+        """Method returning a dictionary of the cache counters and size."""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self._entries),
+                "maxsize": self._maxsize}
+
+
+####################
+def compile_cse(canonical, placeholders):
+    """Function compiling a canonical expression into a NumPy function, as the default compiler of ExpressionCache.get
+    does, with common subexpressions pulled out so they are only evaluated once per call."""
+    return lambdify(placeholders, canonical, modules="numpy", cse=True)
+
+
+# The cache shared by every Equation in the process, resize it with expression_cache.maxsize = ...
+expression_cache = ExpressionCache()
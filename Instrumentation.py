@@ -0,0 +1,130 @@
+from contextlib import contextmanager
+from sys import getallocatedblocks
+from time import perf_counter
+
+
+# Includes classes for (opt-in) timing and counting of the work done by equations
+
+
+class PhaseStats:
+    """Class holding the totals for one phase of work: how many times it ran, the wall time spent in it, and the net
+    number of memory blocks it left allocated (from sys.getallocatedblocks, a cheap proxy for allocations)."""
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.allocations = 0
+
+    def add(self, seconds, allocations, calls=1):
+        self.calls += calls
+        self.seconds += seconds
+        self.allocations += allocations
+
+    def as_dict(self):
+        return {"calls": self.calls, "seconds": self.seconds, "allocations": self.allocations}
+
+
+class Stats:
+    """Class holding the per phase timings and the counters (e.g. corners evaluated, subs calls, cache hits) of an
+    equation.
+
+    Phases may be nested, in which case the time of the inner phase is also included in the outer one. Every phase
+    and count is also passed on to the aggregator given, if any."""
+
+    def __init__(self, aggregator=None, label=None):
+        self.aggregator = aggregator
+        self.label = label
+        self.phases = {}
+        self.counters = {}
+
+    ####################
+    @contextmanager
+    def phase(self, name):
+        """Context manager method timing the work done inside it as the named phase."""
+        blocks = getallocatedblocks()
+        start = perf_counter()
+
+        try:
+            yield
+
+        finally:
+            self.add_phase(name, perf_counter() - start, getallocatedblocks() - blocks)
+
+    def add_phase(self, name, seconds, allocations, calls=1):
+        """Method adding a run of the named phase to the totals."""
+        try:
+            self.phases[name].add(seconds, allocations, calls)
+
+        except KeyError:
+            self.phases[name] = PhaseStats()
+            self.phases[name].add(seconds, allocations, calls)
+
+        if self.aggregator is not None:
+            self.aggregator.add_phase(name, seconds, allocations, calls, label=self.label)
+
+    def count(self, name, amount=1):
+        """Method adding amount to the named counter."""
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+        if self.aggregator is not None:
+            self.aggregator.count(name, amount, label=self.label)
+
+    ####################
+    def as_dict(self):
+        """Method returning the phases and counters as a (JSON friendly) dictionary."""
+        return {"phases": {name: phase.as_dict() for name, phase in self.phases.items()},
+                "counters": dict(self.counters)}
+
+    def report(self):
+        """Method returning a human readable table of the phases and counters."""
+        lines = ["%-16s %8s %12s %12s" % ("phase", "calls", "seconds", "allocations")]
+
+        for name, phase in sorted(self.phases.items(), key=lambda item: -item[1].seconds):
+            lines.append("%-16s %8d %12.6f %12d" % (name, phase.calls, phase.seconds, phase.allocations))
+
+        for name, amount in sorted(self.counters.items()):
+            lines.append("%-16s %8d" % (name, amount))
+
+        return "\n".join(lines)
+
+
+class Aggregator(Stats):
+    """Class for the process-wide totals of every instrumented equation.
+
+    Setting enabled instruments every equation made afterwards (each equation can also be instrumented on its own),
+    and sinks are callables which are given a dictionary for each phase run or count as it happens, e.g. to send
+    them on to a log or a metrics system."""
+
+    def __init__(self):
+        super().__init__()
+        self.enabled = False
+        self.sinks = []
+
+    def add_sink(self, sink):
+        """Method adding a callable to be given each event dictionary."""
+        self.sinks.append(sink)
+
+    def remove_sink(self, sink):
+        self.sinks.remove(sink)
+
+    def add_phase(self, name, seconds, allocations, calls=1, label=None):
+        super().add_phase(name, seconds, allocations, calls)
+
+        for sink in self.sinks:
+            sink({"type": "phase", "equation": label, "phase": name, "seconds": seconds,
+                  "allocations": allocations, "calls": calls})
+
+    def count(self, name, amount=1, label=None):
+        super().count(name, amount)
+
+        for sink in self.sinks:
+            sink({"type": "count", "equation": label, "counter": name, "amount": amount})
+
+    def reset(self):
+        """Method clearing the totals (the sinks and enabled setting are kept)."""
+        self.phases = {}
+        self.counters = {}
+
+
+# The aggregator shared by every Equation in the process
+instrumentation = Aggregator()
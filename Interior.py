@@ -0,0 +1,182 @@
+from LazyImport import lazy_import
+
+numpy = lazy_import("numpy")
+
+
+# Includes functions and a class for finding extremes of an equation inside its tolerance box, rather than at corners
+
+
+class InteriorResult:
+    """Class holding the lowest and highest values of an equation found anywhere inside the tolerance box of its
+    variables, next to the corner minimum and maximum, and whether each corner result was exact (no lower or higher
+    value was found inside the box).
+
+    The points are dictionaries of {variable: value} where the values were found. A search can miss an extreme, so a
+    corner result reported as exact is only as certain as the search, while one reported as not exact is certainly
+    not."""
+
+    def __init__(self, minimum, minimum_point, maximum, maximum_point, corner_minimum, corner_maximum, tolerance,
+                 evaluations, iterations):
+        self.minimum = minimum
+        self.minimum_point = minimum_point
+        self.maximum = maximum
+        self.maximum_point = maximum_point
+        self.corner_minimum = corner_minimum
+        self.corner_maximum = corner_maximum
+
+        self.minimum_exact = not minimum < corner_minimum - tolerance
+        self.maximum_exact = not maximum > corner_maximum + tolerance
+
+        if self.minimum_exact:  # The corner is kept as the result, rather than a value it only matches to rounding
+            self.minimum = corner_minimum
+            self.minimum_point = None
+
+        if self.maximum_exact:
+            self.maximum = corner_maximum
+            self.maximum_point = None
+
+        self.evaluations = evaluations  # Expression and gradient evaluations made
+        self.iterations = iterations
+
+    @property
+    def exact(self):
+        """Getter method for whether both the corner minimum and maximum were exact."""
+        return self.minimum_exact and self.maximum_exact
+
+    ####################
+    def pretty_print(self, UoM="Unit(s)"):
+        """Method returning a short summary string of the results."""
+        lines = []
+
+        for name, value, corner, exact, point in (("minimum", self.minimum, self.corner_minimum, self.minimum_exact,
+                                                   self.minimum_point),
+                                                  ("maximum", self.maximum, self.corner_maximum, self.maximum_exact,
+                                                   self.maximum_point)):
+            if exact:
+                lines.append("The corner %s of %g %s is exact" % (name, corner, UoM))
+
+            else:
+                lines.append("The %s is %g %s (the corner %s is %g %s), found inside the box at %s" % (
+                    name, value, UoM, name, corner, UoM,
+                    ", ".join("%s = %g" % (variable, variable_value) for variable, variable_value in point.items())))
+
+        return "\n".join(lines)
+
+
+####################
+def descend(kernel, gradient, lower, upper, starts, direction, iterations=200, tolerance=1e-10):
+    """Function running a projected gradient descent of direction * the compiled expression kernel (-1 to find the
+    maximum) from every row of starts (in box coordinates, 0 at lower and 1 at upper) at once, inside the box. The step
+    of each start is halved until it gives a sufficient decrease (Armijo's rule), and grown again after it does.
+
+    Returns the (starts, variables) array of the points reached, their values, the number of evaluations, and the
+    number of iterations run."""
+    width = upper - lower
+
+    def evaluate(position):
+        arguments = lower + position * width
+        values = direction * numpy.broadcast_to(numpy.asarray(kernel(*arguments.T), dtype=numpy.float64),
+                                                (len(position),))
+        return values
+
+    def slope(position):
+        arguments = lower + position * width
+        columns = [numpy.broadcast_to(numpy.asarray(column, dtype=numpy.float64), (len(position),))
+                   for column in gradient(*arguments.T)]
+        return direction * numpy.stack(columns, axis=1) * width
+
+    position = numpy.clip(starts, 0.0, 1.0)
+    values = evaluate(position)
+    steps = numpy.ones(len(position))
+    evaluations = len(position)
+    active = numpy.ones(len(position), dtype=bool)
+
+    for iteration in range(1, iterations + 1):
+        slopes = slope(position[active])
+        evaluations += int(active.sum())
+
+        # Only the directions which can still move inside the box count towards convergence
+        free = ~(((position[active] <= 0.0) & (slopes > 0)) | ((position[active] >= 1.0) & (slopes < 0)))
+        converged = numpy.linalg.norm(numpy.where(free, slopes, 0.0), axis=1) <= tolerance * (1 + numpy.abs(
+            values[active]))
+
+        indices = numpy.flatnonzero(active)
+        active[indices[converged]] = False
+        indices = indices[~converged]
+        slopes = slopes[~converged]
+
+        if not len(indices):
+            break
+
+        for _ in range(30):  # Halve each step until it gives a sufficient decrease
+            trial = numpy.clip(position[indices] - steps[indices, None] * slopes, 0.0, 1.0)
+            trial_values = evaluate(trial)
+            evaluations += len(indices)
+
+            accepted = trial_values <= values[indices] + 1e-4 * numpy.sum(slopes * (trial - position[indices]), axis=1)
+            moved = numpy.any(trial != position[indices], axis=1)
+
+            position[indices[accepted]] = trial[accepted]
+            values[indices[accepted]] = trial_values[accepted]
+            steps[indices[accepted]] *= 2
+
+            stuck = ~accepted & ~moved
+            active[indices[stuck]] = False
+
+            remaining = ~accepted & moved
+            steps[indices[remaining]] /= 2
+            indices = indices[remaining]
+            slopes = slopes[remaining]
+
+            if not len(indices):
+                break
+
+        else:
+            active[indices] = False  # No decrease found at any step, so at a (numerical) stationary point
+
+        if not active.any():
+            break
+
+    return position, direction * values, evaluations, iteration
+
+
+def interior_extremes(kernel, gradient, variables, lower, upper, corner_minimum, corner_maximum, starts=8, seed=None,
+                      iterations=200):
+    """Function searching the box from lower to upper (float arrays, one value per variable) of a compiled expression
+    kernel and its compiled gradient (see Sensitivity.compile_gradient) for its lowest and highest values, returning
+    an InteriorResult against the given corner minimum and maximum.
+
+    Each search starts from the middle of the box, the corner the gradient there points towards (the best corner if
+    the expression were linear), and starts random points inside the box (from seed), which are all descended
+    together. The cost is a few hundred evaluations per start, however many variables there are, rather than the k^n
+    of a grid with k points along every variable."""
+    lower = numpy.asarray(lower, dtype=numpy.float64)
+    upper = numpy.asarray(upper, dtype=numpy.float64)
+
+    middle = numpy.full(len(lower), 0.5)
+    slopes = numpy.array([float(numpy.asarray(column)) for column in gradient(*(lower + middle * (upper - lower)))])
+    random_starts = numpy.random.default_rng(seed).random((starts, len(lower)))
+
+    results = []
+    evaluations = 0
+    iterations_run = 0
+
+    for direction in (1.0, -1.0):
+        corner = numpy.where(direction * slopes > 0, 0.0, 1.0)
+        points, values, direction_evaluations, direction_iterations = descend(
+            kernel, gradient, lower, upper, numpy.vstack([middle, corner, random_starts]), direction, iterations)
+
+        if not numpy.all(numpy.isfinite(values)):
+            raise ValueError("The expression has values which are not finite inside the tolerance box")
+
+        best = int(numpy.argmin(values) if direction > 0 else numpy.argmax(values))
+        point = lower + points[best] * (upper - lower)
+        results.append((float(values[best]), dict(zip(variables, (float(value) for value in point)))))
+
+        evaluations += direction_evaluations
+        iterations_run = max(iterations_run, direction_iterations)
+
+    tolerance = 1e-9 * max(abs(corner_minimum), abs(corner_maximum), 1e-300)
+
+    return InteriorResult(results[0][0], results[0][1], results[1][0], results[1][1], corner_minimum, corner_maximum,
+                          tolerance, evaluations, iterations_run)
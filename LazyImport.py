@@ -0,0 +1,31 @@
+import importlib.util
+import sys
+
+
+# Includes a function for deferring the import of the heavy numeric modules (NumPy, UliEngineering) until they are used
+
+
+def lazy_import(name):
+    """Function returning the named module without running it, it is only actually imported (in the usual way, and
+    only once) when one of its attributes is first used.
+
+    This keeps the start up time of a script down to the modules it really needs, e.g. NumPy is not loaded until the
+    first corner is evaluated. A module which has already been imported is returned as it is."""
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError("No module named %r" % name, name=name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+
+    parent, _, child = name.rpartition(".")
+    if parent:  # As the import system would, make the module an attribute of its package
+        setattr(sys.modules[parent], child, module)
+
+    return module
@@ -0,0 +1,403 @@
+from LazyImport import lazy_import
+from Parallel import map_tasks, split_range, worker_count
+from Sketches import Histogram, QuantileSketch
+
+numpy = lazy_import("numpy")
+
+
+# Includes functions and classes for statistical (Monte Carlo) tolerance analysis of equations
+
+DISTRIBUTIONS = ("uniform", "normal")
+
+SEED_BLOCK = 4096  # Samples drawn from each seed, so that the samples of a run do not depend on its chunk size
+
+
+class MonteCarloResult:
+    """Class holding the statistics from a Monte Carlo run of an equation.
+
+    The mean and standard deviation are accumulated chunk by chunk, and the percentiles are taken over every
+    evaluated sample, unless the run was streamed. Then no samples are kept, and the percentiles are estimated from a
+    QuantileSketch (sketch) within percentile_error of their true values. A Histogram (histogram) of the samples may
+    also be accumulated either way."""
+
+    def __init__(self, samples, distribution, sigma, seed, spec=None, sketch=None, histogram=None):
+        self.samples = samples
+        self.distribution = distribution
+        self.sigma = sigma
+        self.seed = seed
+        self.spec = spec
+
+        self.count = 0
+        self.mean = 0.0
+        self._sum_squares = 0.0  # Sum of squared differences from the mean (M2 of Welford/Chan's algorithm)
+        self.minimum = None
+        self.maximum = None
+        self.in_spec = 0
+
+        self.percentiles = {}
+        self.values = None
+
+        self.sketch = sketch
+        self.histogram = histogram
+
+    ####################
+    @property
+    def variance(self):
+        """Getter method for the (sample) variance of the evaluated values."""
+        if self.count < 2:
+            return 0.0
+
+        return self._sum_squares / (self.count - 1)
+
+    @property
+    def std(self):
+        """Getter method for the (sample) standard deviation of the evaluated values."""
+        return numpy.sqrt(self.variance)
+
+    @property
+    def yield_fraction(self):
+        """Getter method for the fraction of the evaluated values inside the spec window, None if no spec was given."""
+        if self.spec is None or self.count == 0:
+            return None
+
+        return self.in_spec / self.count
+
+    ####################
+    def update(self, values):
+        """Method to add a chunk of evaluated values to the running statistics, the chunk mean and sum of squares are
+        merged with the running ones using Chan's parallel algorithm so no chunk has to be kept."""
+        count = len(values)
+        if count == 0:
+            return
+
+        mean = float(values.mean())
+        sum_squares = float(((values - mean) ** 2).sum())
+
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self._sum_squares += sum_squares + delta ** 2 * self.count * count / total
+        self.count = total
+
+        chunk_minimum = float(values.min())
+        chunk_maximum = float(values.max())
+        self.minimum = chunk_minimum if self.minimum is None else min(self.minimum, chunk_minimum)
+        self.maximum = chunk_maximum if self.maximum is None else max(self.maximum, chunk_maximum)
+
+        if self.spec is not None:
+            self.in_spec += int(in_spec(values, self.spec).sum())
+
+        for summary in (self.sketch, self.histogram):
+            if summary is not None:
+                summary.update(values)
+
+    ####################
+    @property
+    def streamed(self):
+        """Getter method for whether the percentiles were estimated from the quantile sketch."""
+        return self.sketch is not None
+
+    def percentile_error(self, percentile):
+        """Method returning the largest error of the value given for a percentile, 0.0 if it was taken over every
+        sample (see QuantileSketch.error_bound)."""
+        if not self.streamed:
+            return 0.0
+
+        return self.sketch.error_bound(self.percentiles.get(percentile, self.sketch.quantile(percentile / 100)))
+
+    ####################
+    def merge(self, other):
+        """Method to merge the running statistics of another result (e.g. from another process) into this one."""
+        if other.count == 0:
+            return
+
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self._sum_squares += other._sum_squares + delta ** 2 * self.count * other.count / total
+        self.count = total
+
+        self.minimum = other.minimum if self.minimum is None else min(self.minimum, other.minimum)
+        self.maximum = other.maximum if self.maximum is None else max(self.maximum, other.maximum)
+        self.in_spec += other.in_spec
+
+        for summary, other_summary in ((self.sketch, other.sketch), (self.histogram, other.histogram)):
+            if summary is not None and other_summary is not None:
+                summary.merge(other_summary)
+
+    ####################
+    def pretty_print(self, UoM="Unit(s)"):
+        """Method returning a short summary string of the results."""
+        summary = "%d samples (%s): mean %g %s, standard deviation %g %s, min %g, max %g" % (
+            self.count, self.distribution, self.mean, UoM, self.std, UoM, self.minimum, self.maximum)
+
+        if self.spec is not None:
+            summary += ", yield %.4f%%" % (self.yield_fraction * 100)
+
+        if self.streamed:
+            summary += ", percentiles within %g%% (streamed)" % (self.sketch.relative_accuracy * 100)
+
+        return summary
+
+
+####################
+def in_spec(values, spec):
+    """Function returning a boolean array of which values are inside the spec window (low, high), either limit may be
+    None to leave that side open."""
+    low, high = spec
+    inside = values == values  # All True, except for NaNs
+
+    if low is not None:
+        inside &= values >= low
+
+    if high is not None:
+        inside &= values <= high
+
+    return inside
+
+
+####################
+def variable_tolerances(variable):
+    """Function returning the nominal value and the minus and plus tolerance values of an instance of the Variable
+    class as floats, taking the tolerance type and unique tolerances into account."""
+    tol_plus, tol_minus = variable.plus_minus()
+
+    return float(variable.nom_value), tol_minus, tol_plus
+
+
+####################
+def sample_variable(variable, count, rng, distribution="uniform", sigma=3.0):
+    """Function to draw count samples of the value of an instance of the Variable class.
+
+    "uniform" draws evenly between the minimal and maximal values. "normal" treats each tolerance as sigma standard
+    deviations, where the plus and minus tolerances differ (unique tolerances, or only positive/negative tolerance
+    types) a split normal distribution is used, i.e. each side of the nominal value is half of a normal distribution
+    with that side's standard deviation."""
+    nominal, minus, plus = variable_tolerances(variable)
+
+    if minus == 0 and plus == 0:
+        return numpy.full(count, nominal, dtype=numpy.float64)
+
+    if distribution == "uniform":
+        return nominal - minus + (minus + plus) * rng.random(count)
+
+    elif distribution == "normal":
+        sigma_minus = minus / sigma
+        sigma_plus = plus / sigma
+
+        deviation = numpy.abs(rng.standard_normal(count))
+        upper = rng.random(count) < sigma_plus / (sigma_plus + sigma_minus)
+        # Each side is picked in proportion to its standard deviation, so that the density is continuous at nominal
+
+        return nominal + numpy.where(upper, sigma_plus * deviation, -sigma_minus * deviation)
+
+    raise ValueError("The distribution must be one of %s" % (DISTRIBUTIONS,))
+
+
+####################
+def sample_group(variables, distributions, count, rng, sigma=3.0, ratio_tolerance=0.0):
+    """Function to draw count samples of each member of a tolerance group (see ToleranceGroup), returning a list of
+    arrays in the order of the members.
+
+    Every member is sampled (see sample_variable) from its own generator seeded with the same draw from rng, so the
+    members use the same random numbers and are at the same point of their own distributions. Each member after the
+    first is then multiplied by its own ratio variation of up to ratio_tolerance, drawn evenly for "uniform", or as
+    sigma standard deviations for "normal"."""
+    seed = int(rng.integers(2 ** 63))
+    samples = [sample_variable(variable, count, numpy.random.default_rng(seed), variable_distribution, sigma)
+               for variable, variable_distribution in zip(variables, distributions)]
+
+    if ratio_tolerance:
+        for member, variable_distribution in enumerate(distributions[1:], start=1):
+            if variable_distribution == "normal":
+                variation = rng.standard_normal(count) / sigma
+
+            else:
+                variation = rng.uniform(-1.0, 1.0, count)
+
+            samples[member] = samples[member] * (1 + ratio_tolerance * variation)
+
+    return samples
+
+
+####################
+def sample_distributions(variables, distribution):
+    """Function returning the distribution to use for each variable, from either a single distribution name or a
+    dictionary of {variable: distribution name} (variables missing from it are sampled uniformly)."""
+    if isinstance(distribution, dict):
+        distributions = [distribution.get(variable, "uniform") for variable in variables]
+
+    else:
+        distributions = [distribution] * len(variables)
+
+    for variable_distribution in distributions:
+        if variable_distribution not in DISTRIBUTIONS:
+            raise ValueError("The distribution must be one of %s" % (DISTRIBUTIONS,))
+
+    return distributions
+
+
+####################
+def chunk_seeds(seed, samples, chunk_size):
+    """Function returning a list of the chunks of a run, each a list of the (sample count, seed sequence) of its
+    blocks, seed may be an integer or a NumPy SeedSequence.
+
+    The samples are drawn SEED_BLOCK at a time, every block from its own child of the run's seed sequence, and each
+    chunk holds as many whole blocks as fit in chunk_size (at least one). A run is therefore reproducible from its seed
+    whatever its chunk size, and regardless of which order (or which process) the chunks are evaluated in."""
+    counts = [SEED_BLOCK] * (samples // SEED_BLOCK)
+    if samples % SEED_BLOCK:
+        counts.append(samples % SEED_BLOCK)
+
+    if not isinstance(seed, numpy.random.SeedSequence):
+        seed = numpy.random.SeedSequence(seed)
+
+    blocks = list(zip(counts, seed.spawn(len(counts))))
+    per_chunk = max(1, chunk_size // SEED_BLOCK)
+
+    return [blocks[start:start + per_chunk] for start in range(0, len(blocks), per_chunk)]
+
+
+####################
+def sample_block(variables, distributions, count, seed_sequence, sigma=3.0, groups=()):
+    """Function to sample every variable for one block of count samples from its seed sequence, returning a list of
+    arrays in the order of the variables. groups are the tolerance groups among the variables (see
+    ToleranceGroup.tolerance_groups), whose members are sampled together (see sample_group)."""
+    rng = numpy.random.default_rng(seed_sequence)
+    leaders = {indices[0]: (indices, ratio) for indices, ratio in groups}
+    arguments = [None] * len(variables)
+
+    for index, (variable, variable_distribution) in enumerate(zip(variables, distributions)):
+        if index in leaders:
+            indices, ratio = leaders[index]
+            samples = sample_group([variables[member] for member in indices],
+                                   [distributions[member] for member in indices], count, rng, sigma, ratio)
+
+            for member, member_samples in zip(indices, samples):
+                arguments[member] = member_samples
+
+        elif arguments[index] is None:
+            arguments[index] = sample_variable(variable, count, rng, variable_distribution, sigma)
+
+    return arguments
+
+
+def evaluate_chunk(kernel, variables, distributions, blocks, sigma=3.0, groups=()):
+    """Function to sample every variable for the (sample count, seed sequence) blocks of one chunk (see chunk_seeds
+    and sample_block) and evaluate the compiled expression on them at once, returning a float64 array of the values
+    of every sample, in block order."""
+    count = sum(block_count for block_count, _ in blocks)
+    arguments = [numpy.concatenate(samples) for samples
+                 in zip(*(sample_block(variables, distributions, block_count, seed_sequence, sigma, groups)
+                          for block_count, seed_sequence in blocks))]
+
+    values = kernel(*arguments)
+
+    if numpy.iscomplexobj(values):
+        raise ValueError("The expression has complex values over the variables tolerance ranges")
+
+    values = numpy.asarray(values, dtype=numpy.float64)
+    if values.ndim == 0:  # The expression does not depend on any sampled variable
+        values = numpy.full(count, float(values), dtype=numpy.float64)
+
+    return values
+
+
+####################
+def run_chunks(kernel, variables, distributions, chunks, sigma=3.0, spec=None, groups=(), relative_accuracy=None,
+               edges=None):
+    """Function evaluating the given list of chunks, each a list of (sample count, seed sequence) blocks (see
+    chunk_seeds), returning the
+    running statistics of them as a MonteCarloResult and an array of every value evaluated, in chunk order. This is
+    the task each process runs when a Monte Carlo analysis is run in parallel.
+
+    If relative_accuracy is given the run is streamed: the values go into a QuantileSketch of that accuracy rather
+    than being kept, and None is returned in place of the array. edges are the bin edges of a Histogram to also
+    accumulate, if any."""
+    sketch = QuantileSketch(relative_accuracy) if relative_accuracy is not None else None
+    histogram = Histogram(edges) if edges is not None else None
+    result = MonteCarloResult(sum(count for blocks in chunks for count, _ in blocks), distributions, sigma, None,
+                              spec=spec, sketch=sketch, histogram=histogram)
+    values = numpy.empty(result.samples, dtype=numpy.float64) if sketch is None else None
+
+    start = 0
+    for blocks in chunks:
+        chunk = evaluate_chunk(kernel, variables, distributions, blocks, sigma, groups)
+        result.update(chunk)
+
+        if values is not None:
+            values[start:start + len(chunk)] = chunk
+
+        start += len(chunk)
+
+    return result, values
+
+
+####################
+def monte_carlo(kernel, variables, samples=100000, distribution="uniform", sigma=3.0, seed=None, chunk_size=100000,
+                spec=None, percentiles=(1, 5, 50, 95, 99), keep_values=False, workers=None, groups=(), streaming=False,
+                relative_accuracy=0.001, histogram=None):
+    """Function to run a Monte Carlo analysis of a compiled expression (see Equation.compile_kernel) of the given
+    instances of the Variable class.
+
+    Samples are drawn and evaluated chunk_size (or at least SEED_BLOCK) at a time, so the memory used by the sampling is
+    bounded by the chunk size; only the evaluated values (8 bytes per sample) are kept to take the percentiles from.
+    Every block of SEED_BLOCK samples is drawn from its own seed (see chunk_seeds), so the same seed gives the same
+    samples whatever the chunk size. If workers is given (see Parallel.map_tasks) the chunks are split across a pool
+    of processes, in which case kernel must be picklable (see Parallel.KernelTransport); the results are the same
+    either way. groups are the
+    tolerance groups among the variables (see ToleranceGroup.tolerance_groups), whose members are drawn together.
+
+    If streaming is True no values are kept at all, so the memory used does not grow with the number of samples: the
+    percentiles are estimated from a QuantileSketch, to within relative_accuracy of their values (see
+    MonteCarloResult.percentile_error), which the processes' sketches are merged into. histogram is an optional
+    Histogram (e.g. Histogram.linear(low, high, 200)) to accumulate the values into, which is kept in the result."""
+    if samples < 1 or chunk_size < 1:
+        raise ValueError("The number of samples and the chunk size must be positive")
+
+    if streaming and keep_values:
+        raise ValueError("The values of a streamed run are not kept")
+
+    distributions = sample_distributions(variables, distribution)
+    seed = numpy.random.SeedSequence(seed)
+    relative_accuracy = relative_accuracy if streaming else None
+    edges = histogram.edges if histogram is not None else None
+    result = MonteCarloResult(samples, distribution, sigma, seed.entropy, spec=spec,
+                              sketch=QuantileSketch(relative_accuracy) if streaming else None, histogram=histogram)
+    # The entropy is kept as the result's seed, so that a run without a given seed can still be repeated
+    chunks = chunk_seeds(seed, samples, chunk_size)
+
+    if workers:
+        tasks = [(kernel, variables, distributions, part, sigma, spec, groups, relative_accuracy, edges)
+                 for part in split_range(chunks, worker_count(workers) * 4)]
+        partials = map_tasks(run_chunks, tasks, workers)
+
+    else:
+        partials = [run_chunks(kernel, variables, distributions, chunks, sigma, spec, groups, relative_accuracy, edges)]
+
+    if streaming:
+        for partial, _ in partials:
+            result.merge(partial)
+
+        result.percentiles = result.sketch.percentiles(percentiles)
+        return result
+
+    if len(partials) == 1:
+        result.merge(partials[0][0])
+        values = partials[0][1]
+
+    else:
+        values = numpy.empty(samples, dtype=numpy.float64)
+        start = 0
+
+        for partial, partial_values in partials:
+            result.merge(partial)
+            values[start:start + len(partial_values)] = partial_values
+            start += len(partial_values)
+
+    result.percentiles = dict(zip(percentiles, numpy.percentile(values, percentiles)))
+
+    if keep_values:
+        result.values = values
+
+    return result
@@ -0,0 +1,83 @@
+from concurrent.futures import Executor, ProcessPoolExecutor
+from ExpressionCache import ExpressionCache, expression_cache
+
+
+# Includes classes and functions for spreading the evaluation of an equation across a pool of processes
+
+
+class KernelTransport:
+    """Class which stands in for a compiled expression when it is sent to another process.
+
+    Compiled (lambdify) functions cannot be pickled, so only the canonical form of the expression and its placeholder
+    symbols are sent, and the expression is compiled again, once, through the expression cache of the process it is
+    called in. Calling an instance is the same as calling the compiled expression.
+
+    kind and compiler are passed on to ExpressionCache.get, the compiler must be a module level function so that it
+    can be pickled."""
+
+    def __init__(self, expression, variables, kind="kernel", compiler=None):
+        self.expression, self.placeholders = ExpressionCache.canonical(expression, variables)
+        self.kind = kind
+        self.compiler = compiler
+        self._kernel = None
+
+    def __call__(self, *arguments):
+        if self._kernel is None:
+            self._kernel = expression_cache.get(self.expression, self.placeholders, self.kind, self.compiler)
+
+        return self._kernel(*arguments)
+
+    def __getstate__(self):
+        return {"expression": self.expression, "placeholders": self.placeholders, "kind": self.kind,
+                "compiler": self.compiler}
+
+    def __setstate__(self, state):
+        self.expression = state["expression"]
+        self.placeholders = state["placeholders"]
+        self.kind = state.get("kind", "kernel")
+        self.compiler = state.get("compiler")
+        self._kernel = None
+
+
+####################
+def split_range(items, parts):
+    """Function splitting a range (or list) into at most the given number of contiguous, near equal, parts."""
+    parts = max(1, min(parts, len(items)))
+    size, extra = divmod(len(items), parts)
+
+    splits = []
+    start = 0
+    for part in range(parts):
+        stop = start + size + (1 if part < extra else 0)
+        splits.append(items[start:stop])
+        start = stop
+
+    return splits
+
+
+####################
+def map_tasks(function, tasks, workers):
+    """Function calling function(*arguments) for each tuple of arguments in tasks across a pool of processes,
+    returning the results in the same order as the tasks.
+
+    workers is either the number of processes to start a pool with (the pool is shut down again afterwards) or an
+    already running concurrent.futures Executor to reuse."""
+    if isinstance(workers, Executor):
+        futures = [workers.submit(function, *arguments) for arguments in tasks]
+        return [future.result() for future in futures]
+
+    if not isinstance(workers, int) or workers < 1:
+        raise ValueError("The number of workers must be a positive int (or an Executor)")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(function, *arguments) for arguments in tasks]
+        return [future.result() for future in futures]
+
+
+####################
+def worker_count(workers):
+    """Function returning the number of processes a workers argument (see map_tasks) stands for."""
+    if isinstance(workers, Executor):
+        return getattr(workers, "_max_workers", 1)
+
+    return workers
@@ -0,0 +1,168 @@
+from sympy import lambdify
+
+from LazyImport import lazy_import
+
+numpy = lazy_import("numpy")
+mpmath = lazy_import("mpmath")
+
+
+# Includes the numeric precision settings of equations, and the arbitrary precision (mpmath) form of their kernels
+
+PRECISIONS = ("float64", "high", "auto")
+
+
+class PrecisionSettings:
+    """Class for the process-wide precision settings, used by every Equation not given its own.
+
+    default is the precision the corners are evaluated in: "float64" is the compiled NumPy kernel on hardware floats,
+    "high" evaluates the same expression with mpmath at digits significant (decimal) digits, and "auto" uses float64
+    but checks the nominal corner in high precision afterwards, evaluating every corner again in high precision if
+    float64 lost more than a relative tolerance (rtol) of the result (see check_precision). The check costs an mpmath
+    compilation per expression, so it is opt in."""
+
+    def __init__(self, default="float64", digits=50, rtol=1e-9):
+        self.default = default
+        self.digits = digits
+        self.rtol = rtol
+
+    #########################
+
+    @property
+    def default(self):
+        """Getter method for the default precision of equations."""
+        return self._default
+
+    @default.setter
+    def default(self, value="float64"):
+        """Setter method for the default precision, which must be one of PRECISIONS."""
+        self._default = validate_precision(value)
+
+    @property
+    def digits(self):
+        """Getter method for the number of significant digits of the high precision evaluation."""
+        return self._digits
+
+    @digits.setter
+    def digits(self, value=50):
+        """Setter method for the number of significant digits of the high precision evaluation."""
+        self._digits = validate_digits(value)
+
+    @property
+    def rtol(self):
+        """Getter method for the relative error of a float64 result above which it is evaluated again."""
+        return self._rtol
+
+    @rtol.setter
+    def rtol(self, value=1e-9):
+        """Setter method for the relative error of a float64 result above which it is evaluated again."""
+        if not isinstance(value, float):
+            raise TypeError('The relative tolerance (rtol) must be of type float')
+
+        if not value > 0:
+            raise ValueError('The relative tolerance (rtol) must be positive')
+
+        self._rtol = value
+
+
+####################
+def validate_precision(value):
+    """Function checking a precision is one of PRECISIONS, returning it."""
+    if value not in PRECISIONS:
+        raise ValueError('The precision must be either "float64", "high", or "auto"')
+
+    return value
+
+
+def validate_digits(value):
+    """Function checking a number of significant digits is valid, returning it."""
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise TypeError('The number of digits must be of type int')
+
+    if value < 16:
+        raise ValueError('The number of digits must be at least 16 (the precision of float64)')
+
+    return value
+
+
+####################
+class PrecisionCheck:
+    """Class holding the outcome of checking the float64 value of an equation's nominal corner against its high
+    precision value, taken with the same (float64) inputs, so that the difference is only the rounding of the
+    arithmetic.
+
+    The error is measured against the scale of the results, the larger of the nominal value and the spread of the
+    corners, so a result which cancels to (near) zero is still checked against the tolerances it is used with."""
+
+    def __init__(self, float_value, high_value, scale, rtol, digits):
+        self.float_value = float_value
+        self.high_value = high_value
+        self.error = abs(float_value - high_value)
+        self.scale = scale
+        self.rtol = rtol
+        self.digits = digits
+
+        self.cancelled = bool(self.error > rtol * scale) if numpy.isfinite(high_value) else False
+
+    @property
+    def digits_lost(self):
+        """Getter method for how many of float64's 16 significant digits of the result were lost to rounding."""
+        if not self.error:
+            return 0.0
+
+        if not self.scale:
+            return 16.0
+
+        return float(min(16.0, max(0.0, 16 + numpy.log10(self.error / self.scale))))
+
+    def pretty_print(self, UoM="Unit(s)"):
+        """Method returning a short summary string of the check."""
+        if self.cancelled:
+            return ("The float64 nominal of %r %s was off by %g %s (about %.1f digits lost to cancellation), so the "
+                    "corners were evaluated with %d digits" % (self.float_value, UoM, self.error, UoM,
+                                                               self.digits_lost, self.digits))
+
+        return "The float64 nominal of %r %s agrees with %d digit arithmetic to %g %s" % (
+            self.float_value, UoM, self.digits, self.error, UoM)
+
+
+####################
+def compile_mpmath(canonical, placeholders):
+    """Function compiling a canonical expression (see ExpressionCache.canonical) into an mpmath function of scalars,
+    whose precision is whatever mpmath's working precision is when it is called (see HighPrecisionKernel)."""
+    return lambdify(placeholders, canonical, modules="mpmath")
+
+
+class HighPrecisionKernel:
+    """Class calling an mpmath compiled expression (see compile_mpmath) the way a NumPy kernel is called: with arrays
+    broadcast against each other, returning a float64 array.
+
+    Every value is converted to an mpmath number and the arithmetic is done at digits significant digits, only the
+    result of each corner is rounded to float64. It can be pickled, so it can be sent to other processes, if the
+    compiled expression can (e.g. a Parallel.KernelTransport)."""
+
+    def __init__(self, kernel, digits):
+        self.kernel = kernel
+        self.digits = digits
+
+    def evaluate(self, *values):
+        return self.kernel(*(mpmath.mpf(value) for value in values))
+
+    def __call__(self, *arguments):
+        with mpmath.workdps(self.digits):
+            if arguments:
+                values = numpy.frompyfunc(self.evaluate, len(arguments), 1)(*arguments)
+
+            else:
+                values = self.kernel()
+
+        values = numpy.asarray(values, dtype=object)
+
+        try:
+            return values.astype(numpy.float64)
+
+        except TypeError:  # Complex values, which the callers check for
+            return values.astype(numpy.complex128)
+
+
+# The settings shared by every Equation in the process, change the default with precision_settings.default = ...
+precision_settings = PrecisionSettings()
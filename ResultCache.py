@@ -0,0 +1,210 @@
+from hashlib import sha256
+import json
+import os
+import tempfile
+
+from sympy import srepr
+
+from ExpressionCache import ExpressionCache
+
+
+# Includes an on-disk cache of equation results, which can be shared between runs and processes
+
+FORMAT_VERSION = 4  # Changed whenever the layout of the entries (or what they depend on) changes
+
+LOW_WATER = 0.9  # Eviction removes entries until the cache is within this fraction of its limits
+
+
+class ResultCache:
+    """Class for a content addressed cache of the results (nominal, minimum, and maximum) of equations, kept as one
+    small JSON file per result in a directory.
+
+    The key of a result is a hash of everything it depends on: the canonical form of the expression (see
+    ExpressionCache.canonical), the names, state codes, and corner values of the variables in order, their tolerance
+    groups, and the method and precision used. An unchanged design therefore finds its results without evaluating
+    anything, while any change to a value or tolerance gives a new key rather than a stale result.
+
+    Entries are written to a temporary file which is then renamed over the entry, so readers in other processes only
+    ever see whole entries. Reading an entry touches its modification time, and once the directory holds more than
+    max_entries entries or max_bytes bytes the least recently used entries are removed, down to LOW_WATER of the
+    limits so that the following writes do not each evict again. The number and size of the entries are kept as
+    running totals, counted once when the cache is opened, so the directory is only listed again when a write takes
+    it over a limit (entries written by other processes are counted then). Entries removed (or not yet written) by
+    another process are simply misses."""
+
+    def __init__(self, directory, max_bytes=64 * 2 ** 20, max_entries=None):
+        if max_bytes is not None and max_bytes < 0:
+            raise ValueError('The cache size (max_bytes) cannot be negative')
+
+        if max_entries is not None and max_entries < 0:
+            raise ValueError('The number of entries (max_entries) cannot be negative')
+
+        self.directory = os.fspath(directory)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        entries = self.entries()
+        self.count = len(entries)  # Running totals of the entries, see _evict
+        self.total = sum(size for _, size, _ in entries)
+
+    #########################
+
+    @staticmethod
+    def key(expression, variables, states, points, method, groups=(), precision="float64"):
+        """Method returning the hex digest keying the results of an expression of the given (ordered) variables, whose
+        corners have the given state codes and values (see Equation.corner_states and corner_points), by method.
+        groups are the tolerance groups among the variables (see ToleranceGroup.tolerance_groups), and precision the
+        arithmetic the corners are evaluated with (e.g. "high 50", see Precision)."""
+        canonical, _ = ExpressionCache.canonical(expression, variables)
+
+        content = json.dumps([FORMAT_VERSION, srepr(canonical), method, precision,
+                              [[str(variable), list(variable_states), [float(value) for value in variable_points]]
+                               for variable, variable_states, variable_points in zip(variables, states, points)],
+                              [[list(indices), ratio] for indices, ratio in groups]])
+
+        return sha256(content.encode()).hexdigest()
+
+    def path(self, key):
+        """Method returning the path of the file holding the entry of a key."""
+        return os.path.join(self.directory, key + ".json")
+
+    #########################
+
+    def get(self, key):
+        """Method returning the results kept for a key, as a dictionary of {"nominal": [parameters, value], "minimum":
+        ..., "maximum": ..., ...} (see Equation.cache_record), or None on a miss."""
+        path = self.path(key)
+
+        try:
+            with open(path) as file:
+                results = json.load(file)
+
+            os.utime(path)  # Mark the entry as recently used
+
+        except (OSError, ValueError):  # Missing, evicted meanwhile, or not readable
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return results
+
+    def put(self, key, results):
+        """Method keeping the results for a key (see get), then evicting the least recently used entries if the cache
+        is over its limits."""
+        path = self.path(key)
+        handle, temporary = tempfile.mkstemp(dir=self.directory, prefix=".", suffix=".tmp")
+
+        try:
+            with os.fdopen(handle, "w") as file:
+                json.dump(results, file)
+                size = file.tell()
+
+            try:
+                replaced = os.stat(path).st_size
+
+            except OSError:  # A new entry
+                replaced = None
+
+            os.replace(temporary, path)
+
+        except BaseException:
+            try:
+                os.remove(temporary)
+
+            except OSError:
+                pass
+
+            raise
+
+        if replaced is None:
+            self.count += 1
+            self.total += size
+
+        else:
+            self.total += size - replaced
+
+        if (self.max_entries is not None and self.count > self.max_entries) or \
+                (self.max_bytes is not None and self.total > self.max_bytes):
+            self._evict()
+
+    #########################
+
+    def entries(self):
+        """Method returning a list of (modification time, size, path) for every entry, least recently used first."""
+        entries = []
+
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.startswith(".") or not entry.name.endswith(".json"):
+                    continue
+
+                try:
+                    stat = entry.stat()
+
+                except OSError:  # Removed by another process
+                    continue
+
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        return sorted(entries)
+
+    def _evict(self):
+        """Method listing the entries again (to count those of other processes, and those they removed), and if the
+        cache is over max_entries or max_bytes, removing the least recently used entries until it is within LOW_WATER
+        of them."""
+        entries = self.entries()
+        self.count = len(entries)
+        self.total = sum(size for _, size, _ in entries)
+
+        if (self.max_entries is None or self.count <= self.max_entries) and \
+                (self.max_bytes is None or self.total <= self.max_bytes):
+            return
+
+        for _, size, path in entries:
+            over_entries = self.max_entries is not None and self.count > int(self.max_entries * LOW_WATER)
+            over_bytes = self.max_bytes is not None and self.total > self.max_bytes * LOW_WATER
+
+            if not over_entries and not over_bytes:
+                break
+
+            try:
+                os.remove(path)
+                self.evictions += 1
+
+            except OSError:  # Already removed by another process
+                pass
+
+            self.count -= 1
+            self.total -= size
+
+    def __len__(self):
+        return len(self.entries())
+
+    def clear(self):
+        """Method removing every entry and resetting the counters."""
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+
+            except OSError:
+                pass
+
+        self.count = 0
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def info(self):
+        """Method returning a dictionary of the cache counters and size."""
+        entries = self.entries()
+
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(entries),
+                "bytes": sum(size for _, size, _ in entries), "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes}
@@ -0,0 +1,102 @@
+from sympy import diff, lambdify
+
+from LazyImport import lazy_import
+
+numpy = lazy_import("numpy")
+
+
+# Includes functions and a class for linearised (root-sum-square) tolerance and sensitivity analysis of equations
+
+
+class SensitivityResult:
+    """Class holding the results of a sensitivity analysis of an equation, from the partial derivatives of its
+    expression at the nominal values of its variables.
+
+    Each variable's contribution to the output is its partial derivative times its tolerance, split into how far it
+    can move the output up (contributions_plus) and down (contributions_minus). The root-sum-square (RSS) tolerances
+    combine these as if the variables were independent, and the linear tolerances add them up, which is the worst case
+    of the linearised expression. Every array is in the order of the variables."""
+
+    def __init__(self, variables, nominal, derivatives, nominal_values, tolerances_plus, tolerances_minus):
+        self.variables = list(variables)
+        self.nominal = nominal
+        self.derivatives = derivatives
+
+        # An increasing variable moves the output up by its plus tolerance, a decreasing one by its minus tolerance
+        rising = derivatives >= 0
+        self.contributions_plus = numpy.abs(derivatives) * numpy.where(rising, tolerances_plus, tolerances_minus)
+        self.contributions_minus = numpy.abs(derivatives) * numpy.where(rising, tolerances_minus, tolerances_plus)
+
+        # The relative change of the output for a relative change of each variable, which has no meaning at 0
+        if nominal:
+            self.sensitivities = derivatives * nominal_values / nominal
+
+        else:
+            self.sensitivities = numpy.full_like(derivatives, numpy.nan)
+
+        self.rss_plus = float(numpy.sqrt(numpy.sum(self.contributions_plus ** 2)))
+        self.rss_minus = float(numpy.sqrt(numpy.sum(self.contributions_minus ** 2)))
+        self.linear_plus = float(numpy.sum(self.contributions_plus))
+        self.linear_minus = float(numpy.sum(self.contributions_minus))
+
+    ####################
+    @property
+    def shares(self):
+        """Getter method for the fraction of the RSS output variance due to each variable (using the larger of its
+        plus and minus contributions), which add up to 1."""
+        variances = numpy.maximum(self.contributions_plus, self.contributions_minus) ** 2
+        total = variances.sum()
+
+        if total == 0:
+            return numpy.zeros_like(variances)
+
+        return variances / total
+
+    def ranking(self):
+        """Method returning a list of (variable, share of the RSS variance, plus contribution, minus contribution)
+        tuples, largest share first."""
+        rows = zip(self.variables, self.shares, self.contributions_plus, self.contributions_minus)
+
+        return sorted(((variable, float(share), float(plus), float(minus)) for variable, share, plus, minus in rows),
+                      key=lambda row: row[1], reverse=True)
+
+    ####################
+    def pretty_print(self, UoM="Unit(s)", limit=10):
+        """Method returning a short summary string of the results, listing the limit (or every, if None) variables
+        contributing the most."""
+        lines = ["Nominal %g %s, RSS tolerance +%g / -%g %s, linear tolerance +%g / -%g %s" % (
+            self.nominal, UoM, self.rss_plus, self.rss_minus, UoM, self.linear_plus, self.linear_minus, UoM)]
+
+        for variable, share, plus, minus in self.ranking()[:limit]:
+            lines.append("  %s: %.2f%% of the variance, +%g / -%g %s" % (variable, share * 100, plus, minus, UoM))
+
+        return "\n".join(lines)
+
+
+####################
+def compile_gradient(canonical, placeholders):
+    """Function compiling the partial derivatives of a canonical expression (see ExpressionCache.canonical) with
+    respect to each of its placeholder symbols into one NumPy function, which returns them as a list."""
+    return lambdify(placeholders, [diff(canonical, placeholder) for placeholder in placeholders], modules="numpy")
+
+
+def sensitivity(kernel, gradient, variables):
+    """Function to run a sensitivity analysis of a compiled expression (see Equation.compile_kernel) and its compiled
+    gradient (see compile_gradient) of the given instances of the Variable class, both evaluated once at the nominal
+    values of the variables."""
+    nominal_values = numpy.array([float(variable.nom_value) for variable in variables], dtype=numpy.float64)
+    tolerances = numpy.array([variable.plus_minus() for variable in variables], dtype=numpy.float64).reshape(-1, 2)
+
+    nominal = kernel(*nominal_values)
+    derivatives = gradient(*nominal_values)
+
+    if numpy.iscomplexobj(nominal) or any(numpy.iscomplexobj(derivative) for derivative in derivatives):
+        raise ValueError("The expression has complex values at the nominal values of its variables")
+
+    derivatives = numpy.array([float(derivative) for derivative in derivatives], dtype=numpy.float64)
+
+    if not numpy.all(numpy.isfinite(derivatives)):
+        raise ValueError("The expression has no finite derivative at the nominal values of its variables")
+
+    return SensitivityResult(variables, float(nominal), derivatives, nominal_values, tolerances[:, 0],
+                             tolerances[:, 1])
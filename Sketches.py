@@ -0,0 +1,259 @@
+from math import log
+
+from LazyImport import lazy_import
+
+numpy = lazy_import("numpy")
+
+
+# Includes bounded memory, mergeable summaries (sketches) of streams of values, e.g. of very large Monte Carlo runs
+
+
+class SketchStore:
+    """Class holding the counts of a QuantileSketch's buckets for values of one sign, as a dense array of counts from
+    the bucket key offset upwards.
+
+    At most max_buckets buckets are kept: when more are needed, the lowest buckets (the smallest magnitudes) are
+    collapsed into one, so only the smallest values lose their relative accuracy (see QuantileSketch.absolute_floor)."""
+
+    def __init__(self, max_buckets=8192):
+        self.max_buckets = max_buckets
+        self.counts = numpy.zeros(0, dtype=numpy.int64)
+        self.offset = 0
+        self.collapsed = False
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def keys(self):
+        """Method returning the key of each bucket."""
+        return numpy.arange(self.offset, self.offset + len(self.counts))
+
+    def add(self, keys, weights=None):
+        """Method adding a count (or the given weights) to the bucket of each key."""
+        if not len(keys):
+            return
+
+        low = int(keys.min())
+        high = int(keys.max())
+
+        if len(self.counts):
+            low = min(low, self.offset)
+            high = max(high, self.offset + len(self.counts) - 1)
+
+        if high - low + 1 > self.max_buckets:
+            low = high - self.max_buckets + 1
+            self.collapsed = True
+
+        if low != self.offset or high - low + 1 != len(self.counts):
+            self.rebase(low, high)
+
+        added = numpy.bincount(numpy.maximum(keys, low) - low, weights=weights, minlength=len(self.counts))
+        self.counts += numpy.rint(added).astype(numpy.int64) if weights is not None else added
+
+    def rebase(self, low, high):
+        """Method moving the counts to the buckets from key low to high, collapsing any below low into low."""
+        counts = numpy.zeros(high - low + 1, dtype=numpy.int64)
+
+        if len(self.counts):
+            keys = self.keys()
+            numpy.add.at(counts, numpy.maximum(keys, low) - low, self.counts)
+
+        self.counts = counts
+        self.offset = low
+
+    def merge(self, other):
+        """Method adding the counts of another store to this one."""
+        nonzero = other.counts != 0
+        self.add(other.keys()[nonzero], other.counts[nonzero].astype(numpy.float64))
+        self.collapsed = self.collapsed or other.collapsed
+
+
+class QuantileSketch:
+    """Class for a streaming quantile sketch (of the DDSketch kind), which takes values a chunk at a time and estimates
+    any quantile of every value seen, in a fixed amount of memory, however many values there are.
+
+    Each value is counted in a logarithmic bucket by magnitude, with buckets a factor of gamma = (1 + a) / (1 - a) wide
+    for a relative_accuracy of a, so each quantile estimate is within relative_accuracy of the true value of that
+    quantile (e.g. 0.1% for the default). Values far below the largest ones (by more than max_buckets buckets) are
+    collapsed together, where the estimate is only within absolute_floor of the true value, so the bound is the larger
+    of the two (see error_bound). Sketches with the same relative accuracy can be merged, e.g. from several processes,
+    giving the same sketch as if every value had been added to one. NaNs are counted, but not part of the quantiles."""
+
+    def __init__(self, relative_accuracy=0.001, max_buckets=8192):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("The relative accuracy must be between 0 and 1")
+
+        if max_buckets < 1:
+            raise ValueError("A quantile sketch needs at least one bucket")
+
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = log(self.gamma)
+
+        self.positive = SketchStore(max_buckets)
+        self.negative = SketchStore(max_buckets)  # Keyed by magnitude
+        self.zeros = 0
+        self.nans = 0
+        self.count = 0  # Excluding NaNs
+        self.minimum = None
+        self.maximum = None
+
+    ####################
+    def key(self, magnitudes):
+        """Method returning the bucket key of each (positive) magnitude."""
+        return numpy.ceil(numpy.log(magnitudes) / self._log_gamma).astype(numpy.int64)
+
+    def value(self, keys):
+        """Method returning the value each bucket key stands for, which is within relative_accuracy of every value in
+        the bucket."""
+        return 2 * numpy.exp(numpy.asarray(keys, dtype=numpy.float64) * self._log_gamma) / (self.gamma + 1)
+
+    @property
+    def absolute_floor(self):
+        """Getter method for the magnitude below which values were collapsed into one bucket, under which the
+        estimates are only good to this absolute error (0.0 if nothing was collapsed)."""
+        floors = [float(numpy.exp(store.offset * self._log_gamma)) for store in (self.positive, self.negative)
+                  if store.collapsed]
+
+        return max(floors) if floors else 0.0
+
+    def error_bound(self, value):
+        """Method returning the largest error of an estimated quantile of the given value."""
+        return max(self.relative_accuracy * abs(value), self.absolute_floor)
+
+    ####################
+    def update(self, values):
+        """Method adding a chunk (array) of values to the sketch."""
+        values = numpy.asarray(values, dtype=numpy.float64).ravel()
+        nans = numpy.isnan(values)
+
+        if nans.any():
+            self.nans += int(nans.sum())
+            values = values[~nans]
+
+        if not len(values):
+            return
+
+        tiny = numpy.finfo(numpy.float64).tiny
+        positive = values[values >= tiny]
+        negative = -values[values <= -tiny]
+
+        self.positive.add(self.key(positive))
+        self.negative.add(self.key(negative))
+        self.zeros += len(values) - len(positive) - len(negative)
+        self.count += len(values)
+
+        chunk_minimum = float(values.min())
+        chunk_maximum = float(values.max())
+        self.minimum = chunk_minimum if self.minimum is None else min(self.minimum, chunk_minimum)
+        self.maximum = chunk_maximum if self.maximum is None else max(self.maximum, chunk_maximum)
+
+    def merge(self, other):
+        """Method merging another sketch (e.g. from another process) into this one."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Only quantile sketches with the same relative accuracy can be merged")
+
+        self.positive.merge(other.positive)
+        self.negative.merge(other.negative)
+        self.zeros += other.zeros
+        self.nans += other.nans
+        self.count += other.count
+
+        for name, choose in (("minimum", min), ("maximum", max)):
+            if getattr(other, name) is not None:
+                mine = getattr(self, name)
+                setattr(self, name, getattr(other, name) if mine is None else choose(mine, getattr(other, name)))
+
+    ####################
+    def quantile(self, quantile):
+        """Method returning the estimated value at a quantile (between 0 and 1) of every value added, e.g. 0.999 for
+        the 99.9th percentile, which is within error_bound of the true value."""
+        if not 0 <= quantile <= 1:
+            raise ValueError("The quantile must be between 0 and 1")
+
+        if not self.count:
+            return numpy.nan
+
+        # Buckets from the most negative value up to the most positive
+        counts = numpy.concatenate([self.negative.counts[::-1], [self.zeros], self.positive.counts])
+        values = numpy.concatenate([-self.value(self.negative.keys()[::-1]), [0.0], self.value(self.positive.keys())])
+
+        bucket = int(numpy.searchsorted(numpy.cumsum(counts), quantile * (self.count - 1), side="right"))
+        bucket = min(bucket, len(values) - 1)
+
+        return float(min(max(values[bucket], self.minimum), self.maximum))
+
+    def percentiles(self, percentiles):
+        """Method returning a dictionary of {percentile: estimated value} for the given percentiles (0 to 100)."""
+        return {percentile: self.quantile(percentile / 100) for percentile in percentiles}
+
+
+####################
+class Histogram:
+    """Class for a histogram with fixed bins, which takes values a chunk at a time, keeping only the counts.
+
+    Values below the first edge or above the last are counted as underflow and overflow, and NaNs on their own.
+    Histograms with the same edges can be merged, e.g. from several processes."""
+
+    def __init__(self, edges):
+        self.edges = numpy.asarray(edges, dtype=numpy.float64)
+
+        if self.edges.ndim != 1 or len(self.edges) < 2 or not numpy.all(numpy.diff(self.edges) > 0):
+            raise ValueError("A histogram needs at least two strictly increasing bin edges")
+
+        self.counts = numpy.zeros(len(self.edges) - 1, dtype=numpy.int64)
+        self.underflow = 0
+        self.overflow = 0
+        self.nans = 0
+
+    @classmethod
+    def linear(cls, low, high, bins=100):
+        """Method returning a histogram of bins equal width bins from low to high."""
+        if not high > low:
+            raise ValueError("The histogram range must have a high limit above its low limit")
+
+        return cls(numpy.linspace(low, high, bins + 1))
+
+    ####################
+    @property
+    def centres(self):
+        """Getter method for the centre of each bin."""
+        return (self.edges[:-1] + self.edges[1:]) / 2
+
+    @property
+    def total(self):
+        """Getter method for the number of values added, including those outside the bins and NaNs."""
+        return int(self.counts.sum()) + self.underflow + self.overflow + self.nans
+
+    def density(self):
+        """Method returning the fraction of every value added in each bin, per unit of the value."""
+        if not self.total:
+            return numpy.zeros(len(self.counts))
+
+        return self.counts / (self.total * numpy.diff(self.edges))
+
+    ####################
+    def update(self, values):
+        """Method adding a chunk (array) of values to the histogram."""
+        values = numpy.asarray(values, dtype=numpy.float64).ravel()
+        nans = numpy.isnan(values)
+
+        if nans.any():
+            self.nans += int(nans.sum())
+            values = values[~nans]
+
+        self.underflow += int((values < self.edges[0]).sum())
+        self.overflow += int((values > self.edges[-1]).sum())
+        self.counts += numpy.histogram(values, self.edges)[0]
+
+    def merge(self, other):
+        """Method adding the counts of another histogram with the same edges to this one."""
+        if not numpy.array_equal(self.edges, other.edges):
+            raise ValueError("Only histograms with the same bin edges can be merged")
+
+        self.counts += other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        self.nans += other.nans
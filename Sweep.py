@@ -0,0 +1,193 @@
+from LazyImport import lazy_import
+from Corners import CORNER_STATES, chunk_layout
+
+numpy = lazy_import("numpy")
+
+
+# Includes a function and a class for evaluating an equation over grids of nominal values and tolerances (sweeps)
+
+
+class SweepResult:
+    """Class holding the results of an equation over a sweep: the nominal, minimum, and maximum values (across every
+    corner) at each point of a grid of nominal values and / or tolerances of some of its variables.
+
+    axes is a list of (variable, "nominal" or "tolerance", values) tuples, one per axis of the grid, and each result
+    array has one axis per sweep axis in the same order, e.g. results.maximum[i, j] is the maximum with the first swept
+    variable at axes[0][2][i] and the second at axes[1][2][j]."""
+
+    def __init__(self, axes, nominal, minimum, maximum, corners, evaluations):
+        self.axes = axes
+        self.nominal = nominal
+        self.minimum = minimum
+        self.maximum = maximum
+        self.corners = corners  # At each point of the grid
+        self.evaluations = evaluations  # Corners evaluated in total
+
+    ####################
+    @property
+    def shape(self):
+        """Getter method for the shape of the grid (and of each result array)."""
+        return self.nominal.shape
+
+    @property
+    def tol_plus(self):
+        """Getter method for the array of plus tolerances (maximum less nominal) at each point."""
+        return self.maximum - self.nominal
+
+    @property
+    def tol_minus(self):
+        """Getter method for the array of minus tolerances (nominal less minimum) at each point."""
+        return self.nominal - self.minimum
+
+    def grid(self):
+        """Method returning the values of each axis broadcast to the shape of the grid (like numpy.meshgrid with ij
+        indexing), e.g. for plotting the results as surfaces."""
+        return numpy.meshgrid(*(values for _, _, values in self.axes), indexing="ij")
+
+    ####################
+    def pretty_print(self, UoM="Unit(s)"):
+        """Method returning a short summary string of the results."""
+        axes = ", ".join("%s %s (%d points from %g to %g)" % (variable, kind, len(values), values.min(), values.max())
+                         for variable, kind, values in self.axes)
+
+        return "Swept %s: %d points of %d corners, the results range from %g to %g %s" % (
+            axes, self.nominal.size, self.corners, numpy.nanmin(self.minimum), numpy.nanmax(self.maximum), UoM)
+
+
+####################
+def sweep_axes(nominal=None, tolerances=None):
+    """Function returning the list of (variable, kind, values) sweep axes from dictionaries of {variable: values} of
+    the nominal values and decimal tolerances to sweep, nominal values first. The values may be any sequence (e.g. a
+    range, or numpy.geomspace(1e3, 1e6, 50))."""
+    axes = []
+
+    for kind, values_dict in (("nominal", nominal), ("tolerance", tolerances)):
+        for variable, values in (values_dict or {}).items():
+            values = numpy.asarray(list(values), dtype=numpy.float64)
+
+            if values.ndim != 1 or not len(values):
+                raise ValueError("The %s values swept for %s must be a non-empty sequence of numbers" % (kind,
+                                                                                                      variable))
+
+            if kind == "tolerance" and numpy.any(values < 0):
+                raise ValueError("The tolerances swept for %s cannot be negative" % variable)
+
+            axes.append((variable, kind, values))
+
+    return axes
+
+
+def variable_corner_values(variable, axes, shape):
+    """Function returning the (grid shape + (states,)) float array of the values a variable takes in the corners at
+    each point of the sweep grid, and its state codes (see Equation.variable_states).
+
+    A swept nominal value moves the whole value range of the variable. Its tolerances scale with it if they are
+    preferred as decimals (tol_pref 0), and are otherwise kept as numbers, as when setting nom_value. A swept tolerance
+    is a decimal of the nominal value on each side the tolerance type allows."""
+    nominal = numpy.float64(variable.nom_value)
+    tolerance = None
+
+    for axis, (swept, kind, values) in enumerate(axes):
+        if swept is not variable:
+            continue
+
+        axis_shape = [1] * len(shape)
+        axis_shape[axis] = len(values)
+
+        if kind == "nominal":
+            nominal = values.reshape(axis_shape)
+
+        else:
+            tolerance = values.reshape(axis_shape)
+
+    tol_type = variable.tol_type
+
+    if tolerance is not None:
+        plus = tolerance * numpy.abs(nominal) * (tol_type != 2)
+        minus = tolerance * numpy.abs(nominal) * (tol_type != 1)
+        states = CORNER_STATES[tol_type]
+
+    elif variable.tol_value_set or variable.tol_values_unique_set:
+        plus, minus = variable.plus_minus()
+        states = CORNER_STATES[tol_type]
+
+        if variable.tol_pref == 0 and variable.nom_value:  # Decimal tolerances follow the swept nominal value
+            scale = numpy.abs(nominal) / abs(float(variable.nom_value))
+            plus = plus * scale
+            minus = minus * scale
+
+    else:
+        plus = minus = 0.0
+        states = [0]
+
+    values = {1: nominal + plus, 0: nominal, -1: nominal - minus}
+
+    return numpy.stack([numpy.broadcast_to(values[state], shape) for state in states], axis=-1), states
+
+
+def sweep(kernel, variables, axes, chunk_size=65536):
+    """Function evaluating a compiled expression (see Equation.compile_kernel) of the given instances of the Variable
+    class at every corner of every point of a grid of swept nominal values and tolerances (see sweep_axes), returning a
+    SweepResult.
+
+    Each call of the compiled expression broadcasts across every point of the grid and a block of corners at once,
+    like Corners.iterate_chunks, so the corners are reduced to the minimum and maximum of each point chunk by chunk and
+    at most about chunk_size values (but at least one per grid point) are held at once."""
+    shape = tuple(len(values) for _, _, values in axes)
+    dimensions = len(shape)
+    points = int(numpy.prod(shape, dtype=numpy.int64))
+
+    corner_values = []
+    nominal_arguments = []
+    counts = []
+
+    for variable in variables:
+        values, states = variable_corner_values(variable, axes, shape)
+        corner_values.append(values)
+        nominal_arguments.append(values[..., states.index(0)])
+        counts.append(len(states))
+
+    def evaluate(arguments):
+        values = kernel(*arguments)
+
+        if numpy.iscomplexobj(values):
+            raise ValueError("The expression has complex values over the swept values and tolerance ranges")
+
+        return numpy.asarray(values, dtype=numpy.float64)
+
+    nominal = numpy.array(numpy.broadcast_to(evaluate(nominal_arguments), shape))
+
+    inner, block, count = chunk_layout([range(variable_count) for variable_count in counts],
+                                       max(1, chunk_size // max(points, 1)))
+    inner_arguments = []
+
+    for i, values in enumerate(corner_values[:inner]):
+        # The first variable varies fastest, so is the last axis after those of the grid
+        inner_arguments.append(values.reshape(shape + (1,) * (inner - 1 - i) + (counts[i],) + (1,) * i))
+
+    reduced_axes = tuple(range(dimensions, dimensions + inner))
+    chunk_shape = shape + tuple(reversed(counts[:inner]))
+    minimum = maximum = None
+
+    for chunk in range(count):
+        outer_arguments = []
+        remainder = chunk
+
+        for values, variable_count in zip(corner_values[inner:], counts[inner:]):
+            outer_arguments.append(values[..., remainder % variable_count].reshape(shape + (1,) * inner))
+            remainder //= variable_count
+
+        values = numpy.broadcast_to(evaluate(inner_arguments + outer_arguments), chunk_shape)
+        chunk_minimum = values.min(axis=reduced_axes)
+        chunk_maximum = values.max(axis=reduced_axes)
+
+        if minimum is None:
+            minimum = numpy.array(chunk_minimum)
+            maximum = numpy.array(chunk_maximum)
+
+        else:
+            numpy.minimum(minimum, chunk_minimum, out=minimum)
+            numpy.maximum(maximum, chunk_maximum, out=maximum)
+
+    return SweepResult(axes, nominal, minimum, maximum, block * count, points * (block * count + 1))
+
@@ -0,0 +1,72 @@
+from Variable import Variable
+
+
+# Includes a class for declaring that the tolerances of some variables track each other, e.g. a matched resistor array
+
+
+class ToleranceGroup:
+    """Class for a group of variables whose tolerances move together, rather than independently.
+
+    The members of a group are always at the same end of their tolerances at once (all Maximal, all Nominal, or all
+    Minimal), so the group only counts as one dimension of an equation's corners: a matched array of 8 resistors has 3
+    corners rather than 3^8. ratio_tolerance is the decimal tolerance of each member's value relative to the first
+    member (e.g. 0.001 for a divider trimmed to a 0.1% ratio), which each member after the first may also vary by,
+    independently, on top of the shared tolerance. These add a dimension of corners for each member after the first,
+    but give far tighter ranges than treating the members as independent.
+
+    In Monte Carlo analyses the members are drawn from the same random numbers, so they sit at the same point of their
+    own distributions (plus any independent ratio variation). Only equations with at least two members of a group are
+    affected, and only the corner and Monte Carlo analyses (not e.g. the sensitivity analysis) take groups into account.
+    """
+
+    def __init__(self, *variables, ratio_tolerance=0.0):
+        if len(variables) < 2:
+            raise ValueError("A tolerance group needs at least two variables")
+
+        for variable in variables:
+            if not isinstance(variable, Variable):
+                raise TypeError("The variables of a tolerance group must be instances of the Variable class")
+
+            if getattr(variable, 'tolerance_group', None) is not None:
+                raise ValueError("The variable %s is already in a tolerance group" % variable)
+
+        if len(set(variables)) != len(variables):
+            raise ValueError("A variable can only be in a tolerance group once")
+
+        if not 0 <= ratio_tolerance < 1:
+            raise ValueError("The ratio tolerance must be a decimal between 0 and 1")
+
+        self.variables = list(variables)
+        self.ratio_tolerance = float(ratio_tolerance)
+
+        for variable in self.variables:
+            variable.tolerance_group = self
+            variable._changed()  # Equations using the variable must enumerate their corners again
+
+    def __repr__(self):
+        return "ToleranceGroup(%s, ratio_tolerance=%g)" % (", ".join(map(str, self.variables)), self.ratio_tolerance)
+
+    ####################
+    def remove(self):
+        """Method to break up the group, after which its variables are independent again."""
+        for variable in self.variables:
+            variable.tolerance_group = None
+            variable._changed()
+
+        self.variables = []
+
+
+####################
+def tolerance_groups(variables):
+    """Function returning the tolerance groups among the given (ordered) variables, as a list of (indices of the
+    members, ratio tolerance) tuples in the order of their first member. Groups with fewer than two members among the
+    variables are left out, as they have nothing to track."""
+    groups = {}
+
+    for index, variable in enumerate(variables):
+        group = getattr(variable, 'tolerance_group', None)
+
+        if group is not None:
+            groups.setdefault(id(group), (group, []))[1].append(index)
+
+    return [(tuple(indices), group.ratio_tolerance) for group, indices in groups.values() if len(indices) > 1]
@@ -1,5 +1,8 @@
-from numpy import *
-from sympy import *
+from sympy import Float, Symbol
+from weakref import WeakSet
+from LazyImport import lazy_import
+
+numpy = lazy_import("numpy")
 
 
 # Includes functions for defining an equation which has variables
@@ -16,6 +19,9 @@ class Variable(Symbol):
 
 		super(Variable, self)  # Initialise SymPy's "Symbol" base class
 
+		self._initialised = False
+		# Tracking attribute so changes made while initialising don't update the value range or notify equations
+
 		self.nom_value = nom_value  # This is the nominal value of the variable
 
 		self.tol_pref = tol_pref
@@ -63,8 +69,135 @@ class Variable(Symbol):
 			self._tol_value_set = False  # Tracking attribute to quickly check if the instance has ordinary tolerances
 			self._tol_values_unique_set = False
 
+		self.tolerance_group = None  # The ToleranceGroup whose tolerances the variable tracks, if any
+
+		self.update_value_range()
+		self._initialised = True
+
+	def __getstate__(self):
+		"""Method returning the state of the instance for pickling (e.g. to send it to another process).
+
+		SymPy's Symbol only pickles the name and assumptions, so the nominal value and tolerance attributes are added
+		here; they are restored by Symbol's __setstate__. The equations depending on the instance and its tolerance group
+		are left out."""
+		state = dict(self.__dict__)
+		state.pop('_dependents', None)
+		state.pop('tolerance_group', None)
+		return state
+
+	#########################
+
+	def add_dependent(self, equation):
+		"""Method to register an equation which uses this variable, so that it is marked as needing re-evaluation
+		whenever the variable's nominal value or tolerance(s) change. Only a weak reference to the equation is kept."""
+		try:
+			self._dependents.add(equation)
+
+		except AttributeError:
+			self._dependents = WeakSet([equation])
+
+	def remove_dependent(self, equation):
+		"""Method to stop an equation being notified of changes to this variable."""
+		getattr(self, '_dependents', WeakSet()).discard(equation)
+
+	@property
+	def dependents(self):
+		"""Getter method for the list of equations which depend on this variable."""
+		return list(getattr(self, '_dependents', ()))
+
+	def plus_minus(self):
+		"""Method returning the numeric plus and minus tolerances of the variable as floats, taking the tolerance type
+		and unique tolerances into account (a side without tolerance is 0.0)."""
+		if self.tol_values_unique_set:
+			return float(self.tol_values_unique[0]), float(self.tol_values_unique[1])
+
+		elif self.tol_value_set:
+			if self.tol_type == 1:  # ONLY positive tolerance
+				return float(self.tol_value), 0.0
+
+			elif self.tol_type == 2:  # ONLY negative tolerance
+				return 0.0, float(self.tol_value)
+
+			return float(self.tol_value), float(self.tol_value)
+
+		return 0.0, 0.0
+
+	def set_values(self, nom_value, tol_plus=0.0, tol_minus=0.0):
+		"""Method to set the nominal value and the numeric plus / minus tolerances in one go (e.g. from the results of
+		an equation), choosing the tolerance type to suit them: equal tolerances are plus/minus, one sided tolerances
+		are only positive or only negative, and different ones are unique tolerances.
+
+		Equations using the variable are only marked as needing re-evaluation if something changed, True is returned
+		if it did."""
+		nom_value = float(nom_value)
+		tol_plus = abs(float(tol_plus))
+		tol_minus = abs(float(tol_minus))
+
+		if float(self.nom_value) == nom_value and self.plus_minus() == (tol_plus, tol_minus):
+			return False
+
+		initialised = self._initialised
+		self._initialised = False  # Make every change before updating the value range and notifying equations
+
+		try:
+			self._unique_tolerances = False
+			self._tol_values_unique_set = False
+			self._tol_type = 0
+			self.nom_value = nom_value
+
+			if tol_plus == tol_minus:
+				self.tol_value = tol_plus
+
+			elif tol_minus == 0:
+				self._tol_type = 1
+				self.tol_value = tol_plus
+
+			elif tol_plus == 0:
+				self._tol_type = 2
+				self.tol_value = tol_minus
+
+			else:
+				self.unique_tolerances = True
+				self.tol_values_unique = [tol_plus, tol_minus]
+
+		finally:
+			self._initialised = initialised
+
+		self._changed()
+		return True
+
+	def _changed(self):
+		"""Method called after the nominal value or tolerance(s) of an initialised instance change, which updates the
+		value range and marks every equation using the variable as needing re-evaluation."""
+		if not getattr(self, '_initialised', False):
+			return
+
 		self.update_value_range()
 
+		for equation in self.dependents:
+			equation.mark_dirty(self)
+
+	def _refresh_tolerances(self):
+		"""Method to recalculate the tolerance values which depend on the nominal value after it changes, keeping
+		whichever of the decimal or numeric tolerance(s) is preferred (see tol_pref)."""
+		if self._unique_tolerances:
+			if self._tol_pref == 0 and getattr(self, '_tol_decimals_unique', None) and self._nom_value_set:
+				self._tol_values_unique = [(self.nom_value * self._tol_decimals_unique[0]),
+										   (self.nom_value * self._tol_decimals_unique[1])]
+				self._tol_values_unique_set = True
+
+			elif getattr(self, '_tol_values_unique', None) and self._nom_value_set:
+				self._tol_decimals_unique = [(self._tol_values_unique[0] / self.nom_value),
+											 (self._tol_values_unique[1] / self.nom_value)]
+
+		elif self._tol_pref == 0:
+			if getattr(self, '_tol_decimal', 0.0) and self._nom_value_set:
+				self._tol_value = self.nom_value * self._tol_decimal
+				self._tol_value_set = True
+
+		elif getattr(self, '_tol_value', 0.0) and self._nom_value_set:
+			self._tol_decimal = self._tol_value / self.nom_value
+
 	def pretty_print(self):
 		if self.nom_value_set and self.tol_value_set and self.tol_decimal != 0:
 			return str(("Variable " + str(self.name) + " has a Nominal Value of " + str(self.nom_value) + " and a tolerance of " + str((self.tol_decimal * 100)) + "%"))
@@ -97,6 +230,10 @@ class Variable(Symbol):
 			else:
 				self._nom_value_set = False
 
+			if getattr(self, '_initialised', False):
+				self._refresh_tolerances()
+				self._changed()
+
 	@property
 	def nom_value_set(self):
 		"""Getter method for the variable class' nominal value setting.
@@ -160,6 +297,8 @@ class Variable(Symbol):
 			self._tol_type = value
 			self._unique_tolerances = False
 
+		self._changed()
+
 	#########################
 
 	@property
@@ -203,6 +342,8 @@ class Variable(Symbol):
 				self._tol_value_set = False
 				self._unique_tolerances = False
 
+		self._changed()
+
 	#########################
 
 	@property
@@ -244,6 +385,8 @@ class Variable(Symbol):
 			else:
 				self._tol_decimal = 0.0
 
+		self._changed()
+
 	#########################
 
 	@property
@@ -307,6 +450,8 @@ class Variable(Symbol):
 			else:
 				self._tol_values_unique_set = False
 
+			self._changed()
+
 	#########################
 
 	# TODO:
@@ -344,6 +489,8 @@ class Variable(Symbol):
 				self._tol_decimals_unique = [(self.tol_values_unique[0] / self.nom_value),
 												  (self.tol_values_unique[1] / self.nom_value)]
 
+			self._changed()
+
 	@property
 	def tol_values_unique_set(self):
 		return self._tol_values_unique_set
@@ -356,11 +503,11 @@ class Variable(Symbol):
 		return self._value_range
 
 	@value_range.setter
-	def value_range(self, values=array([0, 0, 0])):
-		array_check_0 = array([0, 0, 0])
-		array_check_1 = array([0, 0])
+	def value_range(self, values=None):
+		array_check_0 = numpy.array([0, 0, 0])
+		array_check_1 = numpy.array([0, 0])
 
-		if not isinstance(values, type(array)):
+		if not isinstance(values, type(numpy.array)):
 			raise TypeError('The unique tolerances must be handed in as an numpy matrix / array')
 
 		elif (values.shape != array_check_0.shape or values.shape != array_check_1.shape) or \
@@ -385,7 +532,7 @@ class Variable(Symbol):
 		# What is the preferred tolerance value when nom_value is updated? Default (0) is percent tolerance.
 		# 1 indicates that a fixed tolerance value is preferred
 
-		if self._nom_value_set and (self._tol_value_set or self._tol_values_unique_set):
+		if self._tol_value_set or self._tol_values_unique_set:  # The nominal value may be zero, e.g. for an offset
 
 			if self._tol_values_unique_set:
 				# There are unique values, i.e. there are different values for positive / negative tolerance
@@ -397,28 +544,25 @@ class Variable(Symbol):
 					raise ValueError("Unique tolerance values are not set")
 
 				else:  # Positive and Negative Tolerance (only possible case for unique tolerances)
-					self._value_range = array([(self.nom_value + self.tol_values_unique[0]),  	# Maximal
-											   self.nom_value,  								# Nominal
-											   (self.nom_value - self.tol_values_unique[1])])  	# Minimal
+					self._value_range = numpy.array([(self.nom_value + self.tol_values_unique[0]),  	# Maximal
+											         self.nom_value,  								# Nominal
+											         (self.nom_value - self.tol_values_unique[1])])  	# Minimal
 
 			elif self._tol_value_set:
 				# Positive / Negative values are the same, or there is only positive / negative tolerance
 
 				if self.tol_type == 0:  # Positive and Negative Tolerance
-					self._value_range = array([(self.nom_value + self.tol_value),  				# Maximal
-											   self.nom_value,  								# Nominal
-											   (self.nom_value - self.tol_value)])  			# Minimal
+					self._value_range = numpy.array([(self.nom_value + self.tol_value),  				# Maximal
+											         self.nom_value,  								# Nominal
+											         (self.nom_value - self.tol_value)])  			# Minimal
 
 				elif self.tol_type == 1:  # Only Positive Tolerance
-					self._value_range = array([(self.nom_value + self.tol_value),  				# Maximal
-											   self.nom_value])  								# Nominal
+					self._value_range = numpy.array([(self.nom_value + self.tol_value),  				# Maximal
+											         self.nom_value])  								# Nominal
 
 				elif self.tol_type == 2:  # Only Negative Tolerance
-					self._value_range = array([self.nom_value,  								# Nominal
-											   (self.nom_value - self.tol_value)])  			# Minimal
+					self._value_range = numpy.array([self.nom_value,  								# Nominal
+											         (self.nom_value - self.tol_value)])  			# Minimal
 
-		elif self.nom_value and not (self._tol_value_set or self._tol_values_unique_set):
+		else:  # Only a nominal value (which may be zero), the variable has no range
 			pass
-
-		else:
-			raise ValueError("Either a nominal, tolerance, or unique tolerance value has not been set.")
@@ -0,0 +1,298 @@
+from weakref import WeakValueDictionary
+
+from sympy import Symbol
+
+from LazyImport import lazy_import
+from Variable import Variable
+
+numpy = lazy_import("numpy")
+
+
+# Includes a compact container for many variables (e.g. every part of a board), stored as NumPy arrays
+
+
+class VariableSet:
+    """Class holding the nominal values and tolerances of many variables as contiguous NumPy arrays (a struct of
+    arrays), rather than as one Variable instance, with a dozen attributes, per variable.
+
+    Tolerances are kept as numeric plus and minus values, whose tolerance type (see Variable.tol_type) follows from
+    which of them are non-zero, as for Variable.set_values. Tolerances given as decimals are kept relative to the
+    nominal value, so they scale with it when it changes (tol_pref 0), and numeric ones are kept as they are (tol_pref
+    1). The value ranges of every variable are computed in one array operation (see value_ranges).
+
+    Indexing the set (by position or name) gives a VariableView, a lightweight Variable which reads and writes the
+    arrays, and which can be used in expressions and Equations like any other Variable. Views are only made when asked
+    for, and the equations using them are marked for re-evaluation when the bulk setters change their values."""
+
+    def __init__(self, names, nom_values=0.0, tol_plus=0.0, tol_minus=None, relative=False):
+        """names are the names of the variables, nom_values their nominal values, and tol_plus and tol_minus (by
+        default the same as tol_plus) their tolerances, each either one value for every variable or one per variable.
+        If relative is True the tolerances are decimals of the nominal values (e.g. 0.01 for 1%)."""
+        self.names = [str(name) for name in names]
+        self.indices = {name: index for index, name in enumerate(self.names)}
+
+        if len(self.indices) != len(self.names):
+            raise ValueError("The names of the variables in a set must be unique")
+
+        count = len(self.names)
+        self.nom_values = numpy.zeros(count, dtype=numpy.float64)
+        self.tol_plus = numpy.zeros(count, dtype=numpy.float64)  # Numeric tolerances
+        self.tol_minus = numpy.zeros(count, dtype=numpy.float64)
+        self.tol_types = numpy.zeros(count, dtype=numpy.int8)
+        self.relative = numpy.zeros(count, dtype=bool)  # Whether the tolerances scale with the nominal value
+
+        self._views = WeakValueDictionary()
+
+        self.set_nominal(nom_values)
+        self.set_tolerances(tol_plus, tol_minus, relative=relative)
+
+    def __getstate__(self):
+        """Method returning the state of the instance for pickling, without the (weakly referenced) views."""
+        state = dict(self.__dict__)
+        state.pop('_views', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._views = WeakValueDictionary()
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+    def __getitem__(self, key):
+        """Method returning the VariableView of the variable at a position, or with a name."""
+        index = self.index(key)
+        view = self._views.get(index)
+
+        if view is None:
+            view = VariableView(self.names[index], self, index)
+            self._views[index] = view
+
+        return view
+
+    def index(self, key):
+        """Method returning the position of the variable at a position, or with a name."""
+        if isinstance(key, str):
+            try:
+                return self.indices[key]
+
+            except KeyError:
+                raise KeyError("The set has no variable named %s" % key)
+
+        index = int(key)
+        if not -len(self) <= index < len(self):
+            raise IndexError("The set has no variable at position %d" % index)
+
+        return index % len(self)
+
+    def positions(self, indices):
+        """Method returning an array of positions from an iterable of positions and names, or every position if None."""
+        if indices is None:
+            return numpy.arange(len(self))
+
+        return numpy.array([self.index(key) for key in indices], dtype=numpy.intp)
+
+    #########################
+
+    def set_nominal(self, values, indices=None):
+        """Method to set the nominal values of the variables at indices (positions or names, by default every
+        variable), values being one value for all of them or one each. Relative tolerances scale with the values."""
+        positions = self.positions(indices)
+        values = numpy.broadcast_to(numpy.asarray(values, dtype=numpy.float64), positions.shape)
+
+        old = self.nom_values[positions]
+
+        # Relative tolerances scale by the ratio of the new to the old nominal value (they cannot scale from 0)
+        rescale = self.relative[positions] & (old != 0)
+        ratios = numpy.abs(values / numpy.where(rescale, old, 1.0))
+
+        self.tol_plus[positions] = numpy.where(rescale, self.tol_plus[positions] * ratios, self.tol_plus[positions])
+        self.tol_minus[positions] = numpy.where(rescale, self.tol_minus[positions] * ratios, self.tol_minus[positions])
+        self.nom_values[positions] = values
+
+        self._changed(positions[values != old])
+
+    def set_tolerances(self, tol_plus, tol_minus=None, indices=None, relative=False):
+        """Method to set the plus and minus (by default the same as plus) tolerances of the variables at indices
+        (positions or names, by default every variable), as numeric values, or as decimals of the nominal values if
+        relative is True. The tolerance types follow from which tolerances are zero."""
+        positions = self.positions(indices)
+
+        if tol_minus is None:
+            tol_minus = tol_plus
+
+        plus = numpy.abs(numpy.broadcast_to(numpy.asarray(tol_plus, dtype=numpy.float64), positions.shape))
+        minus = numpy.abs(numpy.broadcast_to(numpy.asarray(tol_minus, dtype=numpy.float64), positions.shape))
+
+        if relative:
+            nominal = numpy.abs(self.nom_values[positions])
+            plus = plus * nominal
+            minus = minus * nominal
+
+        changed = (plus != self.tol_plus[positions]) | (minus != self.tol_minus[positions])
+
+        self.tol_plus[positions] = plus
+        self.tol_minus[positions] = minus
+        self.tol_types[positions] = numpy.where((minus == 0) & (plus != 0), 1, numpy.where((plus == 0) & (minus != 0),
+                                                                                            2, 0))
+        self.relative[positions] = relative
+
+        self._changed(positions[changed])
+
+    def _changed(self, positions):
+        """Method marking the equations using the views of the given positions as needing re-evaluation."""
+        for index in positions.tolist():
+            view = self._views.get(index)
+
+            if view is not None:
+                view._changed()
+
+    #########################
+
+    @property
+    def toleranced(self):
+        """Getter method for the boolean array of which variables have tolerances."""
+        return (self.tol_plus != 0) | (self.tol_minus != 0)
+
+    @property
+    def unique(self):
+        """Getter method for the boolean array of which variables have different plus and minus tolerances."""
+        return self.toleranced & (self.tol_types == 0) & (self.tol_plus != self.tol_minus)
+
+    def value_ranges(self):
+        """Method returning the (variables, 3) float array of the Maximal, Nominal, and Minimal values of every
+        variable, computed in one array operation. A side without tolerance is the nominal value."""
+        return numpy.stack([self.nom_values + self.tol_plus, self.nom_values, self.nom_values - self.tol_minus], axis=1)
+
+
+class VariableView(Variable):
+    """Class for a Variable whose nominal value and tolerances are kept in a VariableSet, made by indexing the set.
+
+    It behaves like a Variable in expressions and Equations, but keeps no attributes of its own besides its set and
+    position. The nominal value and numeric or decimal tolerance can be set as for a Variable (or with set_values), the
+    other tolerance attributes are read only; use the set's bulk setters to change many variables at once."""
+
+    def __new__(cls, name, variable_set, index):
+        return Symbol.__xnew__(cls, name)  # Not taken from SymPy's cache, so each set has its own views
+
+    def __init__(self, name, variable_set, index):
+        self._set = variable_set
+        self._index = index
+        self._initialised = True
+        self.tolerance_group = None
+
+    def __getnewargs_ex__(self):
+        return (self.name, self._set, self._index), {}
+
+    #########################
+
+    def update_value_range(self):
+        """Method kept for compatibility, the value range of a view is always read from its set."""
+
+    def set_values(self, nom_value, tol_plus=0.0, tol_minus=0.0):
+        """Method to set the nominal value and the numeric plus / minus tolerances in one go (see Variable.set_values),
+        returning True if anything changed."""
+        values = self._set
+        index = self._index
+        old = (values.nom_values[index], values.tol_plus[index], values.tol_minus[index], values.relative[index])
+
+        values.set_nominal(float(nom_value), [index])
+        values.set_tolerances(abs(float(tol_plus)), abs(float(tol_minus)), [index])
+
+        return old != (values.nom_values[index], values.tol_plus[index], values.tol_minus[index],
+                       values.relative[index])
+
+    def plus_minus(self):
+        return float(self._set.tol_plus[self._index]), float(self._set.tol_minus[self._index])
+
+    #########################
+
+    @property
+    def nom_value(self):
+        return float(self._set.nom_values[self._index])
+
+    @nom_value.setter
+    def nom_value(self, value=0.0):
+        self._set.set_nominal(float(value), [self._index])
+
+    @property
+    def nom_value_set(self):
+        return self.nom_value != 0
+
+    @property
+    def tol_pref(self):
+        return 0 if self._set.relative[self._index] else 1
+
+    @property
+    def tol_type(self):
+        return int(self._set.tol_types[self._index])
+
+    @property
+    def unique_tolerances(self):
+        return bool(self._set.unique[self._index])
+
+    @property
+    def tol_value_set(self):
+        return bool(self._set.toleranced[self._index]) and not self.unique_tolerances
+
+    @property
+    def tol_values_unique_set(self):
+        return bool(self._set.unique[self._index])
+
+    @property
+    def tol_value(self):
+        tol_plus, tol_minus = self.plus_minus()
+        return tol_minus if self.tol_type == 2 else tol_plus
+
+    @tol_value.setter
+    def tol_value(self, value=0.0):
+        if self.tol_type == 1:
+            self._set.set_tolerances(float(value), 0.0, [self._index])
+
+        elif self.tol_type == 2:
+            self._set.set_tolerances(0.0, float(value), [self._index])
+
+        else:
+            self._set.set_tolerances(float(value), None, [self._index])
+
+    @property
+    def tol_decimal(self):
+        return self.tol_value / self.nom_value if self.nom_value else 0.0
+
+    @tol_decimal.setter
+    def tol_decimal(self, value=0.0):
+        if self.tol_type == 1:
+            self._set.set_tolerances(float(value), 0.0, [self._index], relative=True)
+
+        elif self.tol_type == 2:
+            self._set.set_tolerances(0.0, float(value), [self._index], relative=True)
+
+        else:
+            self._set.set_tolerances(float(value), None, [self._index], relative=True)
+
+    @property
+    def tol_values_unique(self):
+        return list(self.plus_minus())
+
+    @property
+    def tol_decimals_unique(self):
+        return [tolerance / self.nom_value if self.nom_value else 0.0 for tolerance in self.plus_minus()]
+
+    @property
+    def value_range(self):
+        """Getter method for the float array of the values the variable takes in the corners (Maximal, Nominal,
+        Minimal, without the sides it has no tolerance on)."""
+        values = self._set
+        index = self._index
+        nominal = values.nom_values[index]
+
+        if self.tol_type == 1:
+            return numpy.array([nominal + values.tol_plus[index], nominal])
+
+        elif self.tol_type == 2:
+            return numpy.array([nominal, nominal - values.tol_minus[index]])
+
+        return numpy.array([nominal + values.tol_plus[index], nominal, nominal - values.tol_minus[index]])
@@ -8,9 +8,9 @@
 # # Linux install above modules:
 # # sudo pip3 install git+https://github.com/ulikoehler/UliEngineering.git
 
-from Variable import *
-from Equation import *
-from sympy import *
+from sympy import Float
+from Variable import Variable
+from Equation import Equation
 
 def main():
     ## Example based on LTC4418 IC datasheet - https://www.analog.com/en/products/ltc4418.html
@@ -0,0 +1,29 @@
+import pytest
+from sympy import Float
+
+from Circuit import Circuit
+from Variable import Variable
+
+
+def test_outputs_with_a_zero_nominal_value():
+    v_a = Variable('v_a', nom_value=Float(5.0), tol_value=Float(0.05))
+    v_b = Variable('v_b', nom_value=Float(5.0), tol_value=Float(0.05))
+    v_c = Variable('v_c', nom_value=Float(2.0))
+    v_d = Variable('v_d', nom_value=Float(2.0))
+
+    circuit = Circuit()
+    offset = circuit.add("offset", v_a - v_b, v_a, v_b, quiet=True)
+    difference = circuit.add("difference", v_c - v_d, v_c, v_d, quiet=True)
+    gain = Variable('gain', nom_value=Float(10.0))
+    circuit.add("output", gain * offset + difference + 1, gain, offset, difference, quiet=True)
+
+    assert offset.nom_value == 0.0
+    assert offset.plus_minus() == pytest.approx((0.1, 0.1))
+    assert difference.nom_value == 0.0 and not difference.tol_value_set
+
+    nominal, minimum, maximum = circuit.results()["output"]
+    assert (nominal, minimum, maximum) == pytest.approx((1.0, 0.0, 2.0))
+
+    v_a.nom_value = Float(5.5)
+    assert circuit.evaluate() == ["offset", "output"]
+    assert circuit.results()["output"][0] == pytest.approx(6.0)
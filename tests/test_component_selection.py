@@ -0,0 +1,91 @@
+import time
+
+import numpy
+import pytest
+from sympy import Float
+
+from ComponentSelection import ComponentSelection, series_values
+from Equation import Equation
+from Variable import Variable
+
+
+def divider(count):
+    """Function returning a divider of count resistors, tapped after the first half, with a 2% 5 V supply."""
+    resistors = [Variable('R%d' % (i + 1), nom_value=Float(4700.0), tol_decimal=Float(0.01)) for i in range(count)]
+    supply = Variable('V', nom_value=Float(5.0), tol_decimal=Float(0.02))
+    expression = supply * sum(resistors[count // 2:]) / sum(resistors)
+
+    return Equation(expression, *resistors, supply, quiet=True), resistors
+
+
+def brute_force_margins(resistors, series, minimum, maximum, low, high):
+    """Function returning the sorted margins of every combination meeting the window, one first resistor at a time."""
+    values = series_values(series, minimum, maximum)
+    count = len(resistors)
+    grids = list(numpy.meshgrid(*([values] * (count - 1)), indexing="ij"))
+    margins = []
+
+    for first in values:
+        parts = [numpy.full(grids[0].shape, first)] + grids
+        top = sum(parts[:count // 2])
+        bottom = sum(parts[count // 2:])
+        lows = 5 * 0.98 * bottom * 0.99 / (top * 1.01 + bottom * 0.99)
+        highs = 5 * 1.02 * bottom * 1.01 / (top * 0.99 + bottom * 1.01)
+        margin = numpy.minimum(lows - low, high - highs)
+        margins.append(margin[margin >= 0])
+
+    return numpy.sort(numpy.concatenate(margins))[::-1]
+
+
+def test_search_matches_brute_force():
+    equation, resistors = divider(3)
+    selection = ComponentSelection(equation, 2.3, 2.45)
+
+    for resistor in resistors:
+        selection.allow(resistor, "E24", tolerance=0.01, minimum=1e3, maximum=1e5)
+
+    expected = brute_force_margins(resistors, "E24", 1e3, 1e5, 2.3, 2.45)
+    every = selection.search(max_results=None)
+    best = selection.search(max_results=10)
+
+    assert len(every) == len(expected)
+    numpy.testing.assert_allclose([result.margin for result in every], expected)
+    numpy.testing.assert_allclose([result.margin for result in best], expected[:10])
+
+
+def test_four_variable_e96_search_is_fast():
+    equation, resistors = divider(4)
+    selection = ComponentSelection(equation, 1.0, 1.1)
+
+    for resistor in resistors:
+        selection.allow(resistor, "E96", tolerance=0.01, minimum=1e3, maximum=1e4)
+
+    start = time.perf_counter()
+    results = selection.search(max_results=10)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 10.0, "A 4 variable E96 search took %.1f s" % elapsed
+    assert len(results) == 10
+    assert selection.pruned > 0  # The kept margins bound the search
+
+    expected = brute_force_margins(resistors, "E96", 1e3, 1e4, 1.0, 1.1)
+    numpy.testing.assert_allclose([result.margin for result in results], expected[:10])
+
+    for result in results:
+        assert 1.0 <= result.minimum and result.maximum <= 1.1
+
+
+@pytest.mark.parametrize("unknown", [(0, 2), (0, 1, 2)])
+def test_unknown_directions_are_still_exact(monkeypatch, unknown):
+    equation, resistors = divider(3)
+    signs = [None if index in unknown else sign for index, sign in enumerate(equation.variable_monotonicity())]
+    monkeypatch.setattr(equation, "variable_monotonicity", lambda ranges=None: signs)
+
+    selection = ComponentSelection(equation, 2.3, 2.45)
+
+    for resistor in resistors:
+        selection.allow(resistor, "E24", tolerance=0.01, minimum=1e3, maximum=1e5)
+
+    expected = brute_force_margins(resistors, "E24", 1e3, 1e5, 2.3, 2.45)
+    numpy.testing.assert_allclose([result.margin for result in selection.search(max_results=5)], expected[:5])
+    assert len(selection.search(max_results=None)) == len(expected)
@@ -0,0 +1,34 @@
+import numpy
+import pytest
+from sympy import Symbol
+
+from Corners import CornerTable, MappedCornerTable, grid_states
+
+
+def tied_table():
+    variables = [Symbol('a'), Symbol('b'), Symbol('c'), Symbol('d')]
+    states = grid_states([[1, 0, -1]] * 4)
+    values = numpy.tile([3.0, 1.0, 2.0, 3.0, 2.0, 1.0], 14)[:len(states)]  # Every value repeated many times
+
+    return variables, states, values
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 7, 81, 1000])
+@pytest.mark.parametrize("largest", [True, False])
+def test_top_breaks_ties_in_corner_order(chunk_size, largest):
+    variables, states, values = tied_table()
+    table = CornerTable(variables, states, values)
+
+    expected = numpy.lexsort((numpy.arange(len(values)), -values if largest else values))
+
+    for count in (0, 1, 5, 14, 15, 40, 81, 100):
+        numpy.testing.assert_array_equal(table.top(count, largest, chunk_size), expected[:count])
+
+
+def test_mapped_top_matches(tmp_path):
+    variables, states, values = tied_table()
+    table = MappedCornerTable.create(tmp_path / "corners", variables, len(values))
+    table.write(0, states, values)
+
+    numpy.testing.assert_array_equal(table.top(20, chunk_size=8), CornerTable(variables, states, values).top(20))
+    table.close()
@@ -0,0 +1,142 @@
+import itertools
+
+import numpy
+import pytest
+from sympy import Float, sqrt
+
+from Corners import state_parameters
+from Equation import Equation
+from ExpressionCache import expression_cache
+from Variable import Variable
+
+
+def test_can_vectorise_is_kept_until_variables_are_added():
+    x = Variable('x', nom_value=Float(3.0), tol_decimal=Float(0.01))
+    y = Variable('y', nom_value=Float(2.0), tol_decimal=Float(0.01))
+    equation = Equation(x * y, x, quiet=True)
+    assert equation.method == "substitution"
+
+    equation.add_variable(y)
+    assert equation.method == "vectorised"
+
+
+def test_tolerance_changes_reuse_the_compiled_expression(monkeypatch):
+    x = Variable('x', nom_value=Float(3.0), tol_decimal=Float(0.01))
+    y = Variable('y', nom_value=Float(2.0), tol_decimal=Float(0.01))
+    equation = Equation(x * y + x, x, y, quiet=True)
+    kernel = equation.corner_kernel
+
+    lookups = []
+    get = expression_cache.get
+    monkeypatch.setattr(expression_cache, "get", lambda *arguments, **keywords: lookups.append(1)
+                        or get(*arguments, **keywords))
+    monkeypatch.setattr(type(equation.expression), "free_symbols", property(lambda self: pytest.fail(
+        "The expression was walked again")), raising=False)
+
+    x.tol_decimal = Float(0.05)
+    assert equation.update_values()
+    assert equation.corner_kernel is kernel
+    assert not lookups
+
+    monkeypatch.undo()
+    fresh = Equation(x * y + x, x, y, quiet=True)
+    for name in ("nominal", "minimum", "maximum"):
+        assert getattr(equation, name) == getattr(fresh, name)
+
+
+@pytest.mark.parametrize("tolerance", [None, 0.5])
+def test_zero_nominal_variable_through_every_method(tolerance):
+    x = Variable('x', nom_value=Float(2.0), tol_decimal=Float(0.1))
+    z = Variable('z') if tolerance is None else Variable('z', tol_value=Float(tolerance))
+    spread = 0.2 + (tolerance or 0.0)
+
+    for method in ("vectorised", "worst_case", "substitution"):
+        equation = Equation(x + z, x, z, method=method, quiet=True)
+        assert [float(equation.nominal[1]), float(equation.minimum[1]), float(equation.maximum[1])] == \
+            pytest.approx([2.0, 2.0 - spread, 2.0 + spread])
+
+    rss = Equation(x + z, x, z, method="rss", quiet=True)
+    assert float(rss.maximum[1]) - 2.0 == pytest.approx((0.2 ** 2 + (tolerance or 0.0) ** 2) ** 0.5)
+
+    corners = equation.calculate_values(equation.expression, *equation.variables)
+    assert max(float(value) for _, value in corners) == pytest.approx(2.0 + spread)
+    assert len(corners) == (3 if tolerance is None else 9)
+
+
+def mixed_variables():
+    """Function returning variables with every kind of tolerance: plus/minus, only positive, only negative, unique
+    plus and minus, and none."""
+    return [Variable('a', nom_value=Float(3.0), tol_decimal=Float(0.1)),
+            Variable('b', nom_value=Float(2.0), tol_value=Float(0.2), tol_type=1),
+            Variable('c', nom_value=Float(5.0), tol_value=Float(0.5), tol_type=2),
+            Variable('d', nom_value=Float(1.5), unique_tolerances=True, tol_values_unique=[0.1, 0.3]),
+            Variable('e', nom_value=Float(4.0))]
+
+
+def test_substitution_paths_match_the_reference_implementation():
+    a, b, c, d, e = variables = mixed_variables()
+    expression = a * b / (c - d) + e ** 2
+    equation = Equation(expression, *variables, quiet=True, method="substitution")
+
+    reference = equation.calculate_values(equation.expression, *equation.variables)
+    streamed = [[state_parameters(variables, states), value]
+                for states, value in equation.iterate_values(equation.expression, *equation.variables)]
+    assert streamed == reference
+
+    # The substitution method (from the reduced expression) and the vectorised one find the same corners
+    for method in ("substitution", "vectorised"):
+        corners = [value for _, _, values in Equation(expression, *variables, quiet=True, method=method)
+                   .iterate_corners() for value in values]
+        numpy.testing.assert_allclose(numpy.asarray(corners, dtype=numpy.float64),
+                                      [float(value) for _, value in reference])
+
+
+def test_substitution_counts_its_subs_calls():
+    a, b, c, d, e = variables = mixed_variables()
+    equation = Equation(a * b + c * d + e, *variables, quiet=True, method="substitution", instrument=True)
+
+    # One call per value of each toleranced variable, for every partial substitution before it (e is substituted
+    #   into the reduced expression beforehand)
+    assert equation.stats.counters["subs_calls"] == 3 + 3 * 2 + 3 * 2 * 2 + 3 * 2 * 2 * 3
+
+
+def brute_force_extremes(expression, variables):
+    """Function returning the lowest and highest values of an expression over every corner of its variables, each
+    substituted on its own."""
+    values = []
+    for corner in itertools.product(*(sorted({variable.nom_value - minus, variable.nom_value,
+                                               variable.nom_value + plus})
+                                      for variable in variables for plus, minus in [variable.plus_minus()])):
+        values.append(float(expression.subs(dict(zip(variables, corner)))))
+
+    return min(values), max(values)
+
+
+@pytest.mark.parametrize("method", ["vectorised", "worst_case"])
+def test_tolerance_free_variables_are_substituted_once(method):
+    a = Variable('a', nom_value=Float(2.0), tol_decimal=Float(0.05))
+    b = Variable('b', nom_value=Float(3.0), unique_tolerances=True, tol_values_unique=[0.1, 0.4])
+    k = Variable('k', nom_value=Float(0.063))  # No tolerances
+    m = Variable('m', nom_value=Float(7.0))
+    expression = k / a + m * a * b - sqrt(m * b)
+    equation = Equation(expression, a, b, k, m, quiet=True, method=method)
+
+    assert set(equation.fixed_values()) == {k, m}
+    assert equation.reduced_expression().free_symbols == {a, b}
+    assert (float(equation.minimum[1]), float(equation.maximum[1])) == \
+           pytest.approx(brute_force_extremes(expression, [a, b, k, m]))
+
+    # A new nominal value of a fixed variable is substituted again
+    kernel = equation.corner_kernel
+    m.nom_value = Float(9.0)
+    equation.update_values()
+    assert equation.corner_kernel is not kernel
+    assert (float(equation.minimum[1]), float(equation.maximum[1])) == \
+           pytest.approx(brute_force_extremes(expression, [a, b, k, m]))
+
+    # As is a fixed variable gaining tolerances
+    k.tol_decimal = Float(0.1)
+    equation.update_values()
+    assert set(equation.fixed_values()) == {m}
+    assert (float(equation.minimum[1]), float(equation.maximum[1])) == \
+           pytest.approx(brute_force_extremes(expression, [a, b, k, m]))
@@ -0,0 +1,19 @@
+import io
+
+import pytest
+
+from Export import CsvWriter, ResultWriter
+
+
+def test_result_writer_is_abstract():
+    with pytest.raises(TypeError):
+        ResultWriter(io.StringIO())
+
+    class SummaryOnly(ResultWriter):
+        def write_summary(self, results):
+            pass
+
+    with pytest.raises(TypeError):
+        SummaryOnly(io.StringIO())
+
+    assert isinstance(CsvWriter(io.StringIO()), ResultWriter)
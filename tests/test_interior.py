@@ -0,0 +1,47 @@
+import numpy
+import pytest
+from sympy import Float, sin
+
+from Equation import Equation
+from Variable import Variable
+
+
+def test_finds_a_peak_no_corner_holds():
+    x = Variable('x', nom_value=Float(1.2), tol_decimal=Float(0.5))
+    equation = Equation(x * (2 - x), x, quiet=True)
+    result = equation.interior_extremes(seed=1)
+
+    assert float(equation.maximum[1]) == pytest.approx(0.96)  # The nominal corner, the peak is at x = 1
+    assert not result.maximum_exact
+    assert result.maximum == pytest.approx(1.0, rel=1e-9)
+    assert result.maximum_point[x] == pytest.approx(1.0, abs=1e-4)
+
+    assert result.minimum_exact
+    assert result.minimum == equation.minimum[1] and result.minimum_point is None
+    assert equation.interior_result is result
+
+
+def test_matches_a_dense_grid():
+    x = Variable('x', nom_value=Float(1.2), tol_decimal=Float(0.4))
+    y = Variable('y', nom_value=Float(0.5), tol_value=Float(0.5))
+    expression = sin(3 * x) * (1 + y) - y ** 2
+    equation = Equation(expression, x, y, quiet=True)
+    result = equation.interior_extremes(seed=2)
+
+    xs, ys = numpy.meshgrid(numpy.linspace(0.72, 1.68, 2001), numpy.linspace(0.0, 1.0, 2001), indexing="ij")
+    grid = numpy.sin(3 * xs) * (1 + ys) - ys ** 2
+
+    # The search is never worse than the grid (to its spacing) and never outside the box
+    assert result.minimum <= grid.min() + 1e-6
+    assert result.maximum >= grid.max() - 1e-6
+    assert result.minimum >= grid.min() - 1e-3 and result.maximum <= grid.max() + 1e-3
+
+
+def test_a_monotonic_expression_has_exact_corners():
+    x = Variable('x', nom_value=Float(3.0), tol_decimal=Float(0.1))
+    y = Variable('y', nom_value=Float(2.0), tol_decimal=Float(0.05))
+    equation = Equation(x ** 2 / y, x, y, quiet=True)
+    result = equation.interior_extremes(seed=3)
+
+    assert result.exact
+    assert (result.minimum, result.maximum) == (equation.minimum[1], equation.maximum[1])
@@ -0,0 +1,69 @@
+import numpy
+import pytest
+from sympy import Float
+
+from Equation import Equation
+from MonteCarlo import SEED_BLOCK
+from Variable import Variable
+
+
+def divider():
+    """Function returning a divider with 1% resistors (one with unequal tolerances) and a 2% supply."""
+    top = Variable('R1', nom_value=Float(4700.0), tol_values_unique=[47.0, 94.0], tol_type=1)
+    bottom = Variable('R2', nom_value=Float(10000.0), tol_decimal=Float(0.01))
+    supply = Variable('V', nom_value=Float(5.0), tol_decimal=Float(0.02))
+
+    return Equation(supply * bottom / (top + bottom), top, bottom, supply, quiet=True)
+
+
+@pytest.mark.parametrize("distribution", ["uniform", "normal"])
+def test_the_samples_of_a_seed_do_not_depend_on_the_chunk_size(distribution):
+    equation = divider()
+    samples = 3 * SEED_BLOCK + 123
+    runs = [equation.monte_carlo(samples=samples, distribution=distribution, seed=7, chunk_size=chunk_size,
+                                 keep_values=True) for chunk_size in (1, SEED_BLOCK, 2 * SEED_BLOCK + 5, 10 ** 6)]
+    runs.append(equation.monte_carlo(samples=samples, distribution=distribution, seed=7, chunk_size=SEED_BLOCK,
+                                     keep_values=True, workers=2))  # And across processes
+
+    for run in runs[1:]:
+        assert numpy.array_equal(run.values, runs[0].values)
+        assert (run.count, run.minimum, run.maximum, run.percentiles) == \
+               (runs[0].count, runs[0].minimum, runs[0].maximum, runs[0].percentiles)
+        assert run.mean == pytest.approx(runs[0].mean, rel=1e-12)
+        assert run.std == pytest.approx(runs[0].std, rel=1e-9)
+
+    other = equation.monte_carlo(samples=samples, distribution=distribution, seed=8, keep_values=True)
+    assert not numpy.array_equal(other.values, runs[0].values)
+
+
+def test_running_statistics_match_the_kept_values():
+    equation = divider()
+    result = equation.monte_carlo(samples=50000, seed=3, chunk_size=5000, spec=(3.3, 3.5), keep_values=True)
+    values = result.values
+
+    assert result.count == len(values) == 50000
+    assert result.mean == pytest.approx(values.mean(), rel=1e-12)
+    assert result.std == pytest.approx(values.std(ddof=1), rel=1e-9)
+    assert (result.minimum, result.maximum) == (values.min(), values.max())
+    assert result.in_spec == ((values >= 3.3) & (values <= 3.5)).sum()
+    assert result.percentiles == dict(zip((1, 5, 50, 95, 99), numpy.percentile(values, (1, 5, 50, 95, 99))))
+
+    # Every sample lies within the worst case corners
+    assert float(equation.minimum[1]) <= result.minimum and result.maximum <= float(equation.maximum[1])
+
+
+def test_streaming_gives_the_same_statistics_for_a_seed():
+    equation = divider()
+    kept = equation.monte_carlo(samples=40000, seed=11, chunk_size=10000, spec=(3.3, 3.5), keep_values=True)
+    streamed = equation.monte_carlo(samples=40000, seed=11, chunk_size=10000, spec=(3.3, 3.5), streaming=True,
+                                    relative_accuracy=0.001)
+
+    assert streamed.values is None
+    assert (streamed.count, streamed.minimum, streamed.maximum, streamed.in_spec) == \
+           (kept.count, kept.minimum, kept.maximum, kept.in_spec)
+    assert streamed.mean == pytest.approx(kept.mean, rel=1e-12)
+    assert streamed.std == pytest.approx(kept.std, rel=1e-9)
+
+    for percentile, value in kept.percentiles.items():
+        assert streamed.percentiles[percentile] == pytest.approx(value, rel=0.001)
+        assert abs(streamed.percentiles[percentile] - value) <= streamed.percentile_error(percentile) + 1e-12
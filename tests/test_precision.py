@@ -0,0 +1,53 @@
+from sympy import Float, sqrt
+
+from Equation import Equation
+from ExpressionCache import expression_cache
+from Precision import precision_settings
+from Variable import Variable
+
+
+def test_float64_is_the_default():
+    x = Variable('x', nom_value=Float(2.0), tol_decimal=Float(0.01))
+    equation = Equation(x ** 2, x, quiet=True)
+
+    assert precision_settings.default == "float64"
+    assert equation.precision_check is None
+    assert equation.high_kernel is None
+
+
+def test_auto_reruns_cancelled_results_in_high_precision():
+    x = Variable('x', nom_value=Float(1e8), tol_decimal=Float(0.01))
+    equation = Equation(sqrt(x ** 2 + 1) - x, x, quiet=True, precision="auto")
+
+    assert equation.precision_check.cancelled
+    assert equation.precision == "high"
+
+
+def test_auto_check_keeps_its_kernels(monkeypatch):
+    x = Variable('x', nom_value=Float(3.0), tol_decimal=Float(0.01))
+    y = Variable('y', nom_value=Float(2.0))  # No tolerances, so part of the reduced expression
+    equation = Equation(x * y + 1, x, y, quiet=True, precision="auto")
+    high_kernel = equation.high_kernel
+
+    lookups = []
+    get = expression_cache.get
+    monkeypatch.setattr(expression_cache, "get", lambda *arguments, **keywords: lookups.append(keywords.get("kind"))
+                        or get(*arguments, **keywords))
+
+    x.nom_value = Float(4.0)
+    assert equation.update_values()
+    assert equation.high_kernel is high_kernel
+    assert not lookups
+
+    y.nom_value = Float(5.0)  # Changes the fixed values, so both kernels are made again
+    equation.update_values()
+    assert equation.high_kernel is not high_kernel
+    assert sorted(lookups) == ["corner_kernel", "mpmath_corner_kernel"]
+    assert equation.nominal[1] == 4.0 * 5.0 + 1
+
+    high_kernel = equation.high_kernel
+    monkeypatch.setattr(precision_settings, "digits", 30)
+    x.nom_value = Float(3.0)
+    equation.update_values()
+    assert equation.high_kernel is not high_kernel
+    assert equation.high_kernel.digits == 30
@@ -0,0 +1,96 @@
+import os
+
+import pytest
+from sympy import Float, sqrt
+
+from Equation import Equation
+from ResultCache import LOW_WATER, ResultCache
+from Variable import Variable
+
+RESULTS = {"nominal": [[], 1.0], "minimum": [[], 0.5], "maximum": [[], 1.5]}
+
+
+def test_eviction_lists_the_directory_only_when_over_the_limit(tmp_path, monkeypatch):
+    cache = ResultCache(tmp_path, max_bytes=None, max_entries=50)
+    scans = []
+    entries = cache.entries
+    monkeypatch.setattr(cache, "entries", lambda: scans.append(1) or entries())
+
+    for index in range(200):
+        cache.put("%064x" % index, RESULTS)
+        assert cache.count <= 50
+
+    # Each eviction goes down to the low water mark, so the next few writes need not list the directory
+    assert len(scans) < 200 // (50 - int(50 * LOW_WATER)) + 1
+    assert cache.count == len(os.listdir(tmp_path))
+    assert cache.evictions == 200 - cache.count
+
+    # The entries kept are the most recently written
+    assert cache.get("%064x" % 199) is not None
+    assert cache.get("%064x" % 0) is None
+
+
+def test_running_totals(tmp_path):
+    cache = ResultCache(tmp_path, max_bytes=10 ** 6)
+    cache.put("a" * 64, RESULTS)
+    cache.put("a" * 64, {"nominal": [[], 2.0]})  # Replaced, not counted twice
+    cache.put("b" * 64, RESULTS)
+
+    sizes = [os.path.getsize(os.path.join(tmp_path, name)) for name in os.listdir(tmp_path)]
+    assert (cache.count, cache.total) == (2, sum(sizes))
+
+    reopened = ResultCache(tmp_path, max_bytes=sum(sizes) - 1)  # Counted when opened
+    assert (reopened.count, reopened.total) == (2, sum(sizes))
+
+    reopened.put("c" * 64, RESULTS)
+    assert reopened.total <= reopened.max_bytes * LOW_WATER
+    assert reopened.total == sum(os.path.getsize(os.path.join(tmp_path, name)) for name in os.listdir(tmp_path))
+
+    reopened.clear()
+    assert (reopened.count, reopened.total, len(reopened)) == (0, 0, 0)
+
+
+def public_results(equation):
+    check = equation.precision_check
+    return {"nominal": [list(equation.nominal[0]), float(equation.nominal[1])],
+            "minimum": [list(equation.minimum[0]), float(equation.minimum[1])],
+            "maximum": [list(equation.maximum[0]), float(equation.maximum[1])],
+            "tolerances": [equation.tol_value, equation.tol_decimal, equation.tol_values_unique,
+                           equation.tol_decimals_unique, equation.tol_value_set, equation.tol_values_unique_set],
+            "precision": equation.precision,
+            "precision_check": None if check is None else [check.float_value, check.high_value, check.scale,
+                                                           check.rtol, check.digits, check.cancelled],
+            "corners": equation.corners, "monotonicity": equation.monotonicity,
+            "monte_carlo_result": equation.monte_carlo_result, "sensitivity_result": equation.sensitivity_result,
+            "interior_result": equation.interior_result}
+
+
+@pytest.mark.parametrize("method", ["vectorised", "worst_case"])
+def test_a_hit_restores_every_result(tmp_path, method):
+    x = Variable('x', nom_value=Float(1e8), tol_decimal=Float(0.01))
+    expression = sqrt(x ** 2 + 1) - x  # Cancels in float64, so auto precision reruns it in high precision
+    stored = Equation(expression, x, quiet=True, method=method, precision="auto", cache=ResultCache(tmp_path))
+    assert stored.precision == "high"
+
+    cache = ResultCache(tmp_path)
+    loaded = Equation(expression, x, quiet=True, method=method, precision="auto", cache=cache)
+    assert cache.hits == 1
+    assert public_results(loaded) == public_results(stored)
+
+
+def test_a_hit_clears_the_previous_analyses(tmp_path):
+    x = Variable('x', nom_value=Float(2.0), tol_decimal=Float(0.01))
+    y = Variable('y', nom_value=Float(3.0), tol_decimal=Float(0.05))
+    cache = ResultCache(tmp_path)
+    Equation(x * y, x, y, quiet=True, cache=cache)  # Keeps the results for x = 2
+
+    x.nom_value = Float(4.0)
+    equation = Equation(x * y, x, y, quiet=True, cache=cache)
+    equation.monte_carlo(samples=1000, seed=1)
+    equation.sensitivity()
+
+    x.nom_value = Float(2.0)
+    equation.update_values()
+    assert cache.hits == 1
+    assert (equation.monte_carlo_result, equation.sensitivity_result, equation.monotonicity) == (None, None, None)
+    assert equation.nominal[1] == 6.0
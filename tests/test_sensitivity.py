@@ -0,0 +1,63 @@
+import numpy
+import pytest
+from sympy import Float, exp
+
+from Equation import Equation
+from Variable import Variable
+
+
+def linear_variables():
+    """Function returning variables with equal, unequal (unique), and one sided tolerances."""
+    return [Variable('a', nom_value=Float(2.0), tol_decimal=Float(0.05)),
+            Variable('b', nom_value=Float(3.0), unique_tolerances=True, tol_values_unique=[0.1, 0.4]),
+            Variable('c', nom_value=Float(5.0), tol_decimal=Float(0.02), tol_type=2)]
+
+
+def test_a_linear_expression_matches_its_corners():
+    a, b, c = linear_variables()
+    expression = 3 * a - 2 * b + c
+    result = Equation(expression, a, b, c, quiet=True).sensitivity()
+    corners = Equation(expression, a, b, c, quiet=True, method="vectorised")
+
+    # The linearised worst case of a linear expression is exact
+    assert result.nominal == pytest.approx(float(corners.nominal[1]))
+    assert result.nominal + result.linear_plus == pytest.approx(float(corners.maximum[1]))
+    assert result.nominal - result.linear_minus == pytest.approx(float(corners.minimum[1]))
+
+    plus = numpy.array([3 * 0.1, 2 * 0.4, 0.0])  # The largest rise of each term (b falls), then its largest fall
+    minus = numpy.array([3 * 0.1, 2 * 0.1, 0.1])
+    assert result.contributions_plus == pytest.approx(plus)
+    assert result.contributions_minus == pytest.approx(minus)
+    assert result.rss_plus == pytest.approx(numpy.sqrt(numpy.sum(plus ** 2)))
+    assert result.rss_minus == pytest.approx(numpy.sqrt(numpy.sum(minus ** 2)))
+
+    rss = Equation(expression, a, b, c, quiet=True, method="rss")
+    assert (float(rss.minimum[1]), float(rss.maximum[1])) == \
+           pytest.approx((result.nominal - result.rss_minus, result.nominal + result.rss_plus))
+
+
+def test_derivatives_match_finite_differences():
+    x = Variable('x', nom_value=Float(1.5), tol_decimal=Float(0.01))
+    y = Variable('y', nom_value=Float(0.7), tol_decimal=Float(0.03))
+    z = Variable('z', nom_value=Float(4.0), tol_decimal=Float(0.1))
+    expression = x ** 2 * exp(-y) / z
+    result = Equation(expression, x, y, z, quiet=True).sensitivity()
+
+    def value(x_value, y_value, z_value):
+        return x_value ** 2 * numpy.exp(-y_value) / z_value
+
+    nominal = numpy.array([1.5, 0.7, 4.0])
+    step = 1e-6
+    for index in range(3):
+        up, down = nominal.copy(), nominal.copy()
+        up[index] += step
+        down[index] -= step
+        assert result.derivatives[index] == pytest.approx((value(*up) - value(*down)) / (2 * step), rel=1e-6)
+
+    # The relative sensitivities of a product of powers are its exponents
+    assert result.sensitivities == pytest.approx([2.0, -0.7, -1.0])
+
+    shares = result.shares
+    assert shares.sum() == pytest.approx(1.0)
+    ranking = result.ranking()
+    assert [row[0] for row in ranking] == [result.variables[index] for index in numpy.argsort(-shares)]
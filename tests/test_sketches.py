@@ -0,0 +1,89 @@
+import numpy
+import pytest
+
+from Sketches import Histogram, QuantileSketch
+
+PERCENTILES = [0, 0.1, 1, 5, 25, 50, 75, 95, 99, 99.9, 100]
+
+
+def stream():
+    """Function returning values of both signs, spread over several decades, with some zeros."""
+    rng = numpy.random.default_rng(4)
+    return numpy.concatenate([rng.normal(0.5, 1.0, 60000), rng.lognormal(3.0, 2.0, 30000), numpy.zeros(1000),
+                              -rng.lognormal(-4.0, 1.0, 9000)])
+
+
+def sketch_of(chunks, relative_accuracy=0.001, max_buckets=8192):
+    sketch = QuantileSketch(relative_accuracy, max_buckets)
+
+    for chunk in chunks:
+        sketch.update(chunk)
+
+    return sketch
+
+
+@pytest.mark.parametrize("relative_accuracy", [0.01, 0.001])
+def test_percentiles_are_within_the_relative_accuracy(relative_accuracy):
+    values = stream()
+    sketch = sketch_of(numpy.array_split(values, 7), relative_accuracy)
+    exact = numpy.percentile(values, PERCENTILES, method="lower")  # The sketch gives the value at that rank
+
+    assert (sketch.count, sketch.minimum, sketch.maximum) == (len(values), values.min(), values.max())
+
+    for percentile, value in zip(PERCENTILES, exact):
+        # Values within a few decades of the largest are within the relative accuracy, the rest (e.g. the normal
+        # values closest to zero at 0.1%) within the floor of the collapsed buckets
+        assert abs(sketch.quantile(percentile / 100) - value) <= max(relative_accuracy * abs(value),
+                                                                     sketch.absolute_floor)
+
+
+def test_collapsed_buckets_are_within_the_absolute_floor():
+    values = stream()
+    sketch = sketch_of([values], 0.001, max_buckets=1000)
+    exact = numpy.percentile(values, PERCENTILES, method="lower")
+
+    assert sketch.absolute_floor > 1.0
+    for percentile, value in zip(PERCENTILES, exact):
+        assert abs(sketch.quantile(percentile / 100) - value) <= max(0.001 * abs(value), sketch.absolute_floor)
+
+
+def test_merged_sketches_match_a_single_sketch():
+    values = stream()
+    parts = numpy.array_split(numpy.random.default_rng(5).permutation(values), 5)
+    single = sketch_of([values])
+    merged = sketch_of([parts[0]])
+
+    for part in parts[1:]:
+        merged.merge(sketch_of([part]))
+
+    assert (merged.count, merged.zeros, merged.minimum, merged.maximum) == \
+           (single.count, single.zeros, single.minimum, single.maximum)
+    assert merged.percentiles(PERCENTILES) == single.percentiles(PERCENTILES)
+
+    with pytest.raises(ValueError):
+        merged.merge(QuantileSketch(0.01))
+
+
+def test_nans_are_counted_apart():
+    sketch = sketch_of([numpy.array([1.0, numpy.nan, 2.0, 3.0])])
+    assert (sketch.count, sketch.nans) == (3, 1)
+    assert sketch.quantile(0.5) == pytest.approx(2.0, rel=0.001)
+
+
+def test_histogram_matches_numpy():
+    values = stream()
+    edges = numpy.linspace(-2.0, 5.0, 71)
+    histogram = Histogram(edges)
+    merged = Histogram(edges)
+
+    for part in numpy.array_split(values, 3):
+        histogram.update(part)
+        other = Histogram(edges)
+        other.update(part)
+        merged.merge(other)
+
+    assert numpy.array_equal(histogram.counts, numpy.histogram(values, edges)[0])
+    assert (histogram.underflow, histogram.overflow) == ((values < -2.0).sum(), (values > 5.0).sum())
+    assert histogram.total == len(values)
+    assert numpy.array_equal(merged.counts, histogram.counts)
+    assert (merged.underflow, merged.overflow) == (histogram.underflow, histogram.overflow)
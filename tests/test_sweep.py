@@ -0,0 +1,49 @@
+import itertools
+
+import numpy
+import pytest
+from sympy import Float
+
+from Equation import Equation
+from Variable import Variable
+
+
+def filter_variables(a_nominal=1000.0, b_nominal=5.0, c_tolerance=0.02):
+    """Function returning variables with a decimal tolerance (which scales with the nominal value), a numeric tolerance
+    (which does not), an only positive tolerance, and no tolerance."""
+    a = Variable('a', nom_value=Float(a_nominal), tol_decimal=Float(0.01))
+    b = Variable('b', nom_value=Float(b_nominal), tol_value=Float(0.25))
+    c = Variable('c', nom_value=Float(3.0), tol_decimal=Float(c_tolerance), tol_type=1)
+    d = Variable('d', nom_value=Float(0.5))
+
+    return a, b, c, d
+
+
+def expression(a, b, c, d):
+    return b * c / (a * 1e-3 + c) - d * b
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1])
+def test_sweep_points_match_separate_equations(chunk_size):
+    variables = filter_variables()
+    a, b, c, d = variables
+    equation = Equation(expression(*variables), *variables, quiet=True)
+    results = (equation.nominal, equation.minimum, equation.maximum)
+
+    a_values = numpy.geomspace(100.0, 10000.0, 4)
+    b_values = [4.5, 5.0, 5.5]
+    c_tolerances = [0.0, 0.01, 0.05]
+    swept = equation.sweep({a: a_values, b: b_values}, tolerances={c: c_tolerances}, chunk_size=chunk_size)
+    assert swept.shape == (4, 3, 3)
+
+    # The variables and the equation's own results are left as they were
+    assert (float(a.nom_value), float(b.nom_value), float(c.tol_decimal)) == (1000.0, 5.0, 0.02)
+    assert (equation.nominal, equation.minimum, equation.maximum) == results
+
+    # Variables of the same names are the same symbols (see Variable), so the points are made after the checks above
+    for (i, a_nominal), (j, b_nominal), (k, c_tolerance) in itertools.product(enumerate(a_values), enumerate(b_values),
+                                                                             enumerate(c_tolerances)):
+        point_variables = filter_variables(a_nominal, b_nominal, c_tolerance)
+        point = Equation(expression(*point_variables), *point_variables, quiet=True)
+        assert (swept.nominal[i, j, k], swept.minimum[i, j, k], swept.maximum[i, j, k]) == \
+               pytest.approx((float(point.nominal[1]), float(point.minimum[1]), float(point.maximum[1])), rel=1e-12)
@@ -0,0 +1,70 @@
+import itertools
+
+import pytest
+from sympy import Float
+
+from Equation import Equation
+from ToleranceGroup import ToleranceGroup
+from Variable import Variable
+
+
+def matched_divider(ratio_tolerance):
+    """Function returning a divider of a matched array of 4 1% resistors (tapped after the first two), with a 2% 5 V
+    supply, and its resistors and supply."""
+    resistors = [Variable('R%d' % (i + 1), nom_value=Float(value), tol_decimal=Float(0.01))
+                 for i, value in enumerate((4700.0, 2200.0, 10000.0, 3300.0))]
+    supply = Variable('V', nom_value=Float(5.0), tol_decimal=Float(0.02))
+    ToleranceGroup(*resistors, ratio_tolerance=ratio_tolerance)
+
+    return supply * (resistors[2] + resistors[3]) / sum(resistors), resistors, supply
+
+
+def brute_force_extremes(resistors, supply, ratio_tolerance):
+    """Function returning the lowest and highest output over every corner of the group's shared tolerance, the ratio
+    variation of each resistor after the first, and the supply."""
+    nominals = [float(resistor.nom_value) for resistor in resistors]
+    values = []
+
+    for shared, supply_state, *ratios in itertools.product((-1, 0, 1), (-1, 0, 1),
+                                                           *([(-1, 0, 1)] * (len(resistors) - 1))):
+        factors = [1.0] + [1 + ratio_tolerance * ratio for ratio in ratios]
+        r = [nominal * (1 + 0.01 * shared) * factor for nominal, factor in zip(nominals, factors)]
+        values.append(5.0 * (1 + 0.02 * supply_state) * (r[2] + r[3]) / sum(r))
+
+    return min(values), max(values)
+
+
+@pytest.mark.parametrize("method", ["vectorised", "worst_case", "substitution"])
+@pytest.mark.parametrize("ratio_tolerance", [0.0, 0.001])
+def test_grouped_corners_match_brute_force(method, ratio_tolerance):
+    expression, resistors, supply = matched_divider(ratio_tolerance)
+    equation = Equation(expression, *resistors, supply, quiet=True, method=method)
+
+    assert (float(equation.minimum[1]), float(equation.maximum[1])) == \
+           pytest.approx(brute_force_extremes(resistors, supply, ratio_tolerance), rel=1e-12)
+
+
+@pytest.mark.parametrize("ratio_tolerance", [0.0, 0.001])
+def test_a_group_is_one_dimension_of_corners(ratio_tolerance):
+    expression, resistors, supply = matched_divider(ratio_tolerance)
+    equation = Equation(expression, *resistors, supply, quiet=True, keep_corners=True)
+
+    # The shared tolerance and the supply, plus a ratio dimension for each resistor after the first
+    dimensions = 2 + (len(resistors) - 1 if ratio_tolerance else 0)
+    assert len(equation.corners) == 3 ** dimensions
+    assert len(equation.corner_layout().states) == dimensions
+
+    # Matched resistors give a tighter range than independent ones
+    grouped = float(equation.maximum[1]) - float(equation.minimum[1])
+    resistors[0].tolerance_group.remove()
+    equation.update_values()
+    assert len(equation.corners) == 3 ** (len(resistors) + 1)
+    assert float(equation.maximum[1]) - float(equation.minimum[1]) > grouped
+
+
+def test_monte_carlo_samples_stay_within_the_grouped_corners():
+    expression, resistors, supply = matched_divider(0.001)
+    equation = Equation(expression, *resistors, supply, quiet=True)
+    result = equation.monte_carlo(samples=20000, seed=5)
+
+    assert float(equation.minimum[1]) <= result.minimum and result.maximum <= float(equation.maximum[1])
@@ -0,0 +1,78 @@
+import numpy
+import pytest
+from sympy import Float
+
+from Equation import Equation
+from Variable import Variable
+from VariableSet import VariableSet
+
+NAMES = ["a", "b", "c", "d", "e", "f"]
+
+
+def standalone_variables():
+    """Function returning Variables with decimal, numeric, unique, only positive, only negative, and no tolerances."""
+    return [Variable('a', nom_value=Float(1000.0), tol_decimal=Float(0.01)),
+            Variable('b', nom_value=Float(5.0), tol_value=Float(0.25)),
+            Variable('c', nom_value=Float(3.0), unique_tolerances=True, tol_values_unique=[0.1, 0.4]),
+            Variable('d', nom_value=Float(2.0), tol_decimal=Float(0.05), tol_type=1),
+            Variable('e', nom_value=Float(7.0), tol_value=Float(0.5), tol_type=2),
+            Variable('f', nom_value=Float(4.0))]
+
+
+def variable_set():
+    """Function returning a VariableSet of the same variables as standalone_variables."""
+    variables = VariableSet(NAMES, [1000.0, 5.0, 3.0, 2.0, 7.0, 4.0], [0.0, 0.25, 0.1, 0.0, 0.0, 0.0],
+                            [0.0, 0.25, 0.4, 0.0, 0.5, 0.0])
+    variables.set_tolerances([0.01, 0.05], [0.01, 0.0], ["a", "d"], relative=True)
+
+    return variables
+
+
+def assert_same_variable(view, variable):
+    assert (view.name, view.nom_value, view.tol_type, view.unique_tolerances, view.tol_value_set,
+            view.tol_values_unique_set) == \
+           (variable.name, float(variable.nom_value), variable.tol_type, variable.unique_tolerances,
+            variable.tol_value_set, variable.tol_values_unique_set)
+    assert view.plus_minus() == pytest.approx(variable.plus_minus())
+
+    if variable.tol_value_set or variable.tol_values_unique_set:  # Whether tolerances scale, and the corner values
+        assert view.tol_pref == variable.tol_pref
+        assert list(view.value_range) == pytest.approx([float(value) for value in variable.value_range])
+
+
+def test_views_match_standalone_variables():
+    variables = variable_set()
+
+    for view, variable in zip(variables, standalone_variables()):
+        assert_same_variable(view, variable)
+        assert variables[view.name] is view
+
+    assert variables.value_ranges()[:, [0, 2]] == pytest.approx(numpy.array(
+        [[1010.0, 990.0], [5.25, 4.75], [3.1, 2.6], [2.1, 2.0], [7.0, 6.5], [4.0, 4.0]]))
+
+
+@pytest.mark.parametrize("method", ["vectorised", "worst_case", "substitution", "rss"])
+def test_equations_of_views_match_equations_of_variables(method):
+    parts = variable_set()
+    views = list(parts)
+    variables = standalone_variables()
+
+    def results(a, b, c, d, e, f):
+        equation = Equation(a * b / c + d ** 2 - e * f, a, b, c, d, e, f, quiet=True, method=method)
+        return equation, [[str(result[0]), float(result[1])] for result in (equation.nominal, equation.minimum,
+                                                                            equation.maximum)]
+
+    equation, view_results = results(*views)
+    assert view_results == results(*variables)[1]
+
+    # The bulk setters scale the relative tolerances and re-evaluate the equation, like setting each Variable
+    parts.set_nominal([1500.0, 6.0], ["a", "e"])
+    variables[0].nom_value = Float(1500.0)
+    variables[4].nom_value = Float(6.0)
+
+    assert equation.update_values()
+    for view, variable in zip(views, variables):
+        assert_same_variable(view, variable)
+
+    assert [[str(result[0]), float(result[1])] for result in (equation.nominal, equation.minimum, equation.maximum)] \
+           == results(*variables)[1]